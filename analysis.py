@@ -0,0 +1,266 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Step response analysis of position and speed moves and extraction of
+ fault events.
+
+ Telemetry is segmented at every setpoint change and the metrics of all
+ steps are computed at once with NumPy reductions over the segments.
+
+ Usage: python analysis.py [--signal position|speed] recording.rec ...
+
+'''
+
+import numpy as np
+
+import comLib.linAdapter as rpc
+import recording
+
+
+class StepSignal(object):
+    ''' Pairs of setpoint and response column names. '''
+    POSITION = (rpc.ElmControl.NEW_POS, rpc.ElmStatus.CURRENT_POS)
+    SPEED = (rpc.ElmControl.SPEED, rpc.ElmStatus.CURRENT_SPEED)
+
+
+class Metric(object):
+    ''' Names of the step response metrics. '''
+    START = 'start'
+    SETPOINT = 'setpoint'
+    INITIAL = 'initial'
+    RISE_TIME = 'rise_time'
+    OVERSHOOT = 'overshoot'
+    SETTLING_TIME = 'settling_time'
+    STEADY_STATE_ERROR = 'steady_state_error'
+
+
+METRICS = [Metric.START, Metric.SETPOINT, Metric.INITIAL, Metric.RISE_TIME,
+           Metric.OVERSHOOT, Metric.SETTLING_TIME, Metric.STEADY_STATE_ERROR]
+
+
+class FaultType(object):
+    ''' Fault events detected from status frame bits. '''
+    STALL = 'stall'
+    OVER_CURRENT = 'over_current'
+    OVER_TEMPERATURE = 'over_temperature'
+    LIN_ERROR = 'lin_error'
+    HVC_ERROR = 'hvc_error'
+
+
+# Fault type and the status frame field flagging it
+FAULT_FIELDS = [
+    (FaultType.STALL, rpc.ElmStatus.STALL_DETECTED),
+    (FaultType.OVER_CURRENT, rpc.ElmStatus.OVER_CURRENT),
+    (FaultType.OVER_TEMPERATURE, rpc.ElmStatus.OVER_TEMPERATURE),
+    (FaultType.LIN_ERROR, rpc.ElmStatus.LIN_ERROR),
+    (FaultType.HVC_ERROR, rpc.ElmStatus.HVC_STATUS),
+]
+
+
+# Rise time is measured between these fractions of the step size
+RISE_LOW = 0.1
+RISE_HIGH = 0.9
+
+# Settling band as fraction of the step size
+SETTLING_BAND = 0.02
+
+
+def expandControl(data):
+    ''' Returns dict of control field name to per sample arrays of a
+        recording read by recording.RecordingReader.read().
+    '''
+    control = data['control']
+    idx = np.searchsorted(control[recording.TIMESTAMP], data[recording.TIMESTAMP], 'right') - 1
+    idx = np.clip(idx, 0, None)
+    return {name: control[name][idx] for name, _ in recording.CONTROL_FIELDS}
+
+
+def _firstTrue(mask, offsets, index):
+    ''' Returns per segment sample index of the first True in mask or -1.
+        - mask: Boolean array of the segmented samples
+        - offsets: Start of every segment within mask
+        - index: Sample index of every element of mask
+    '''
+    none = index[-1] + 1
+    first = np.minimum.reduceat(np.where(mask, index, none), offsets)
+    return np.where(first == none, -1, first)
+
+
+def stepResponse(time, setpoint, response, band=SETTLING_BAND, minBand=1.0):
+    ''' Computes step response metrics of all setpoint changes.
+        - time: Sample times in seconds
+        - setpoint: Setpoint in effect per sample
+        - response: Measured value per sample
+        - band: Settling band as fraction of the step size
+        - minBand: Minimum half width of the settling band
+        Returns dict of Metric name to array with one entry per step.
+        Times are relative to the setpoint change, NaN if not reached;
+        overshoot is in percent of the step size. The steady state error
+        is the target minus the mean response after settling, NaN if the
+        step never settled.
+    '''
+    time = np.asarray(time, np.float64)
+    setpoint = np.asarray(setpoint, np.float64)
+    response = np.asarray(response, np.float64)
+
+    # A step lasts from one setpoint change up to the next one
+    starts = np.flatnonzero(np.diff(setpoint)) + 1
+    if not len(starts):
+        return {name: np.empty(0) for name in METRICS}
+    ends = np.append(starts[1:], len(setpoint))
+    lengths = ends - starts
+
+    # Per sample view of the step it belongs to
+    stepIdx = np.repeat(np.arange(len(starts)), lengths)
+    sel = slice(starts[0], None)
+    y, index = response[sel], np.arange(starts[0], len(setpoint))
+    offsets = starts - starts[0]
+
+    target = setpoint[starts]
+    initial = response[starts - 1]
+    size = target - initial
+    scale = np.where(size == 0, np.nan, size)
+
+    # Normalised response, 0 at the initial value and 1 at the target
+    progress = (y - initial[stepIdx]) / scale[stepIdx]
+
+    riseLow = _firstTrue(progress >= RISE_LOW, offsets, index)
+    riseHigh = _firstTrue(progress >= RISE_HIGH, offsets, index)
+    riseTime = np.where((riseLow >= 0) & (riseHigh >= 0),
+                        time[riseHigh] - time[np.maximum(riseLow, 0)], np.nan)
+
+    peak = np.maximum.reduceat(progress, offsets)
+    overshoot = np.clip(peak - 1.0, 0.0, None) * 100.0
+
+    # Settled after the last sample outside the band if that is not the last one
+    halfWidth = np.maximum(np.abs(size) * band, minBand)
+    outside = np.abs(y - target[stepIdx]) > halfWidth[stepIdx]
+    lastOutside = np.maximum.reduceat(np.where(outside, index, -1), offsets)
+    settledIdx = np.where(lastOutside < 0, starts, lastOutside + 1)
+    isSettled = settledIdx < ends
+    settlingTime = np.where(isSettled, time[np.minimum(settledIdx, len(time) - 1)] - time[starts], np.nan)
+
+    # Steady state over the samples after settling
+    cumsum = np.concatenate(([0.0], np.cumsum(response)))
+    settledStarts = np.minimum(settledIdx, ends - 1)
+    settledMean = (cumsum[ends] - cumsum[settledStarts]) / (ends - settledStarts)
+    steadyStateError = np.where(isSettled, target - settledMean, np.nan)
+
+    return {
+        Metric.START: time[starts],
+        Metric.SETPOINT: target,
+        Metric.INITIAL: initial,
+        Metric.RISE_TIME: riseTime,
+        Metric.OVERSHOOT: np.where(np.isnan(scale), np.nan, overshoot),
+        Metric.SETTLING_TIME: settlingTime,
+        Metric.STEADY_STATE_ERROR: steadyStateError,
+    }
+
+
+def faultEvents(time, columns):
+    ''' Detects fault events from the edges of the status bits.
+        - time: Sample times in seconds
+        - columns: Dict of status field name to per sample values
+        Returns dict of FaultType to (starts, ends) arrays. An event ends
+        with the first sample without the bit, NaN if still active.
+    '''
+    time = np.asarray(time, np.float64)
+    events = {}
+    for faultType, field in FAULT_FIELDS:
+        active = np.asarray(columns[field]) != 0
+        edges = np.diff(np.concatenate(([False], active, [False])).astype(np.int8))
+        rising = np.flatnonzero(edges > 0)
+        falling = np.flatnonzero(edges < 0)
+        ends = np.full(len(falling), np.nan)
+        isEnded = falling < len(time)
+        ends[isEnded] = time[falling[isEnded]]
+        events[faultType] = (time[rising], ends)
+    return events
+
+
+def analyseColumns(columns, signal=StepSignal.POSITION, **kwargs):
+    ''' Step response metrics of telemetry columns, e.g. of
+        model.TelemetryStore.columns(). See stepResponse().
+    '''
+    setpointName, responseName = signal
+    return stepResponse(columns['time'], columns[setpointName], columns[responseName], **kwargs)
+
+
+def analyseRecording(path, signal=StepSignal.POSITION, **kwargs):
+    ''' Step response metrics of a recording file. See stepResponse(). '''
+    reader = recording.RecordingReader(path)
+    data = reader.read()
+    control = expandControl(data)
+    setpointName, responseName = signal
+    time = (data[recording.TIMESTAMP] - reader.startTimestamp) * 1e-9
+    return stepResponse(time, control[setpointName], data[responseName], **kwargs)
+
+
+def summary(metrics):
+    ''' Returns text summary of step response metrics. '''
+    lines = ["{} steps".format(len(metrics[Metric.START]))]
+    for name in [Metric.RISE_TIME, Metric.OVERSHOOT, Metric.SETTLING_TIME, Metric.STEADY_STATE_ERROR]:
+        values = metrics[name][~np.isnan(metrics[name])]
+        if len(values):
+            lines.append("{:<20} mean {:10.3f}  median {:10.3f}  max {:10.3f}".format(
+                name, values.mean(), np.median(values), values.max()))
+        else:
+            lines.append("{:<20} n/a".format(name))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    import unittest
+
+    class TestStepResponse(unittest.TestCase):
+        ''' Unit test of stepResponse function.
+        '''
+
+        def test_metrics(self):
+            time = np.arange(12) * 0.1
+            setpoint = np.array([0, 0, 100, 100, 100, 100, 100, 100, 20, 20, 20, 20])
+            response = np.array([0, 0, 0, 50, 95, 110, 101, 100, 100, 40, 20, 20])
+            metrics = stepResponse(time, setpoint, response, minBand=0.0)
+
+            np.testing.assert_allclose(metrics[Metric.START], [0.2, 0.8])
+            np.testing.assert_allclose(metrics[Metric.RISE_TIME], [0.1, 0.1])
+            np.testing.assert_allclose(metrics[Metric.OVERSHOOT], [10.0, 0.0])
+            np.testing.assert_allclose(metrics[Metric.SETTLING_TIME], [0.4, 0.2])
+            # Mean of the samples after settling, the transient is excluded
+            np.testing.assert_allclose(metrics[Metric.STEADY_STATE_ERROR], [100 - 100.5, 0.0])
+
+        def test_notSettled(self):
+            metrics = stepResponse(np.arange(4), [0, 10, 10, 10], [0, 0, 0, 0])
+            self.assertTrue(np.isnan(metrics[Metric.RISE_TIME][0]))
+            self.assertTrue(np.isnan(metrics[Metric.SETTLING_TIME][0]))
+            self.assertTrue(np.isnan(metrics[Metric.STEADY_STATE_ERROR][0]))
+
+        def test_faultEvents(self):
+            columns = {field: np.zeros(6) for _, field in FAULT_FIELDS}
+            columns[rpc.ElmStatus.STALL_DETECTED] = np.array([0, 1, 1, 0, 0, 1])
+            events = faultEvents(np.arange(6) * 0.5, columns)
+            starts, ends = events[FaultType.STALL]
+            np.testing.assert_allclose(starts, [0.5, 2.5])
+            np.testing.assert_allclose(ends, [1.5, np.nan])
+            self.assertEqual(len(events[FaultType.OVER_CURRENT][0]), 0)
+
+        def test_noSteps(self):
+            metrics = stepResponse(np.arange(3), [5, 5, 5], [0, 1, 2])
+            self.assertEqual(len(metrics[Metric.START]), 0)
+
+    parser = argparse.ArgumentParser(description='Step response analysis of recordings')
+    parser.add_argument('--signal', choices=['position', 'speed'], default='position')
+    parser.add_argument('recordings', nargs='*')
+    args = parser.parse_args()
+
+    if not args.recordings:
+        unittest.main(argv=sys.argv[:1])
+
+    signal = StepSignal.SPEED if 'speed' == args.signal else StepSignal.POSITION
+    for path in args.recordings:
+        print(path)
+        print(summary(analyseRecording(path, signal)))
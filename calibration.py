@@ -0,0 +1,175 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Per-board calibration of raw status fields to engineering units.
+
+ A calibration is either linear (factor and offset) or a lookup table
+ of raw values and their engineering values, interpolated linearly,
+ e.g. for the not quite linear Tj sensor. Calibrations convert whole
+ NumPy arrays at once, so live plots, exports and recordings are
+ converted in batches instead of per sample.
+
+ Calibration file (JSON), keys of "fields" are rpc.ElmStatus names:
+   {
+     "board": "HVC4223 #17",
+     "fields": {
+       "bvdd": {"factor": 0.201, "offset": -0.1},
+       "tj": {"table": [[0, -62.0], [100, 39.5], [255, 197.0]]}
+     }
+   }
+
+ Usage: python calibration.py calibration.json recording.rec
+
+'''
+
+import json
+
+import numpy as np
+
+
+class CalibrationError(Exception):
+    ''' Invalid calibration data. '''
+
+
+class LinearCalibration(object):
+    ''' Engineering value = raw * factor + offset. '''
+
+    def __init__(self, factor=1.0, offset=0.0):
+        self.factor = factor
+        self.offset = offset
+
+    def __call__(self, raw):
+        ''' Returns raw value or array in engineering units. '''
+        return np.asarray(raw, np.float64) * self.factor + self.offset
+
+    def toDict(self):
+        return {'factor': self.factor, 'offset': self.offset}
+
+
+class TableCalibration(object):
+    ''' Lookup table of raw values and their engineering values.
+        Values between the points are interpolated linearly, values
+        outside are clamped to the first and last point.
+    '''
+
+    def __init__(self, points):
+        '''
+            - points: Sequence of (raw, engineering value) pairs
+        '''
+        points = np.asarray(points, np.float64)
+        if 2 != points.ndim or points.shape[1] != 2 or len(points) < 2:
+            raise CalibrationError("Calibration table needs at least two (raw, value) points")
+        points = points[np.argsort(points[:, 0], kind='stable')]
+        if not np.all(np.diff(points[:, 0]) > 0):
+            raise CalibrationError("Duplicate raw value in calibration table")
+        self.raw = points[:, 0]
+        self.values = points[:, 1]
+
+    def __call__(self, raw):
+        ''' Returns raw value or array in engineering units. '''
+        return np.interp(raw, self.raw, self.values)
+
+    def toDict(self):
+        return {'table': np.column_stack((self.raw, self.values)).tolist()}
+
+
+def calibrationFromDict(data):
+    ''' Returns LinearCalibration or TableCalibration of a field entry. '''
+    try:
+        if 'table' in data:
+            return TableCalibration(data['table'])
+        return LinearCalibration(float(data.get('factor', 1.0)), float(data.get('offset', 0.0)))
+    except (TypeError, ValueError, AttributeError) as error:
+        raise CalibrationError("Invalid calibration entry {!r}: {}".format(data, error))
+
+
+class BoardCalibration(object):
+    ''' Calibrations of the status fields of one board. '''
+
+    def __init__(self, board='', fields=None):
+        '''
+            - board: Name or serial number of the board
+            - fields: Dict of rpc.ElmStatus field name to calibration
+        '''
+        self.board = board
+        self.fields = dict(fields or {})
+
+    def get(self, field, default=None):
+        ''' Returns calibration of field or default. '''
+        return self.fields.get(field, default)
+
+    def convert(self, columns):
+        ''' Returns dict of field name to engineering values of all
+            calibrated fields present in columns, e.g. of
+            model.TelemetryStore.columns() or recording.RecordingReader.read().
+        '''
+        return {field: calibration(columns[field])
+                for field, calibration in self.fields.items() if field in columns}
+
+    def toDict(self):
+        return {'board': self.board,
+                'fields': {field: calibration.toDict() for field, calibration in self.fields.items()}}
+
+    @staticmethod
+    def fromDict(data):
+        try:
+            fields = {field: calibrationFromDict(entry) for field, entry in data.get('fields', {}).items()}
+            return BoardCalibration(data.get('board', ''), fields)
+        except AttributeError as error:
+            raise CalibrationError("Invalid calibration: {}".format(error))
+
+
+def loadCalibration(path):
+    ''' Returns BoardCalibration of a calibration file. '''
+    with open(path, 'r') as file:
+        try:
+            return BoardCalibration.fromDict(json.load(file))
+        except ValueError as error:
+            raise CalibrationError("Invalid calibration file {}: {}".format(path, error))
+
+
+def saveCalibration(boardCalibration, path):
+    ''' Write BoardCalibration to a calibration file. '''
+    with open(path, 'w') as file:
+        json.dump(boardCalibration.toDict(), file, indent=2)
+
+
+if __name__ == '__main__':
+    import sys
+    import unittest
+
+    class TestCalibration(unittest.TestCase):
+        ''' Unit test of linear and table calibrations.
+        '''
+
+        def test_linear(self):
+            calibration = LinearCalibration(0.2, -1.0)
+            np.testing.assert_allclose(calibration(np.array([0, 60, 255], np.uint8)), [-1.0, 11.0, 50.0])
+
+        def test_table(self):
+            calibration = TableCalibration([[100, 40.0], [0, -60.0], [200, 145.0]])
+            np.testing.assert_allclose(calibration(np.array([0, 50, 150, 250])), [-60.0, -10.0, 92.5, 145.0])
+            self.assertRaises(CalibrationError, TableCalibration, [[0, 1.0]])
+
+        def test_dict(self):
+            board = BoardCalibration('B1', {'bvdd': LinearCalibration(0.2), 'tj': TableCalibration([[0, 0], [1, 2]])})
+            copy = BoardCalibration.fromDict(json.loads(json.dumps(board.toDict())))
+            converted = copy.convert({'bvdd': np.array([10]), 'tj': np.array([0.5]), 'speed': np.array([1])})
+            self.assertEqual(sorted(converted), ['bvdd', 'tj'])
+            np.testing.assert_allclose(converted['tj'], [1.0])
+            self.assertRaises(CalibrationError, BoardCalibration.fromDict, {'fields': {'tj': {'table': 'x'}}})
+
+    if len(sys.argv) < 3:
+        unittest.main()
+
+    import recording
+
+    board = loadCalibration(sys.argv[1])
+    converted = board.convert(recording.RecordingReader(sys.argv[2]).read())
+    print(board.board)
+    for field, values in sorted(converted.items()):
+        if len(values):
+            print("{:<20} min {:10.3f}  mean {:10.3f}  max {:10.3f}".format(
+                field, values.min(), values.mean(), values.max()))
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Discovery of LIN adapters on the serial ports.
+
+ Every candidate port is opened with a short timeout and sent a control
+ frame with the motor disabled. Only a LIN adapter echoes it. All ports
+ are probed in parallel, so the discovery takes about one probe timeout
+ instead of one read timeout per port.
+
+ Usage: python -m comLib.adapterDiscovery [--list]
+
+'''
+
+import concurrent.futures
+import threading
+
+import serial
+from serial.tools import list_ports
+
+import comLib.linAdapter as rpc
+
+
+# Read and write timeout of one probe in seconds
+PROBE_TIMEOUT = 0.3
+
+# Upper bound of a complete discovery in seconds
+DISCOVERY_TIMEOUT = 2.0
+
+# Maximum number of ports probed at the same time
+MAX_WORKERS = 16
+
+
+def candidatePorts():
+    ''' Returns sorted device names of all serial ports. '''
+    return sorted([port.device for port in list_ports.comports()])
+
+
+def _probeFrame():
+    ''' Returns control frame with the motor disabled and stopped. '''
+    frame = rpc.HVC_ControlFrame()
+    frame.initPosition = 0
+    frame.newPosition = 0
+    frame.speed = 0
+    frame.opMode = rpc.OpMode.POSITION_CTRL
+    frame.motorEnabled = False
+    frame.isStallDetection = False
+    frame.direction = rpc.Direction.STOP
+    return frame
+
+
+def probePort(comPort, timeout=PROBE_TIMEOUT):
+    ''' Returns True if a LIN adapter answers on comPort.
+        The port is closed again in any case.
+    '''
+    adapter = rpc.LINAdapter()
+    try:
+        adapter.connect(comPort, timeoutval=timeout)
+        if not adapter.isConnected:
+            return False
+        adapter.linAdapterBoard.write_timeout = timeout
+        adapter.linAdapterBoard.reset_input_buffer()
+        return adapter.callLinSendMsg(_probeFrame())
+    except (serial.SerialException, OSError, ValueError):
+        return False
+    finally:
+        if adapter.isConnected:
+            adapter.disconnect()
+
+
+def discoverAdapters(ports=None, timeout=PROBE_TIMEOUT, totalTimeout=DISCOVERY_TIMEOUT):
+    ''' Probes ports in parallel for LIN adapters.
+        - ports: Port names to probe, all serial ports if None
+        - timeout: Timeout of one probe in seconds
+        - totalTimeout: Time after which unfinished probes are ignored
+        Returns sorted list of the ports with a LIN adapter.
+    '''
+    ports = candidatePorts() if ports is None else list(ports)
+    if not ports:
+        return []
+
+    # Do not wait for probes hanging in the driver beyond totalTimeout
+    executor = concurrent.futures.ThreadPoolExecutor(min(MAX_WORKERS, len(ports)))
+    try:
+        futures = {executor.submit(probePort, port, timeout): port for port in ports}
+        done, _ = concurrent.futures.wait(futures, totalTimeout)
+    finally:
+        executor.shutdown(wait=False)
+    return sorted(futures[future] for future in done if future.result())
+
+
+def discoverAdaptersAsync(ports=None, **kwargs):
+    ''' Runs discoverAdapters() in a background thread.
+        Returns concurrent.futures.Future of the list of adapter ports.
+    '''
+    future = concurrent.futures.Future()
+
+    def discover():
+        try:
+            future.set_result(discoverAdapters(ports, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+
+    threading.Thread(target=discover, daemon=True).start()
+    return future
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import unittest
+    from unittest import mock
+
+    class TestDiscovery(unittest.TestCase):
+        ''' Unit test of discoverAdapters function with simulated ports.
+        '''
+
+        class Port(object):
+            # Echoing adapter, silent device, hanging device
+            behaviour = {'adapter': 'echo', 'modem': 'silent', 'hanging': 'hang'}
+
+            def __init__(self, comPort, *args, **kwargs):
+                if comPort not in self.behaviour:
+                    raise serial.SerialException("No such port")
+                self.mode = self.behaviour[comPort]
+                self.is_open = True
+                self.buffer = b''
+
+            def write(self, data):
+                if 'echo' == self.mode:
+                    self.buffer = bytes(data)
+
+            def read(self, count):
+                if 'hang' == self.mode:
+                    time.sleep(1.0)
+                data, self.buffer = self.buffer[:count], self.buffer[count:]
+                return data
+
+            def reset_input_buffer(self):
+                self.buffer = b''
+
+            def close(self):
+                self.is_open = False
+
+        def test_discover(self):
+            with mock.patch('serial.Serial', TestDiscovery.Port):
+                start = time.perf_counter()
+                ports = discoverAdapters(['modem', 'missing', 'hanging', 'adapter'], totalTimeout=0.5)
+                self.assertLess(time.perf_counter() - start, 0.9)
+            self.assertEqual(ports, ['adapter'])
+
+        def test_noPorts(self):
+            self.assertEqual(discoverAdaptersAsync([]).result(1.0), [])
+
+    if len(sys.argv) > 1 and '--list' == sys.argv[1]:
+        print('\n'.join(discoverAdapters()) or "No LIN adapter found")
+    else:
+        unittest.main()
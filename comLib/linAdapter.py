@@ -9,6 +9,11 @@
 
 '''
 
+import collections
+import contextlib
+import threading
+import time
+
 import bitstring
 import serial
 
@@ -123,6 +128,30 @@ class ElmDiag():
     D4 = 'd4'
     D5 = 'd5'
 
+
+class DiagPCI(object):
+    ''' Protocol control information (PCI) of LIN diagnostic frames. '''
+    
+    # Frame types, upper nibble of the PCI byte
+    SINGLE_FRAME = 0x00
+    FIRST_FRAME = 0x10
+    CONSECUTIVE_FRAME = 0x20
+    TYPE_MASK = 0xF0
+    
+    # Payload bytes per frame type
+    SINGLE_FRAME_LENGTH = 6
+    FIRST_FRAME_LENGTH = 5
+    CONSECUTIVE_FRAME_LENGTH = 6
+    
+    # Maximum payload of a segmented message (12 bit length)
+    MAX_LENGTH = 0xFFF
+    
+    # Value of unused payload bytes
+    FILL_BYTE = 0xFF
+
+# Payload bytes following the PCI byte of a diag frame
+_DIAG_DATA_FIELDS = (ElmDiag.SID, ElmDiag.D1, ElmDiag.D2, ElmDiag.D3, ElmDiag.D4, ElmDiag.D5)
+
 # Header bitstring format of HCV frame 
 
 #BBR cng for timestamp uint:32={}
@@ -218,8 +247,29 @@ class HVC_Frame(dict):
         #Frame as bytearray
         self._frame   = None 
         
+        # Monotonic time.perf_counter_ns() timestamps of the transfer
+        # on the serial line, set by LINAdapter
+        self.txTimestamp = None
+        self.rxTimestamp = None
+        
         self.update(header)
     
+    @property
+    def sampleTimestamp(self):
+        ''' Best estimate of the sampling time in nanoseconds:
+            the middle between request and response.
+        '''
+        if self.txTimestamp is None or self.rxTimestamp is None:
+            return None
+        return (self.txTimestamp + self.rxTimestamp) // 2
+    
+    @property
+    def roundTripTime(self):
+        ''' Time between request and response in nanoseconds. '''
+        if self.txTimestamp is None or self.rxTimestamp is None:
+            return None
+        return self.rxTimestamp - self.txTimestamp
+    
     
     def toBytearray(self):
         ''' Convert HCV frame to byte array'''
@@ -254,7 +304,13 @@ class HVC_ControlFrame(HVC_Frame):
     ''' Represents a HCV control frame. '''
         
     def __init__(self):
-        self._header = HVC_Header(0xAA, FrameID.CONTROL, 7)      #, 0       
+        # Incremented with every change of the control data
+        self.version = 0
+
+        # Optional function called after a change of the control data
+        self.onChange = None
+
+        self._header = HVC_Header(0xAA, FrameID.CONTROL, 7)      #, 0
         super().__init__(self._header, _HVC_CONTROL_FORMAT)
 
         #Init Frame default values
@@ -265,7 +321,16 @@ class HVC_ControlFrame(HVC_Frame):
         self[ElmControl.ENABLE] = None
         self[ElmControl.ENABLE_STALL_DETECTION] = None
         self[ElmControl.DIRECTION] = None
-        
+
+    def __setitem__(self, key, value):
+        ''' Set frame element, counting changes in version. '''
+        isChanged = self.get(key) != value
+        super().__setitem__(key, value)
+        if isChanged:
+            self.version += 1
+            if self.onChange is not None:
+                self.onChange()
+
     @property
     def initPosition(self):
         return self[ElmControl.INIT_CURRENT_POS]
@@ -504,6 +569,103 @@ class HVC_DiagRecFrame(HVC_Frame):
 
 
 
+def segmentDiagRequest(nad, payload):
+    ''' Split a diagnostic request into LIN transport layer frames.
+        - nad: Node address of the slave
+        - payload: Request bytes starting with the SID
+        Returns list of HVC_DiagSendFrame: one single frame or a first
+        frame followed by consecutive frames.
+    '''
+    payload = bytes(payload)
+    if not 0 < len(payload) <= DiagPCI.MAX_LENGTH:
+        raise LINDiagError("Invalid diagnostic request length {}".format(len(payload)))
+    
+    def createFrame(pci, data):
+        frame = HVC_DiagSendFrame()
+        frame.nad = nad
+        frame.pci = pci
+        data = data.ljust(len(_DIAG_DATA_FIELDS), bytes([DiagPCI.FILL_BYTE]))
+        for field, value in zip(_DIAG_DATA_FIELDS, data):
+            frame[field] = value
+        return frame
+    
+    if len(payload) <= DiagPCI.SINGLE_FRAME_LENGTH:
+        return [createFrame(DiagPCI.SINGLE_FRAME | len(payload), payload)]
+    
+    # First frame carries the 12 bit length in PCI low nibble and next byte
+    length = len(payload)
+    frames = [createFrame(DiagPCI.FIRST_FRAME | (length >> 8),
+                          bytes([length & 0xFF]) + payload[:DiagPCI.FIRST_FRAME_LENGTH])]
+    
+    sequenceNumber = 1
+    for pos in range(DiagPCI.FIRST_FRAME_LENGTH, length, DiagPCI.CONSECUTIVE_FRAME_LENGTH):
+        frames.append(createFrame(DiagPCI.CONSECUTIVE_FRAME | sequenceNumber,
+                                  payload[pos:pos + DiagPCI.CONSECUTIVE_FRAME_LENGTH]))
+        sequenceNumber = (sequenceNumber + 1) & 0x0F
+    
+    return frames
+
+
+class DiagReassembler(object):
+    ''' Reassembles a diagnostic response from received LIN frames. '''
+    
+    def __init__(self, nad):
+        '''
+            - nad: Node address the response is expected from
+        '''
+        self._nad = nad
+        self.length = None
+        self.received = 0
+        self._sequenceNumber = None
+    
+    @property
+    def isComplete(self):
+        ''' True when the whole response payload is received. '''
+        return self.length is not None and self.received >= self.length
+    
+    @property
+    def remainingFrames(self):
+        ''' Number of consecutive frames still expected. '''
+        if self.length is None:
+            return 1
+        remaining = max(self.length - self.received, 0)
+        return -(-remaining // DiagPCI.CONSECUTIVE_FRAME_LENGTH)
+    
+    def add(self, recFrame):
+        ''' Add received HVC_DiagRecFrame.
+            Returns the new payload bytes carried by the frame.
+        '''
+        if recFrame.nad != self._nad:
+            raise LINDiagError("Response from NAD 0x{:02X}, expected 0x{:02X}".format(recFrame.nad, self._nad))
+        
+        data = bytes(recFrame[field] for field in _DIAG_DATA_FIELDS)
+        frameType = recFrame.pci & DiagPCI.TYPE_MASK
+        
+        if self.length is None and DiagPCI.SINGLE_FRAME == frameType:
+            self.length = recFrame.pci & 0x0F
+            if not 0 < self.length <= DiagPCI.SINGLE_FRAME_LENGTH:
+                raise LINDiagError("Invalid single frame length {}".format(self.length))
+            chunk = data[:self.length]
+        
+        elif self.length is None and DiagPCI.FIRST_FRAME == frameType:
+            self.length = ((recFrame.pci & 0x0F) << 8) | data[0]
+            self._sequenceNumber = 1
+            chunk = data[1:1 + min(self.length, DiagPCI.FIRST_FRAME_LENGTH)]
+        
+        elif self.length is not None and DiagPCI.CONSECUTIVE_FRAME == frameType:
+            if (recFrame.pci & 0x0F) != self._sequenceNumber:
+                raise LINDiagError("Consecutive frame {} received, expected {}".format(
+                    recFrame.pci & 0x0F, self._sequenceNumber))
+            self._sequenceNumber = (self._sequenceNumber + 1) & 0x0F
+            chunk = data[:self.length - self.received]
+        
+        else:
+            raise LINDiagError("Unexpected diagnostic frame PCI 0x{:02X}".format(recFrame.pci))
+        
+        self.received += len(chunk)
+        return chunk
+
+
 class Procedure(object):
     ''' Procedures that are remote callable an LIN-Adapater hardware. '''
     
@@ -513,15 +675,120 @@ class Procedure(object):
 class LINAdapterCOMError(Exception):
     pass
 
+class LINDiagError(Exception):
+    ''' Error of the LIN diagnostic transport layer. '''
+    pass
+
+
+class LinkMonitor(object):
+    ''' Link quality statistics of the serial LIN adapter connection.
+        Keeps the latencies of the last WINDOW_SIZE control echoes and
+        status responses and counts the transfer errors.
+    '''
+    
+    # Number of latencies rolling statistics are calculated of
+    WINDOW_SIZE = 500
+    
+    # Reported latency percentiles
+    PERCENTILES = (50, 95, 99)
+    
+    def __init__(self, windowSize=WINDOW_SIZE):
+        '''
+            - windowSize: Number of latencies kept per frame type
+        '''
+        self._controlLatencies = collections.deque(maxlen=windowSize)
+        self._statusLatencies = collections.deque(maxlen=windowSize)
+        self.reset()
+    
+    def reset(self):
+        ''' Deletes all latencies and error counters. '''
+        self._controlLatencies.clear()
+        self._statusLatencies.clear()
+        self.transfers = 0
+        self.missedEchoes = 0
+        self.shortReads = 0
+        self.resyncs = 0
+    
+    def addControlEcho(self, roundTripTime, isEchoed):
+        ''' Account a control frame transfer.
+            - roundTripTime: Time from request to echo in nanoseconds
+            - isEchoed: False if the echo did not match the request
+        '''
+        self.transfers += 1
+        if isEchoed:
+            self._controlLatencies.append(roundTripTime)
+        else:
+            self.missedEchoes += 1
+    
+    def addStatusResponse(self, roundTripTime):
+        ''' Account a complete status frame transfer.
+            - roundTripTime: Time from request to response in nanoseconds
+        '''
+        self.transfers += 1
+        self._statusLatencies.append(roundTripTime)
+    
+    def addShortRead(self):
+        ''' Account a read that returned less bytes than expected. '''
+        self.shortReads += 1
+    
+    def addResync(self):
+        ''' Account a flush of the receive buffer after a transfer error. '''
+        self.resyncs += 1
+    
+    @staticmethod
+    def _latencyStatistics(latencies):
+        ''' Returns dict of latency percentiles, jitter and maximum in ms. '''
+        if not latencies:
+            return None
+        
+        latencies = np.array(latencies) * 1e-6
+        stats = {'p{}'.format(p): v for p, v in 
+                 zip(LinkMonitor.PERCENTILES, np.percentile(latencies, LinkMonitor.PERCENTILES))}
+        stats['jitter'] = float(np.std(latencies))
+        stats['max'] = float(np.max(latencies))
+        return stats
+    
+    def statistics(self):
+        ''' Returns dict with rolling latency statistics of control echoes
+            and status responses and the error counters.
+        '''
+        return {
+            'control': self._latencyStatistics(self._controlLatencies),
+            'status': self._latencyStatistics(self._statusLatencies),
+            'transfers': self.transfers,
+            'missedEchoes': self.missedEchoes,
+            'shortReads': self.shortReads,
+            'resyncs': self.resyncs,
+        }
+
+
 class LINAdapter(object):
     ''' 
         Offers operations for remote procedure call (RPC) on LIN-Adapter.
     '''
+    
+    # Maximum number of diagnostic frames sent ahead of their responses
+    DIAG_PIPELINE_DEPTH = 4
+    
+    # Default seconds between the last request frame and the first
+    # response header (P2 time), for slaves that need time to prepare
+    # the response, e.g. 0.05
+    DIAG_RESPONSE_DELAY = 0.0
+    
 #edit here    
     def __init__(self ):
         self.linAdapterBoard = None
         self._isConnected = False
         
+        # Latency and error statistics of the serial link
+        self.linkMonitor = LinkMonitor()
+        
+        # Serializes request/response transfers of different threads
+        self._lock = threading.RLock()
+        
+        # Seconds diagRequestStream waits before polling the response
+        self.diagResponseDelay = LINAdapter.DIAG_RESPONSE_DELAY
+        
     def __del__(self):
         if self._isConnected:
             self.disconnect()
@@ -533,6 +800,7 @@ class LINAdapter(object):
         
         if self.linAdapterBoard.is_open == True:
             self._isConnected = True
+            self.linkMonitor.reset()
         else:
             print('Not connected')
 
@@ -553,39 +821,237 @@ class LINAdapter(object):
             If not connected returns None
         '''
         if self._isConnected:
-            #Send Msg ID 0x30 to LinAdapter
-            frame = hvcCtrlFrame.toBytearray()
-            #Format of frame = bytearray(b'data')
-            self.linAdapterBoard.write(frame)
-            #Receive same Msg from LinAdapter
-            framerec = self.linAdapterBoard.read(3 + hvcCtrlFrame['DataLength']) #Payload 7 + Sync, ID and len
-            #received frame is in bytes format for compare we need to convert it to a bytearray()
-            framerecbytearray = bytearray(framerec)
+            with self._lock:
+                #Send Msg ID 0x30 to LinAdapter
+                frame = hvcCtrlFrame.toBytearray()
+                #Format of frame = bytearray(b'data')
+                hvcCtrlFrame.txTimestamp = time.perf_counter_ns()
+                self.linAdapterBoard.write(frame)
+                #Receive same Msg from LinAdapter
+                framerec = self.linAdapterBoard.read(3 + hvcCtrlFrame['DataLength']) #Payload 7 + Sync, ID and len
+                hvcCtrlFrame.rxTimestamp = time.perf_counter_ns()
+                #received frame is in bytes format for compare we need to convert it to a bytearray()
+                framerecbytearray = bytearray(framerec)
+                if len(framerecbytearray) < len(frame):
+                    self.linkMonitor.addShortRead()
             
-            tbol = np.array_equal(frame, framerecbytearray) #returns true if same, false if different
-            if (False == tbol):
-                print('no answer from Comport')
-                return False
+                tbol = np.array_equal(frame, framerecbytearray) #returns true if same, false if different
+                self.linkMonitor.addControlEcho(hvcCtrlFrame.roundTripTime, tbol)
+                if (False == tbol):
+                    print('no answer from Comport')
+                    self._resync()
+                    return False
 
-            return True
+                return True
         else:
             return False
     
     def callGetStatus(self, hvcReadFrame):
         ''' Calls GetStatus procedure on LIN Adapter.
             Returns HCV_StatusFrame with current status data,
-            if not connected returns None
+            if not connected or the response is incomplete returns None
         '''
         if self._isConnected:
-            returntype = type(hvcReadFrame) 
-            getFrame = hvcReadFrame._header.toBytearray()
-            self.linAdapterBoard.write(getFrame) #ToDo modular design
-            frame = self.linAdapterBoard.read(3 + hvcReadFrame['DataLength']) #Payload 6 + Sync, ID and len 
-    
-            return returntype(frame)
+            with self._lock:
+                returntype = type(hvcReadFrame) 
+                getFrame = hvcReadFrame._header.toBytearray()
+                txTimestamp = time.perf_counter_ns()
+                self.linAdapterBoard.write(getFrame) #ToDo modular design
+                frame = self.linAdapterBoard.read(3 + hvcReadFrame['DataLength']) #Payload 6 + Sync, ID and len 
+                rxTimestamp = time.perf_counter_ns()
+            
+                if len(frame) < 3 + hvcReadFrame['DataLength']:
+                    self.linkMonitor.addShortRead()
+                    self._resync()
+                    return None
+                self.linkMonitor.addStatusResponse(rxTimestamp - txTimestamp)
+    
+                statusFrame = returntype(frame)
+                statusFrame.txTimestamp = txTimestamp
+                statusFrame.rxTimestamp = rxTimestamp
+                return statusFrame
         else:
             return None
     
+    def callDiagRequest(self, nad, payload):
+        ''' Sends diagnostic request and returns the complete response.
+            - nad: Node address of the slave
+            - payload: Request bytes starting with the SID
+            Returns response bytes starting with the response SID.
+            Raises LINDiagError on transfer errors.
+        '''
+        return b''.join(self.diagRequestStream(nad, payload))
+    
+    def diagRequestStream(self, nad, payload):
+        ''' Sends diagnostic request and streams its response.
+            - nad: Node address of the slave
+            - payload: Request bytes starting with the SID
+            Yields the response payload in chunks as its frames arrive.
+            The request frames and the response headers are pipelined
+            each, so a segmented message does not wait one round trip per
+            frame. The response is polled after all request frames were
+            echoed and diagResponseDelay elapsed.
+            The link stays locked until the generator is exhausted or closed.
+            Raises LINDiagError on transfer errors.
+        '''
+        if not self._isConnected:
+            raise LINDiagError("LIN adapter not connected")
+        
+        requestFrames = [frame.toBytearray() for frame in segmentDiagRequest(nad, payload)]
+        responseHeader = HVC_DiagRecFrame()._header.toBytearray()
+        reassembler = DiagReassembler(nad)
+        
+        # The pipelines are closed explicitly, so the responses in flight
+        # are drained before the link is released, also if reassembling
+        # a response fails
+        with self._lock:
+            # Request frames are echoed, the slave answers only a complete request
+            with contextlib.closing(self._pipeline(requestFrames)) as pipeline:
+                for request, response, _, _ in pipeline:
+                    self._checkDiagEcho(request, response)
+            
+            if self.diagResponseDelay > 0:
+                time.sleep(self.diagResponseDelay)
+            
+            # First response frame, it tells the length of the response
+            with contextlib.closing(self._pipeline([responseHeader])) as pipeline:
+                for _, response, _, rxTimestamp in pipeline:
+                    yield reassembler.add(self._decodeDiagResponse(response, rxTimestamp))
+            
+            # Poll all consecutive frames of a segmented response
+            headers = [responseHeader] * reassembler.remainingFrames
+            with contextlib.closing(self._pipeline(headers)) as pipeline:
+                for _, response, _, rxTimestamp in pipeline:
+                    yield reassembler.add(self._decodeDiagResponse(response, rxTimestamp))
+    
+    def diagBatchStream(self, nad, payloads):
+        ''' Sends several diagnostic requests back-to-back and streams
+            their responses, pipelined over all requests.
+            - nad: Node address of the slave
+            - payloads: List of request payloads, each starting with a SID
+            Yields the response bytes of every request in order.
+            Every response has to fit into a single frame.
+            Raises LINDiagError on transfer errors.
+        '''
+        if not self._isConnected:
+            raise LINDiagError("LIN adapter not connected")
+        
+        responseHeader = HVC_DiagRecFrame()._header.toBytearray()
+        frames = []
+        for payload in payloads:
+            frames += [frame.toBytearray() for frame in segmentDiagRequest(nad, payload)]
+            frames.append(responseHeader)
+        
+        with self._lock, contextlib.closing(self._pipeline(frames)) as pipeline:
+            for request, response, _, rxTimestamp in pipeline:
+                if request is not responseHeader:
+                    self._checkDiagEcho(request, response)
+                    continue
+                
+                reassembler = DiagReassembler(nad)
+                chunk = reassembler.add(self._decodeDiagResponse(response, rxTimestamp))
+                if not reassembler.isComplete:
+                    raise LINDiagError("Segmented response within diagnostic batch")
+                yield chunk
+    
+    def callDiagSend(self, diagSendFrame):
+        ''' Sends a single diagnostic request frame (master request).
+            - diagSendFrame: HVC_DiagSendFrame
+            Raises LINDiagError if the adapter did not echo the frame.
+        '''
+        if not self._isConnected:
+            raise LINDiagError("LIN adapter not connected")
+
+        with self._lock:
+            frame = diagSendFrame.toBytearray()
+            diagSendFrame.txTimestamp = time.perf_counter_ns()
+            self.linAdapterBoard.write(frame)
+            response = self.linAdapterBoard.read(len(frame))
+            diagSendFrame.rxTimestamp = time.perf_counter_ns()
+            self._checkDiagEcho(frame, response)
+
+    def callDiagReceive(self):
+        ''' Requests a single diagnostic response frame (slave response).
+            Returns HVC_DiagRecFrame.
+            Raises LINDiagError on transfer errors.
+        '''
+        if not self._isConnected:
+            raise LINDiagError("LIN adapter not connected")
+
+        header = HVC_DiagRecFrame()._header.toBytearray()
+        with self._lock:
+            txTimestamp = time.perf_counter_ns()
+            self.linAdapterBoard.write(header)
+            response = self.linAdapterBoard.read(3 + 8)
+            rxTimestamp = time.perf_counter_ns()
+            if len(response) < 3 + 8:
+                self.linkMonitor.addShortRead()
+                self._resync()
+                raise LINDiagError("Incomplete diagnostic response ({} bytes)".format(len(response)))
+            recFrame = self._decodeDiagResponse(response, rxTimestamp)
+            recFrame.txTimestamp = txTimestamp
+            return recFrame
+
+    def _pipeline(self, requests, responseLength=3 + 8):
+        ''' Writes requests without waiting for the responses of the
+            previous ones, with at most DIAG_PIPELINE_DEPTH requests in
+            flight so the adapter is never flooded.
+            - requests: List of request bytearrays
+            - responseLength: Number of bytes answered to every request
+            Yields tuple (request, response, txTimestamp, rxTimestamp)
+            for every request in order.
+        '''
+        inFlight = collections.deque()
+        requests = collections.deque(requests)
+        
+        try:
+            while requests or inFlight:
+                while requests and len(inFlight) < LINAdapter.DIAG_PIPELINE_DEPTH:
+                    request = requests.popleft()
+                    inFlight.append((request, time.perf_counter_ns()))
+                    self.linAdapterBoard.write(request)
+                
+                request, txTimestamp = inFlight.popleft()
+                response = self.linAdapterBoard.read(responseLength)
+                rxTimestamp = time.perf_counter_ns()
+                
+                if len(response) < responseLength:
+                    self.linkMonitor.addShortRead()
+                    self._resync()
+                    raise LINDiagError("Incomplete diagnostic response ({} bytes)".format(len(response)))
+                
+                yield request, response, txTimestamp, rxTimestamp
+        finally:
+            # Responses of an aborted pipeline must not be taken for
+            # the responses of the next transfer, wait for the ones
+            # still in flight (up to the read timeout) before dropping them
+            if inFlight:
+                self.linAdapterBoard.read(len(inFlight) * responseLength)
+                self.linAdapterBoard.reset_input_buffer()
+    
+    def _checkDiagEcho(self, request, response):
+        ''' Raises LINDiagError if the adapter did not echo the request. '''
+        if not np.array_equal(request, bytearray(response)):
+            self.linkMonitor.addControlEcho(None, False)
+            self._resync()
+            raise LINDiagError("Diagnostic request not echoed by LIN adapter")
+    
+    def _decodeDiagResponse(self, response, rxTimestamp):
+        ''' Returns HVC_DiagRecFrame of received response bytes. '''
+        recFrame = HVC_DiagRecFrame(bytes(response))
+        if recFrame[ElmHeader.ID] != FrameID.DIAGREC:
+            self._resync()
+            raise LINDiagError("Frame 0x{:02X} received instead of diagnostic response".format(recFrame[ElmHeader.ID]))
+        recFrame.rxTimestamp = rxTimestamp
+        return recFrame
+    
+    def _resync(self):
+        ''' Drop pending received bytes after a transfer error, so the
+            next response is read from its start.
+        '''
+        self.linAdapterBoard.reset_input_buffer()
+        self.linkMonitor.addResync()
+    
 ##hier editieren ende    
     
 
@@ -636,7 +1102,16 @@ if __name__ == '__main__':
 
             #Check both are equal
             self.assertDictEqual(frameDict1, frameDict2)
-            
+
+        def test_changeVersion(self):
+            changes = []
+            ctrlFrame = HVC_ControlFrame()
+            ctrlFrame.onChange = lambda: changes.append(ctrlFrame.version)
+            ctrlFrame.speed = 3
+            ctrlFrame.speed = 3
+            ctrlFrame.newPosition = 100
+            self.assertEqual(changes, [1, 2])
+
     class Test_HVC_StatusFrame(unittest.TestCase):
         ''' Unit test of HCV_StatusFrame class.
         '''
@@ -690,11 +1165,135 @@ if __name__ == '__main__':
             self.assertEqual(statusFrame.currentSpeed, currentSpeed, "")
 
             
+        def test_timestamps(self):
+            statusFrame = HVC_StatusFrame()
+            self.assertIsNone(statusFrame.sampleTimestamp)
+            self.assertIsNone(statusFrame.roundTripTime)
+            
+            statusFrame.txTimestamp = 1000
+            statusFrame.rxTimestamp = 3001
+            self.assertEqual(statusFrame.sampleTimestamp, 2000)
+            self.assertEqual(statusFrame.roundTripTime, 2001)
+            
         def test_createFrameFromByteArray(self):
             pass
         
         def test_FrameToByteArray(self):
             pass
+    
+    class TestDiagTransport(unittest.TestCase):
+        ''' Unit test of diagnostic frame segmentation and reassembly.
+        '''
+        
+        def _roundTrip(self, payload):
+            reassembler = DiagReassembler(0x7F)
+            response = b''
+            for sendFrame in segmentDiagRequest(0x7F, payload):
+                frame = sendFrame.toBytearray()
+                # Response frames carry the sync byte of the slave
+                frame[0] = 0x55
+                frame[1] = FrameID.DIAGREC
+                response += reassembler.add(HVC_DiagRecFrame(bytes(frame)))
+            self.assertTrue(reassembler.isComplete)
+            return response
+        
+        def test_singleFrame(self):
+            frames = segmentDiagRequest(0x7F, b'\x22\x01\x02')
+            self.assertEqual(len(frames), 1)
+            self.assertEqual(frames[0].pci, DiagPCI.SINGLE_FRAME | 3)
+            self.assertEqual(frames[0].d3, DiagPCI.FILL_BYTE)
+            self.assertEqual(self._roundTrip(b'\x22\x01\x02'), b'\x22\x01\x02')
+        
+        def test_multiFrame(self):
+            payload = bytes(range(200))
+            frames = segmentDiagRequest(0x7F, payload)
+            self.assertEqual(frames[0].pci, DiagPCI.FIRST_FRAME)
+            self.assertEqual(frames[0].sid, 200)
+            self.assertEqual(len(frames), 1 + 33)
+            self.assertEqual(frames[16].pci, DiagPCI.CONSECUTIVE_FRAME | 0)
+            self.assertEqual(self._roundTrip(payload), payload)
+        
+        def test_sequenceError(self):
+            reassembler = DiagReassembler(0x7F)
+            frames = [f.toBytearray() for f in segmentDiagRequest(0x7F, bytes(20))]
+            reassembler.add(HVC_DiagRecFrame(bytes(frames[0])))
+            with self.assertRaises(LINDiagError):
+                reassembler.add(HVC_DiagRecFrame(bytes(frames[2])))
+    
+    class TestDiagPipeline(unittest.TestCase):
+        ''' Unit test of the pipelined diagnostic transfers with a simulated adapter.
+        '''
+        
+        class Board(object):
+            def __init__(self):
+                self.pending = b''
+                self.operations = []
+            
+            def write(self, data):
+                # Every request is answered by a response of 11 bytes
+                self.pending += bytes(11)
+            
+            def read(self, count):
+                self.operations.append(('read', count))
+                data, self.pending = self.pending[:count], self.pending[count:]
+                return data
+            
+            def reset_input_buffer(self):
+                self.operations.append(('reset', len(self.pending)))
+                self.pending = b''
+            
+            def close(self):
+                pass
+        
+        def test_abortDrainsInFlight(self):
+            adapter = LINAdapter()
+            adapter.linAdapterBoard = self.Board()
+            pipeline = adapter._pipeline([bytearray(11)] * 6)
+            next(pipeline)
+            pipeline.close()
+            # 3 of the 4 requests sent ahead are still in flight
+            self.assertEqual(adapter.linAdapterBoard.operations, [('read', 11), ('read', 33), ('reset', 0)])
+        
+        def test_responsePolledAfterRequest(self):
+            class Slave(self.Board):
+                def write(self, data):
+                    self.operations.append(('write', data[1]))
+                    if FrameID.DIAGSEND == data[1]:
+                        self.pending += bytes(data)
+                    else:
+                        self.pending += bytes([0x55, FrameID.DIAGREC, 8, 0x7F, 0x03, 0x62, 0x01, 0x00,
+                                               0xFF, 0xFF, 0xFF])
+            
+            adapter = LINAdapter()
+            adapter.linAdapterBoard = Slave()
+            adapter._isConnected = True
+            self.assertEqual(adapter.callDiagRequest(0x7F, bytes([0x2E, 0x01, 0x00]) + bytes(17)),
+                             bytes([0x62, 0x01, 0x00]))
+            # All 4 request frames are echoed before the response header is sent
+            operations = adapter.linAdapterBoard.operations
+            self.assertEqual(operations[:8], [('write', FrameID.DIAGSEND)] * 4 + [('read', 11)] * 4)
+            self.assertEqual(operations[8:], [('write', FrameID.DIAGREC), ('read', 11)])
+    
+    class TestLinkMonitor(unittest.TestCase):
+        ''' Unit test of LinkMonitor class.
+        '''
+        
+        def test_statistics(self):
+            monitor = LinkMonitor(windowSize=100)
+            for latency in range(1, 101):
+                monitor.addControlEcho(latency * 1000000, True)
+            monitor.addControlEcho(None, False)
+            monitor.addShortRead()
+            monitor.addResync()
+            
+            stats = monitor.statistics()
+            self.assertAlmostEqual(stats['control']['p50'], 50.5)
+            self.assertAlmostEqual(stats['control']['max'], 100.0)
+            self.assertIsNone(stats['status'])
+            self.assertEqual(stats['transfers'], 101)
+            self.assertEqual(stats['missedEchoes'], 1)
+            self.assertEqual(stats['shortReads'], 1)
+            self.assertEqual(stats['resyncs'], 1)
         
         
     
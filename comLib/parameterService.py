@@ -0,0 +1,316 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Bulk read/write of motor driver parameters over LIN diagnostic frames
+ with a versioned local parameter cache.
+
+'''
+
+import contextlib
+import threading
+
+
+class ParameterSID(object):
+    ''' Diagnostic service identifiers used for parameter access. '''
+
+    READ_BY_IDENTIFIER = 0x22
+    WRITE_BY_IDENTIFIER = 0x2E
+    NEGATIVE_RESPONSE = 0x7F
+
+    # Added to the SID of a positive response
+    POSITIVE_RESPONSE_OFFSET = 0x40
+
+
+class ParameterError(Exception):
+    ''' Parameter access rejected by the motor driver. '''
+    pass
+
+
+class CacheEntry(object):
+    ''' Cached value of one parameter. '''
+
+    def __init__(self):
+        # Current local value, None until read or written
+        self.value = None
+
+        # Cache version of the last change of the value
+        self.version = 0
+
+        # Cache version the motor driver is known to hold
+        self.syncedVersion = 0
+
+        # Last error of an access to this parameter or None
+        self.error = None
+
+    @property
+    def isDirty(self):
+        ''' True if the local value was not yet written to the driver. '''
+        return self.version != self.syncedVersion
+
+
+class ParameterCache(object):
+    ''' Versioned local copy of the motor driver parameters.
+        Every change increments the cache version and tags the entry, so
+        readers can fetch what changed since the version they have seen
+        and a write that raced with a newer local change stays dirty.
+    '''
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def _entry(self, parameterId):
+        if parameterId not in self._entries:
+            self._entries[parameterId] = CacheEntry()
+        return self._entries[parameterId]
+
+    def _change(self, entry):
+        ''' Tags entry with a new cache version. '''
+        self.version += 1
+        entry.version = self.version
+        return self.version
+
+    def get(self, parameterId):
+        ''' Returns cached value of parameter or None if unknown. '''
+        with self._lock:
+            entry = self._entries.get(parameterId)
+            return None if entry is None else entry.value
+
+    def set(self, parameterId, value):
+        ''' Local change of a parameter, marked dirty until written. '''
+        with self._lock:
+            entry = self._entry(parameterId)
+            if entry.value != value:
+                entry.value = value
+                entry.error = None
+                self._change(entry)
+
+    def update(self, parameterId, value):
+        ''' Value read from the motor driver. '''
+        with self._lock:
+            entry = self._entry(parameterId)
+            entry.value = value
+            entry.error = None
+            entry.syncedVersion = self._change(entry)
+
+    def setError(self, parameterId, error):
+        ''' Remember failed access of parameter. '''
+        with self._lock:
+            entry = self._entry(parameterId)
+            isDirty = entry.isDirty
+            entry.error = error
+            self._change(entry)
+            if not isDirty:
+                entry.syncedVersion = entry.version
+
+    def markSynced(self, parameterId, version):
+        ''' Value of the given version was written to the motor driver.
+            A newer local change keeps the entry dirty.
+        '''
+        with self._lock:
+            entry = self._entries[parameterId]
+            if entry.version == version:
+                entry.syncedVersion = version
+
+    def dirty(self):
+        ''' Returns dict of parameter id to (value, version) of all
+            entries that were changed locally.
+        '''
+        with self._lock:
+            return {pid: (entry.value, entry.version)
+                    for pid, entry in self._entries.items() if entry.isDirty and entry.value is not None}
+
+    def changedSince(self, version):
+        ''' Returns dict of parameter id to CacheEntry of all entries
+            changed after the given cache version.
+        '''
+        with self._lock:
+            return {pid: entry for pid, entry in self._entries.items() if entry.version > version}
+
+    def ids(self):
+        ''' Returns sorted list of all cached parameter ids. '''
+        with self._lock:
+            return sorted(self._entries)
+
+    def clear(self):
+        ''' Deletes all cached parameters. '''
+        with self._lock:
+            self._entries.clear()
+            self.version += 1
+
+
+class ParameterService(object):
+    ''' Reads and writes motor driver parameters in bulk.
+        Parameters are addressed by 16 bit identifiers and hold
+        VALUE_LENGTH byte little endian values. Requests are sent in
+        pipelined batches of BATCH_SIZE, between batches the link is
+        released for the cyclic control and status transfers.
+    '''
+
+    # Node address of the motor driver (wildcard)
+    DEFAULT_NAD = 0x7F
+
+    # Number of bytes of a parameter value
+    VALUE_LENGTH = 2
+
+    # Number of requests pipelined without releasing the link
+    BATCH_SIZE = 16
+
+    def __init__(self, linAdapter, nad=DEFAULT_NAD):
+        '''
+            - linAdapter: LIN Adapter object
+            - nad: Node address of the motor driver
+        '''
+        self._linAdapter = linAdapter
+        self._nad = nad
+        self.cache = ParameterCache()
+
+    @staticmethod
+    def _batches(items, size):
+        for pos in range(0, len(items), size):
+            yield items[pos:pos + size]
+
+    @staticmethod
+    def _checkResponse(sid, parameterId, response):
+        ''' Raises ParameterError if response is no positive response
+            of service sid for parameterId.
+        '''
+        if len(response) >= 3 and ParameterSID.NEGATIVE_RESPONSE == response[0]:
+            raise ParameterError("Parameter 0x{:04X} rejected, NRC 0x{:02X}".format(parameterId, response[2]))
+
+        if (len(response) < 3 or response[0] != sid + ParameterSID.POSITIVE_RESPONSE_OFFSET
+                or int.from_bytes(response[1:3], 'big') != parameterId):
+            raise ParameterError("Invalid response for parameter 0x{:04X}".format(parameterId))
+
+    def read(self, parameterIds):
+        ''' Reads parameters from the motor driver into the cache.
+            Returns dict of parameter id to value of the parameters read.
+            Raises LINDiagError of the LIN adapter on transfer errors.
+        '''
+        values = {}
+        for batch in self._batches(list(parameterIds), ParameterService.BATCH_SIZE):
+            requests = [bytes([ParameterSID.READ_BY_IDENTIFIER]) + pid.to_bytes(2, 'big') for pid in batch]
+            with contextlib.closing(self._linAdapter.diagBatchStream(self._nad, requests)) as responses:
+                for pid, response in zip(batch, responses):
+                    try:
+                        self._checkResponse(ParameterSID.READ_BY_IDENTIFIER, pid, response)
+                    except ParameterError as error:
+                        self.cache.setError(pid, str(error))
+                        continue
+                    value = int.from_bytes(response[3:3 + ParameterService.VALUE_LENGTH], 'little')
+                    self.cache.update(pid, value)
+                    values[pid] = value
+
+        return values
+
+    def refresh(self):
+        ''' Re-reads all cached parameters. '''
+        return self.read(self.cache.ids())
+
+    def set(self, parameterId, value):
+        ''' Changes parameter in the cache, written by next flush().
+            Raises ParameterError if value does not fit VALUE_LENGTH bytes.
+        '''
+        maxValue = (1 << (8 * ParameterService.VALUE_LENGTH)) - 1
+        if not 0 <= value <= maxValue:
+            raise ParameterError("Value {} of parameter 0x{:04X} out of range 0..0x{:X}".format(
+                value, parameterId, maxValue))
+        self.cache.set(parameterId, value)
+
+    def flush(self):
+        ''' Writes all locally changed parameters to the motor driver.
+            Returns list of ids of the parameters written.
+            Raises LINDiagError of the LIN adapter on transfer errors.
+        '''
+        written = []
+        dirty = sorted(self.cache.dirty().items())
+        for batch in self._batches(dirty, ParameterService.BATCH_SIZE):
+            requests = [bytes([ParameterSID.WRITE_BY_IDENTIFIER]) + pid.to_bytes(2, 'big')
+                        + value.to_bytes(ParameterService.VALUE_LENGTH, 'little')
+                        for pid, (value, _) in batch]
+            with contextlib.closing(self._linAdapter.diagBatchStream(self._nad, requests)) as responses:
+                for (pid, (_, version)), response in zip(batch, responses):
+                    try:
+                        self._checkResponse(ParameterSID.WRITE_BY_IDENTIFIER, pid, response)
+                    except ParameterError as error:
+                        self.cache.setError(pid, str(error))
+                        continue
+                    self.cache.markSynced(pid, version)
+                    written.append(pid)
+
+        return written
+
+
+if __name__ == '__main__':
+    import unittest
+
+    class TestParameterCache(unittest.TestCase):
+        ''' Unit test of ParameterCache class.
+        '''
+
+        def test_dirtyTracking(self):
+            cache = ParameterCache()
+            cache.update(0x0100, 10)
+            self.assertEqual(cache.dirty(), {})
+
+            cache.set(0x0100, 20)
+            value, version = cache.dirty()[0x0100]
+            self.assertEqual(value, 20)
+
+            # Local change while the write is in flight keeps entry dirty
+            cache.set(0x0100, 30)
+            cache.markSynced(0x0100, version)
+            self.assertIn(0x0100, cache.dirty())
+
+            cache.markSynced(0x0100, cache.dirty()[0x0100][1])
+            self.assertEqual(cache.dirty(), {})
+
+        def test_changedSince(self):
+            cache = ParameterCache()
+            cache.update(1, 10)
+            version = cache.version
+            cache.update(2, 20)
+            self.assertEqual(list(cache.changedSince(version)), [2])
+
+    class TestParameterService(unittest.TestCase):
+        ''' Unit test of ParameterService class with a simulated driver.
+        '''
+
+        class Driver(object):
+            def __init__(self):
+                self.values = {0x0100: 1000, 0x0101: 7}
+
+            def diagBatchStream(self, nad, requests):
+                for request in requests:
+                    pid = int.from_bytes(request[1:3], 'big')
+                    if pid not in self.values:
+                        yield bytes([ParameterSID.NEGATIVE_RESPONSE, request[0], 0x31])
+                    elif ParameterSID.READ_BY_IDENTIFIER == request[0]:
+                        yield bytes([request[0] + 0x40]) + request[1:3] + self.values[pid].to_bytes(2, 'little')
+                    else:
+                        self.values[pid] = int.from_bytes(request[3:5], 'little')
+                        yield bytes([request[0] + 0x40]) + request[1:3]
+
+        def test_readWrite(self):
+            driver = self.Driver()
+            service = ParameterService(driver)
+            self.assertEqual(service.read([0x0100, 0x0101, 0x0200]), {0x0100: 1000, 0x0101: 7})
+            self.assertIsNotNone(service.cache.changedSince(0)[0x0200].error)
+
+            service.set(0x0101, 8)
+            self.assertEqual(service.flush(), [0x0101])
+            self.assertEqual(driver.values[0x0101], 8)
+            self.assertEqual(service.flush(), [])
+
+        def test_setOutOfRange(self):
+            service = ParameterService(self.Driver())
+            self.assertRaises(ParameterError, service.set, 0x0101, 0x10000)
+            self.assertRaises(ParameterError, service.set, 0x0101, -1)
+            self.assertEqual(service.cache.dirty(), {})
+            service.set(0x0101, 0xFFFF)
+            self.assertEqual(service.cache.dirty()[0x0101][0], 0xFFFF)
+
+    unittest.main()
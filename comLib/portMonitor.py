@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Background cache of the serial ports.
+
+ Enumerating the serial ports with list_ports.comports() reads the
+ details of every tty device and is slow on machines with many of them.
+ The monitor only lists the device directory periodically, which is
+ cheap, and enumerates the ports again when a device node was added or
+ removed. Without a device directory (Windows) the ports are enumerated
+ every FALLBACK_INTERVAL.
+
+'''
+
+import os
+import threading
+
+from serial.tools import list_ports
+
+
+# Interval in seconds the device directory is checked for changes
+POLL_INTERVAL = 0.5
+
+# Interval in seconds of the enumeration without device directory
+FALLBACK_INTERVAL = 2.0
+
+# Name prefixes of serial device nodes
+DEVICE_PREFIXES = ('tty', 'cu.', 'rfcomm')
+
+
+class PortMonitor(threading.Thread):
+    ''' Keeps the list of serial ports up to date in a worker thread.
+        The cache is valid after the first enumeration, ports() waits
+        for it.
+    '''
+
+    def __init__(self, deviceDir='/dev', pollInterval=POLL_INTERVAL, fallbackInterval=FALLBACK_INTERVAL):
+        '''
+            - deviceDir: Directory of the device nodes
+            - pollInterval: Check interval of deviceDir in seconds
+            - fallbackInterval: Enumeration interval without deviceDir
+        '''
+        super().__init__(daemon=True)
+        self._deviceDir = deviceDir
+        self._pollInterval = pollInterval
+        self._fallbackInterval = fallbackInterval
+        self._lock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._readyEvent = threading.Event()
+        self._ports = []
+
+        # Optional function called by the worker with the lists of
+        # added and removed ports
+        self.onChange = None
+
+        # Incremented with every change of the ports
+        self.version = 0
+
+    @property
+    def isReady(self):
+        ''' True after the first enumeration. '''
+        return self._readyEvent.is_set()
+
+    def ports(self, timeout=None):
+        ''' Returns sorted device names of the serial ports.
+            - timeout: Seconds to wait for the first enumeration
+        '''
+        self._readyEvent.wait(timeout)
+        with self._lock:
+            return list(self._ports)
+
+    def refresh(self):
+        ''' Enumerate the ports again at once, e.g. if the device
+            directory misses a change.
+        '''
+        self._update()
+
+    def stop(self):
+        ''' Stop monitoring. '''
+        self._stopEvent.set()
+
+    def _signature(self):
+        ''' Returns set of the serial device nodes or None without device directory. '''
+        try:
+            return frozenset(entry.name for entry in os.scandir(self._deviceDir)
+                             if entry.name.startswith(DEVICE_PREFIXES))
+        except OSError:
+            return None
+
+    def _update(self):
+        ''' Enumerate the ports and report changes. '''
+        ports = sorted(port.device for port in list_ports.comports())
+        with self._lock:
+            added = sorted(set(ports) - set(self._ports))
+            removed = sorted(set(self._ports) - set(ports))
+            self._ports = ports
+            if added or removed:
+                self.version += 1
+        self._readyEvent.set()
+        if (added or removed) and self.onChange is not None:
+            self.onChange(added, removed)
+
+    def run(self):
+        signature = self._signature()
+        self._update()
+        while True:
+            interval = self._fallbackInterval if signature is None else self._pollInterval
+            if self._stopEvent.wait(interval):
+                return
+            newSignature = self._signature()
+            if newSignature is None or newSignature != signature:
+                signature = newSignature
+                self._update()
+
+
+if __name__ == '__main__':
+    import tempfile
+    import unittest
+    from unittest import mock
+
+    class TestPortMonitor(unittest.TestCase):
+        ''' Unit test of PortMonitor class with a simulated device directory.
+        '''
+
+        class Port(object):
+            def __init__(self, device):
+                self.device = device
+
+        def test_hotplug(self):
+            with tempfile.TemporaryDirectory() as deviceDir:
+                nodes = []
+
+                def comports():
+                    return [TestPortMonitor.Port(os.path.join(deviceDir, name)) for name in nodes]
+
+                changes = []
+                with mock.patch.object(list_ports, 'comports', comports):
+                    monitor = PortMonitor(deviceDir, pollInterval=0.01)
+                    monitor.onChange = lambda added, removed: changes.append((added, removed))
+                    monitor.start()
+                    self.assertEqual(monitor.ports(1.0), [])
+
+                    nodes.append('ttyUSB0')
+                    open(os.path.join(deviceDir, 'ttyUSB0'), 'w').close()
+                    for _ in range(100):
+                        if monitor.version:
+                            break
+                        threading.Event().wait(0.01)
+                    monitor.stop()
+
+                self.assertEqual(monitor.ports(), [os.path.join(deviceDir, 'ttyUSB0')])
+                self.assertEqual(changes, [([os.path.join(deviceDir, 'ttyUSB0')], [])])
+
+    unittest.main()
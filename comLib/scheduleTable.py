@@ -0,0 +1,371 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Schedule table engine for the LIN adapter.
+
+ A schedule table is a cycle of slots, each reserved for one frame
+ (control, status, diagnostic request or diagnostic response) for a
+ fixed duration. A worker thread starts every slot at its scheduled time,
+ so the bus bandwidth of telemetry and diagnostics is set by the number
+ and duration of their slots. If the schedule runs late, late slots give
+ way to following slots of higher priority in the same cycle.
+
+ Self-test: python -m comLib.scheduleTable
+
+'''
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+
+import comLib.linAdapter as rpc
+
+
+class ScheduleSlot(object):
+    ''' Time slot of one frame in the schedule table. '''
+
+    def __init__(self, frameId, duration, priority=0):
+        '''
+            - frameId: rpc.FrameID of the slot
+            - duration: Slot length in nanoseconds
+            - priority: Late slots are skipped for later slots of higher priority
+        '''
+        if frameId not in (rpc.FrameID.CONTROL, rpc.FrameID.STATUS, rpc.FrameID.DIAGSEND, rpc.FrameID.DIAGREC):
+            raise ValueError("No schedule slot for frame 0x{:02X}".format(frameId))
+        self.frameId = frameId
+        self.duration = int(duration)
+        self.priority = priority
+
+
+# Control and status every 20 ms, diagnostics every 40 ms
+DEFAULT_SLOTS = [
+    ScheduleSlot(rpc.FrameID.CONTROL, 10000000, priority=2),
+    ScheduleSlot(rpc.FrameID.STATUS, 10000000, priority=1),
+    ScheduleSlot(rpc.FrameID.DIAGSEND, 10000000),
+    ScheduleSlot(rpc.FrameID.CONTROL, 10000000, priority=2),
+    ScheduleSlot(rpc.FrameID.STATUS, 10000000, priority=1),
+    ScheduleSlot(rpc.FrameID.DIAGREC, 10000000),
+]
+
+
+class SlotStatistics(object):
+    ''' Achieved timing of one schedule slot. '''
+
+    # Number of latest slot starts kept for the percentiles
+    WINDOW_SIZE = 500
+
+    def __init__(self, slot):
+        self.slot = slot
+        self._lateness = collections.deque(maxlen=SlotStatistics.WINDOW_SIZE)
+        self._busy = collections.deque(maxlen=SlotStatistics.WINDOW_SIZE)
+
+        # Slots with a transfer, without anything to transfer, skipped
+        # because the schedule was late and with a transfer longer than
+        # the slot duration
+        self.executed = 0
+        self.idle = 0
+        self.skipped = 0
+        self.overruns = 0
+
+    def add(self, lateness, busy, isIdle):
+        ''' Account an executed slot, times in nanoseconds. '''
+        self._lateness.append(lateness)
+        self._busy.append(busy)
+        if isIdle:
+            self.idle += 1
+        else:
+            self.executed += 1
+        if busy > self.slot.duration:
+            self.overruns += 1
+
+    def statistics(self):
+        ''' Returns dict of the slot timing, times in milliseconds. '''
+        stats = {
+            'frameId': self.slot.frameId,
+            'duration': self.slot.duration * 1e-6,
+            'executed': self.executed,
+            'idle': self.idle,
+            'skipped': self.skipped,
+            'overruns': self.overruns,
+            'lateness': None,
+            'busy': None,
+        }
+        if self._lateness:
+            lateness = np.array(self._lateness) * 1e-6
+            stats['lateness'] = {'p50': float(np.percentile(lateness, 50)),
+                                 'p95': float(np.percentile(lateness, 95)),
+                                 'max': float(lateness.max())}
+            stats['busy'] = float(np.mean(self._busy)) * 1e-6
+        return stats
+
+
+class _DiagTransaction(object):
+    ''' Diagnostic request executed in DIAGSEND and DIAGREC slots. '''
+
+    def __init__(self, nad, payload):
+        self.requestFrames = collections.deque(rpc.segmentDiagRequest(nad, payload))
+        self.reassembler = rpc.DiagReassembler(nad)
+        self.response = b''
+        self.future = concurrent.futures.Future()
+
+
+class ScheduleTable(threading.Thread):
+    ''' Executes a schedule table with the LIN adapter in a worker thread.
+        Control frames are taken from controlSource, sent control frames
+        are handed to controlCallback and received status frames to
+        statusCallback, all called by the worker.
+    '''
+
+    # Remaining time in nanoseconds spent spinning instead of sleeping
+    SPIN_THRESHOLD = 1000000
+
+    def __init__(self, linAdapter, slots=None, controlSource=None, statusCallback=None, controlCallback=None):
+        '''
+            - linAdapter: Connected LIN Adapter object
+            - slots: List of ScheduleSlot, DEFAULT_SLOTS if None
+            - controlSource: Function returning the HVC_ControlFrame to send
+                             in a control slot or None to leave it idle
+            - statusCallback: Function called with every received HVC_StatusFrame
+            - controlCallback: Function called with every HVC_ControlFrame
+                               echoed by the adapter
+        '''
+        super().__init__(daemon=True)
+        self._linAdapter = linAdapter
+        self._controlSource = controlSource
+        self._statusCallback = statusCallback
+        self._controlCallback = controlCallback
+        self._stopEvent = threading.Event()
+        self._lock = threading.Lock()
+
+        self._newSlots = None
+        self._slots = []
+        self._statistics = []
+        self.setSlots(DEFAULT_SLOTS if slots is None else slots)
+
+        self._diagQueue = collections.deque()
+        self._diag = None
+
+        # Number of cycles restarted because the schedule fell behind
+        # by more than a whole cycle
+        self.cycleSlips = 0
+
+        # Exception of a failed control or status transfer, stops the table
+        self.error = None
+
+    def setSlots(self, slots):
+        ''' Replace the schedule table, effective with the next cycle. '''
+        if not slots:
+            raise ValueError("Empty schedule table")
+        with self._lock:
+            self._newSlots = list(slots)
+
+    def submitDiagRequest(self, nad, payload):
+        ''' Queue diagnostic request for the diagnostic slots.
+            Returns concurrent.futures.Future of the response bytes.
+        '''
+        transaction = _DiagTransaction(nad, payload)
+        with self._lock:
+            isStopped = self._stopEvent.is_set()
+            if not isStopped:
+                self._diagQueue.append(transaction)
+        if isStopped:
+            transaction.future.set_exception(rpc.LINDiagError("Schedule table stopped"))
+        return transaction.future
+
+    def statistics(self):
+        ''' Returns list of SlotStatistics.statistics() of all slots. '''
+        with self._lock:
+            return [stats.statistics() for stats in self._statistics]
+
+    def stop(self):
+        ''' Stop after the current slot and fail pending diagnostic requests. '''
+        self._stopEvent.set()
+
+    def _waitUntil(self, deadline):
+        ''' Wait until perf_counter_ns deadline. Returns False if stopped. '''
+        while True:
+            remaining = deadline - time.perf_counter_ns()
+            if remaining <= 0:
+                return not self._stopEvent.is_set()
+            if remaining > ScheduleTable.SPIN_THRESHOLD:
+                if self._stopEvent.wait((remaining - ScheduleTable.SPIN_THRESHOLD) * 1e-9):
+                    return False
+            elif self._stopEvent.is_set():
+                return False
+
+    def run(self):
+        try:
+            slotStart = time.perf_counter_ns()
+            while not self._stopEvent.is_set():
+                with self._lock:
+                    if self._newSlots is not None:
+                        self._slots, self._newSlots = self._newSlots, None
+                        self._statistics = [SlotStatistics(slot) for slot in self._slots]
+                    slots, statistics = self._slots, self._statistics
+
+                # Highest priority of the slots following each slot
+                following = [max([slot.priority for slot in slots[idx + 1:]], default=-1)
+                             for idx in range(len(slots))]
+
+                for slot, stats, followingPriority in zip(slots, statistics, following):
+                    if not self._waitUntil(slotStart):
+                        return
+                    start = time.perf_counter_ns()
+                    lateness = start - slotStart
+                    slotStart += slot.duration
+
+                    if lateness >= slot.duration and slot.priority < followingPriority:
+                        stats.skipped += 1
+                        continue
+
+                    isIdle = not self._execute(slot.frameId)
+                    stats.add(lateness, time.perf_counter_ns() - start, isIdle)
+
+                # Restart the schedule instead of rushing through missed cycles
+                cycleDuration = sum(slot.duration for slot in slots)
+                now = time.perf_counter_ns()
+                if now - slotStart > cycleDuration:
+                    self.cycleSlips += 1
+                    slotStart = now
+        except Exception as error:
+            self.error = error
+        finally:
+            self._failDiagRequests()
+
+    def _execute(self, frameId):
+        ''' Execute the transfer of a slot. Returns False if idle. '''
+        if rpc.FrameID.CONTROL == frameId:
+            frame = None if self._controlSource is None else self._controlSource()
+            if frame is None:
+                return False
+            if not self._linAdapter.callLinSendMsg(frame):
+                raise rpc.LINAdapterCOMError("Control frame not echoed")
+            if self._controlCallback is not None:
+                self._controlCallback(frame)
+
+        elif rpc.FrameID.STATUS == frameId:
+            status = self._linAdapter.callGetStatus(rpc.HVC_StatusFrame())
+            if status is not None and self._statusCallback is not None:
+                self._statusCallback(status)
+
+        elif rpc.FrameID.DIAGSEND == frameId:
+            if self._diag is None and self._diagQueue:
+                self._diag = self._diagQueue.popleft()
+            if self._diag is None or not self._diag.requestFrames:
+                return False
+            self._diagTransfer(lambda diag: self._linAdapter.callDiagSend(diag.requestFrames.popleft()))
+
+        elif rpc.FrameID.DIAGREC == frameId:
+            if self._diag is None or self._diag.requestFrames:
+                return False
+            self._diagTransfer(self._receiveDiagResponse)
+
+        return True
+
+    def _diagTransfer(self, transfer):
+        ''' Run transfer of the current diagnostic request, failing the
+            request instead of the schedule on errors.
+        '''
+        diag = self._diag
+        try:
+            transfer(diag)
+        except rpc.LINDiagError as error:
+            self._diag = None
+            diag.future.set_exception(error)
+
+    def _receiveDiagResponse(self, diag):
+        ''' Receive one response frame of the current diagnostic request. '''
+        diag.response += diag.reassembler.add(self._linAdapter.callDiagReceive())
+        if diag.reassembler.isComplete:
+            self._diag = None
+            diag.future.set_result(diag.response)
+
+    def _failDiagRequests(self):
+        ''' Fail current and queued diagnostic requests. Requests
+            submitted afterwards fail at once, also if the table stopped
+            because of an error.
+        '''
+        with self._lock:
+            self._stopEvent.set()
+            pending = list(self._diagQueue)
+            self._diagQueue.clear()
+        if self._diag is not None:
+            pending.insert(0, self._diag)
+            self._diag = None
+        for diag in pending:
+            diag.future.set_exception(rpc.LINDiagError("Schedule table stopped"))
+
+
+if __name__ == '__main__':
+    import unittest
+
+    class TestScheduleTable(unittest.TestCase):
+        ''' Unit test of ScheduleTable class with a simulated adapter.
+        '''
+
+        class Adapter(object):
+            def __init__(self):
+                self.transfers = []
+                self.responses = collections.deque()
+
+            def callLinSendMsg(self, frame):
+                self.transfers.append(rpc.FrameID.CONTROL)
+                return True
+
+            def callGetStatus(self, frame):
+                self.transfers.append(rpc.FrameID.STATUS)
+                return frame
+
+            def callDiagSend(self, frame):
+                self.transfers.append(rpc.FrameID.DIAGSEND)
+                # Positive response echoing the request data
+                response = rpc.HVC_DiagRecFrame()
+                for field in (rpc.ElmDiag.NAD, rpc.ElmDiag.PCI, rpc.ElmDiag.SID, rpc.ElmDiag.D1,
+                              rpc.ElmDiag.D2, rpc.ElmDiag.D3, rpc.ElmDiag.D4, rpc.ElmDiag.D5):
+                    response[field] = frame[field]
+                response[rpc.ElmDiag.SID] = frame[rpc.ElmDiag.SID] + 0x40
+                self.responses.append(response)
+
+            def callDiagReceive(self):
+                self.transfers.append(rpc.FrameID.DIAGREC)
+                return self.responses.popleft()
+
+        def test_slots(self):
+            adapter = self.Adapter()
+            statuses = []
+            slots = [ScheduleSlot(rpc.FrameID.CONTROL, 2000000), ScheduleSlot(rpc.FrameID.STATUS, 2000000),
+                     ScheduleSlot(rpc.FrameID.DIAGSEND, 2000000), ScheduleSlot(rpc.FrameID.DIAGREC, 2000000)]
+            controls = []
+            table = ScheduleTable(adapter, slots, lambda: rpc.HVC_ControlFrame(), statuses.append, controls.append)
+            future = table.submitDiagRequest(0x7F, bytes([0x22, 0x01, 0x00]))
+            table.start()
+            self.assertEqual(future.result(1.0), bytes([0x62, 0x01, 0x00]))
+            time.sleep(0.05)
+            table.stop()
+            table.join()
+
+            self.assertEqual(adapter.transfers[:4], [rpc.FrameID.CONTROL, rpc.FrameID.STATUS,
+                                                     rpc.FrameID.DIAGSEND, rpc.FrameID.DIAGREC])
+            self.assertGreater(len(statuses), 5)
+            self.assertEqual(len(controls), adapter.transfers.count(rpc.FrameID.CONTROL))
+            stats = table.statistics()
+            self.assertEqual(stats[2]['executed'], 1)
+            self.assertGreater(stats[2]['idle'], 0)
+            self.assertLess(stats[0]['lateness']['p50'], 1.0)
+
+        def test_submitAfterError(self):
+            adapter = self.Adapter()
+            adapter.callGetStatus = None
+            table = ScheduleTable(adapter, [ScheduleSlot(rpc.FrameID.STATUS, 1000000)])
+            table.start()
+            table.join(1.0)
+            self.assertIsInstance(table.error, TypeError)
+            future = table.submitDiagRequest(0x7F, bytes([0x22, 0x01, 0x00]))
+            self.assertRaises(rpc.LINDiagError, future.result, 0)
+
+    unittest.main()
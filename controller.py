@@ -8,19 +8,30 @@
 
 '''
 
+import concurrent.futures
 import sys
 import webbrowser
 
 from PyQt5 import QtCore, QtGui, QtWidgets 
 from PyQt5.Qt import QDialog, QTimer
-from serial.tools import list_ports
+import numpy as np
+import pyqtgraph as pg
 
 from ui.mainWindow import Ui_MainWindow
 from ui.settingsWindow import Ui_AppSettings
 from ui.numpad import Ui_Numpad
 
 import comLib.linAdapter as rpc
+from comLib import adapterDiscovery
 import model
+from plotting import ScrollingCurve
+from parameterDialog import ParameterDialog
+from spectrumDialog import SpectrumDialog
+from statisticsDialog import StatisticsDialog
+from telemetryExport import ExportFormat, TelemetryExporter
+import motionSequence
+import analysis
+import calibration
 
 from enum import Enum
 
@@ -59,6 +70,24 @@ Source Code can be found at:<br>
 https://github.com/NewTec-GmbH/NTMicroDrive-GUI</a><br>"""
 
 
+# Shading of fault event markers in the plots (r, g, b, alpha)
+FAULT_COLORS = {
+    analysis.FaultType.STALL: (255, 165, 0, 60),
+    analysis.FaultType.OVER_CURRENT: (255, 0, 0, 60),
+    analysis.FaultType.OVER_TEMPERATURE: (255, 0, 255, 60),
+    analysis.FaultType.LIN_ERROR: (0, 0, 255, 40),
+    analysis.FaultType.HVC_ERROR: (128, 128, 128, 60),
+}
+
+# Maximum number of fault event markers drawn per plot
+MAX_FAULT_MARKERS = 200
+
+# Seconds to wait for the first enumeration of the serial ports
+PORT_ENUMERATION_TIMEOUT = 2.0
+
+# Status bar message while a lost LIN adapter is searched
+RECONNECT_MESSAGE = "Link lost, reconnecting ..."
+
    
 class Status(object):
     ''' Possible Application status indicators.'''
@@ -78,6 +107,8 @@ class Status(object):
     TARGET_ONLINE = 8
     TARGET_OFFLINE = 9
     
+    RECONNECTING = 10
+    
 class DefinedValues(Enum):
     ''' Defines of "MagicNumbers" '''
     
@@ -166,24 +197,70 @@ class Controller(QtWidgets.QMainWindow):
         self._addMenubarItems()        
         
         # Setup Plots
-        self._bvddPlot = self._ui.graphicsViewBVDD.plot([], [], pen=(0, 0, 255))
+        self._bvddPlot = self._createPlotCurves(self._ui.graphicsViewBVDD, (0, 0, 255))
         self._ui.graphicsViewBVDD.setLabel('left', 'BVDD', units='V')
         self._ui.graphicsViewBVDD.setLabel('bottom', 'Time', units='s')
         self._ui.graphicsViewBVDD.showGrid(x=True, y=True)
         self._ui.graphicsViewBVDD.setYRange(DefinedValues.BVDD_Y_MIN_RANGE.value, DefinedValues.BVDD_Y_MAX_RANGE.value, 0, True)
                 
-        self._temperaturePlot = self._ui.graphicsViewTemperature.plot([], [], pen=(0, 255, 0))
+        self._temperaturePlot = self._createPlotCurves(self._ui.graphicsViewTemperature, (0, 255, 0))
         self._ui.graphicsViewTemperature.setLabel('left', 'Tj', units='°C')
         self._ui.graphicsViewTemperature.setLabel('bottom', 'Time', units='s')
         self._ui.graphicsViewTemperature.showGrid(x=True, y=True)
         self._ui.graphicsViewTemperature.setYRange(DefinedValues.TJ_Y_MIN_RANGE.value, DefinedValues.TJ_Y_MAX_RANGE.value, 0, True)
         
-        self._rotorSpeedPlot = self._ui.graphicsViewRotorSpeed.plot([], [], pen=(255, 0, 0))
+        self._rotorSpeedPlot = self._createPlotCurves(self._ui.graphicsViewRotorSpeed, (255, 0, 0))
         self._ui.graphicsViewRotorSpeed.setLabel('left', 'Rotor Speed', units='PPS')
         self._ui.graphicsViewRotorSpeed.setLabel('bottom', 'Time', units='s')
         self._ui.graphicsViewRotorSpeed.showGrid(x=True, y=True)
         self._ui.graphicsViewRotorSpeed.setYRange(DefinedValues.RS_Y_MIN_RANGE.value, DefinedValues.RS_Y_MAX_RANGE.value, 0, True)
         
+        # Serve zoomed plots from the model's history
+        self._connectPlotHistory()
+        
+        # Running telemetry export
+        self._exporter = None
+        self._exportTimer = QTimer()
+        self._exportTimer.timeout.connect(self._onExportProgress)
+        
+        # Watches the active recording for write errors
+        self._recordTimer = QTimer()
+        self._recordTimer.timeout.connect(self._onRecordProgress)
+        
+        # Non-modal spectrum view, created on first use
+        self._spectrumDialog = None
+        
+        # Non-modal channel statistics, created on first use
+        self._statisticsDialog = None
+        
+        # Running motion sequence
+        self._sequenceRunner = None
+        self._sequenceTimer = QTimer()
+        self._sequenceTimer.timeout.connect(self._onSequenceProgress)
+        
+        # Serial ports known to the UI, compared with the port monitor
+        # to react on plugged adapters
+        self._ports = []
+        self._portsVersion = None
+        self._portsTimer = QTimer()
+        self._portsTimer.timeout.connect(self._onPortsProgress)
+        self._portsTimer.start(500)
+        
+        # Running adapter discovery for auto-connect, repeated for
+        # plugged ports while not connected
+        self._isAutoConnect = False
+        self._discovery = None
+        self._discoveryTimer = QTimer()
+        self._discoveryTimer.timeout.connect(self._onAutoConnectProgress)
+        
+        # True while the COM port selection dialog is shown, the user's
+        # choice takes precedence over auto-connect
+        self._isPortDialogOpen = False
+        
+        # Link quality display in status bar
+        self._linkStatisticsLabel = QtWidgets.QLabel()
+        self._ui.statusbar.addPermanentWidget(self._linkStatisticsLabel)
+        
         self.__rawCurrentSpeed = 0
         self.__currentSpeed = 0
         
@@ -243,25 +320,170 @@ class Controller(QtWidgets.QMainWindow):
             
         elif Status.TARGET_ONLINE == statusIndicator:
             self._ui.labelTargetOnlineLED.setPixmap(QtGui.QPixmap(":/led/resources/green-led-on.png"))
+            if RECONNECT_MESSAGE == self._ui.statusbar.currentMessage():
+                self._ui.statusbar.clearMessage()
             
         elif Status.TARGET_OFFLINE == statusIndicator:
             self._ui.labelTargetOnlineLED.setPixmap(QtGui.QPixmap(":/led/resources/green-led-off.png"))
+            
+        elif Status.RECONNECTING == statusIndicator:
+            self._ui.labelTargetOnlineLED.setPixmap(QtGui.QPixmap(":/led/resources/green-led-off.png"))
+            self._ui.statusbar.showMessage(RECONNECT_MESSAGE)
         else:
             #Nothing to do here
             pass
     
-    def updateBvddPlot(self, plotData):
-        ''' Updates BVDD plot with plotData. '''
-        self._bvddPlot.setData(plotData.x,  plotData.y)
+    def updateBvddPlot(self, x, y):
+        ''' Appends new data point(s) x, y to BVDD plot. '''
+        self._updatePlot(model.Channel.BVDD, x, y)
+    
+    def updateTemeperatuePlot(self, x, y):
+        ''' Appends new data point(s) x, y to Temperature plot. '''
+        self._updatePlot(model.Channel.TJ, x, y)
+    
+    def updateRotorSpeedPlot(self, x, y):
+        ''' Appends new data point(s) x, y to Rotor Speed plot. '''
+        self._updatePlot(model.Channel.ROTOR_SPEED, x, y)
+    
+    def reloadPlots(self):
+        ''' Redraw live time window and history from the model, e.g. after
+            the conversion to engineering units changed.
+        '''
+        for channel, (_, (liveCurve, _)) in self._plots.items():
+            liveCurve.clear()
+            liveCurve.append(*self._model.getRecent(channel, model.Model.TIME_WINDOW_WIDTH))
+            self._onPlotViewChanged(channel)
+    
+    def clearPlots(self):
+        ''' Removes all data points from the plots. '''
+        for liveCurve, historyCurve in self._plotCurves():
+            liveCurve.clear()
+            historyCurve.setData([], [])
+        self.updateFaultMarkers()
     
-    def updateTemeperatuePlot(self,plotData):
-        ''' Updates Temperature plot with plotData. '''
-        self._temperaturePlot.setData(plotData.x,  plotData.y)
+    def _createPlotCurves(self, plotWidget, pen):
+        ''' Creates the curves of a plot.
+            Returns tuple of the scrolling curve showing the live time
+            window and the curve showing the zoomed history.
+        '''
+        liveCurve = ScrollingCurve(plotWidget, pen, model.Model.TIME_WINDOW_WIDTH)
+        historyCurve = plotWidget.plot([], [], pen=pen)
+        historyCurve.setVisible(False)
+        return liveCurve, historyCurve
+    
+    def _plotCurves(self):
+        ''' Returns the (live, history) curves of all plots. '''
+        return [curves for _, curves in self._plots.values()]
+    
+    def _connectPlotHistory(self):
+        ''' Show the model's history whenever the time axis of a plot
+            is zoomed or panned by the user.
+        '''
+        self._plots = {
+            model.Channel.BVDD: (self._ui.graphicsViewBVDD, self._bvddPlot),
+            model.Channel.TJ: (self._ui.graphicsViewTemperature, self._temperaturePlot),
+            model.Channel.ROTOR_SPEED: (self._ui.graphicsViewRotorSpeed, self._rotorSpeedPlot),
+        }
+        self._faultMarkers = {}
+        for channel, (plotWidget, _) in self._plots.items():
+            viewBox = plotWidget.getViewBox()
+            viewBox.sigXRangeChanged.connect(
+                lambda viewBox, xRange, channel=channel: self._onPlotViewChanged(channel))
+            viewBox.sigStateChanged.connect(
+                lambda viewBox, channel=channel: self._onPlotViewChanged(channel))
+    
+    def updateFaultMarkers(self):
+        ''' Redraw fault event markers of all plots. '''
+        for channel in self._plots:
+            self._showFaultMarkers(channel)
+    
+    def _showFaultMarkers(self, channel):
+        ''' Marks the fault events within the visible time range of a
+            plot as shaded regions. Region items are reused.
+        '''
+        plotWidget, _ = self._plots[channel]
+        xMin, xMax = plotWidget.getViewBox().viewRange()[0]
+        markers = self._faultMarkers.setdefault(channel, [])
+        
+        count = 0
+        for faultType, (starts, ends) in self._model.faultEvents.events(xMin, xMax).items():
+            # Active events reach up to the right border
+            ends = np.where(np.isnan(ends), xMax, ends)
+            for start, end in zip(starts, ends):
+                if count == MAX_FAULT_MARKERS:
+                    break
+                if count == len(markers):
+                    marker = pg.LinearRegionItem(movable=False)
+                    marker.setZValue(-10)
+                    plotWidget.addItem(marker, ignoreBounds=True)
+                    markers.append(marker)
+                marker = markers[count]
+                marker.setBrush(pg.mkBrush(FAULT_COLORS[faultType]))
+                marker.setRegion((start, end))
+                marker.setToolTip(faultType.replace('_', ' '))
+                marker.setVisible(True)
+                count += 1
+        
+        for marker in markers[count:]:
+            marker.setVisible(False)
+    
+    def _isPlotFollowingData(self, channel):
+        ''' True as long as the time axis of the plot is auto ranged. '''
+        plotWidget, _ = self._plots[channel]
+        return bool(plotWidget.getViewBox().autoRangeEnabled()[0])
+    
+    def _updatePlot(self, channel, x, y):
+        ''' Appends new data to the live time window.
+            While the plot is zoomed, the visible history range is updated.
+        '''
+        _, (liveCurve, _) = self._plots[channel]
+        liveCurve.append(x, y)
+        if not self._isPlotFollowingData(channel):
+            self._showPlotHistory(channel)
+    
+    def _onPlotViewChanged(self, channel):
+        ''' Switch between live time window and history view. '''
+        _, (liveCurve, historyCurve) = self._plots[channel]
+        isFollowing = self._isPlotFollowingData(channel)
+        liveCurve.setVisible(isFollowing)
+        historyCurve.setVisible(not isFollowing)
+        if not isFollowing:
+            self._showPlotHistory(channel)
+        self._showFaultMarkers(channel)
     
-    def updateRotorSpeedPlot(self, plotData):
-        ''' Updates Rotor Speed plot with plotData. '''
-        self._rotorSpeedPlot.setData(plotData.x,  plotData.y)
+    def _showPlotHistory(self, channel):
+        ''' Shows the visible time range of the history with about
+            one min/max pair per horizontal pixel.
+        '''
+        plotWidget, (_, historyCurve) = self._plots[channel]
+        viewBox = plotWidget.getViewBox()
+        xMin, xMax = viewBox.viewRange()[0]
+        maxPoints = 2 * max(int(viewBox.width()), 1)
+        x, y = self._model.getHistory(channel, xMin, xMax, maxPoints)
+        historyCurve.setData(x, y)
         
+    def updateLinkStatistics(self, stats):
+        ''' Shows link latency percentiles and error counters in status bar.
+            stats: Dict as returned by rpc.LinkMonitor.statistics()
+        '''
+        text = []
+        for name, key in (('Echo', 'control'), ('Status', 'status')):
+            latency = stats[key]
+            if latency is not None:
+                text.append("{} p50/p95/p99: {:.1f}/{:.1f}/{:.1f} ms, jitter {:.1f} ms".format(
+                    name, latency['p50'], latency['p95'], latency['p99'], latency['jitter']))
+        text.append("missed echoes: {}  short reads: {}  resyncs: {}".format(
+            stats['missedEchoes'], stats['shortReads'], stats['resyncs']))
+        if stats.get('schedule') is not None:
+            slots = stats['schedule']
+            lateness = [slot['lateness']['p95'] for slot in slots if slot['lateness'] is not None]
+            text.append("slot lateness p95: {:.1f} ms, skipped: {}  overruns: {}".format(
+                max(lateness, default=0.0), sum(slot['skipped'] for slot in slots),
+                sum(slot['overruns'] for slot in slots)))
+        elif 'pollRate' in stats:
+            text.append("poll rate: {:.1f} Hz".format(stats['pollRate']))
+        self._linkStatisticsLabel.setText("  |  ".join(text))
+    
     def updateCurrentSpeed(self, speed):
         ''' get current speed value '''
         self.__rawCurrentSpeed = speed
@@ -292,7 +514,42 @@ class Controller(QtWidgets.QMainWindow):
         action = QtWidgets.QAction("Connect", self)
         action.triggered.connect(self._onMenuBarItemSelectComPort)
         self._ui.menuSettings.addAction(action)        
+        
+        action = QtWidgets.QAction("Parameters", self)
+        action.triggered.connect(self._onMenuBarItemParameters)
+        self._ui.menuSettings.addAction(action)
+
+        self._recordAction = QtWidgets.QAction("Record Frames...", self)
+        self._recordAction.setCheckable(True)
+        self._recordAction.triggered.connect(self._onMenuBarItemRecord)
+        self._ui.menuClose.addAction(self._recordAction)
+
+        action = QtWidgets.QAction("Channel Statistics", self)
+        action.triggered.connect(self._onMenuBarItemStatistics)
+        self._ui.menuSettings.addAction(action)
+
+        action = QtWidgets.QAction("Load Calibration...", self)
+        action.triggered.connect(self._onMenuBarItemCalibration)
+        self._ui.menuSettings.addAction(action)
+
+        action = QtWidgets.QAction("Rotor Speed Spectrum", self)
+        action.triggered.connect(self._onMenuBarItemSpectrum)
+        self._ui.menuSettings.addAction(action)
+
+        self._scheduleAction = QtWidgets.QAction("Schedule Table", self)
+        self._scheduleAction.setCheckable(True)
+        self._scheduleAction.triggered.connect(self._onMenuBarItemSchedule)
+        self._ui.menuSettings.addAction(self._scheduleAction)
 
+        self._sequenceAction = QtWidgets.QAction("Run Sequence...", self)
+        self._sequenceAction.setCheckable(True)
+        self._sequenceAction.triggered.connect(self._onMenuBarItemSequence)
+        self._ui.menuSettings.addAction(self._sequenceAction)
+
+        action = QtWidgets.QAction("Export Telemetry...", self)
+        action.triggered.connect(self._onMenuBarItemExport)
+        self._ui.menuClose.addAction(action)
+        
         action = QtWidgets.QAction("License", self)
         action.triggered.connect(self._onLicense)
         self._ui.menuClose.addAction(action)
@@ -509,14 +766,26 @@ class Controller(QtWidgets.QMainWindow):
         settingWindow.setupUi(qDialog)
         
         #Get COM ports with connected devices
-        ports = sorted([port.device for port in list_ports.comports()])
+        ports = self._model.portMonitor.ports(PORT_ENUMERATION_TIMEOUT)
         
         #Populate comboBox with found COM ports
         settingWindow.comboBoxComPorts.clear()
         settingWindow.comboBoxComPorts.addItems(ports)        
         
+        #Mark and preselect LIN adapters as soon as they are found
+        discovery = adapterDiscovery.discoverAdaptersAsync(ports)
+        discoveryTimer = QTimer(qDialog)
+        discoveryTimer.timeout.connect(lambda: self._showDiscoveredPorts(
+            discovery, discoveryTimer, settingWindow.comboBoxComPorts, ports))
+        discoveryTimer.start(50)
+        
         #Show dialog
-        qDialog.exec_()        
+        self._isPortDialogOpen = True
+        try:
+            qDialog.exec_()
+        finally:
+            self._isPortDialogOpen = False
+        discoveryTimer.stop()
         
         #Evaluate user selection        
         if QDialog.Accepted == qDialog.result():
@@ -526,12 +795,232 @@ class Controller(QtWidgets.QMainWindow):
             selectedIdx = settingWindow.comboBoxComPorts.currentIndex()
             comPort = ports[selectedIdx]
             
+            #Probes have to release the ports first
+            concurrent.futures.wait([discovery], adapterDiscovery.DISCOVERY_TIMEOUT)
             self._model.start(comPort)    
         else:
             # User has rejected by pressing CANCEL button
             pass              
     
     
+    def _showDiscoveredPorts(self, discovery, timer, comboBox, ports):
+        ''' Mark ports with a LIN adapter in the port selection once the
+            discovery finished and preselect the first one.
+        '''
+        if not discovery.done():
+            return
+        timer.stop()
+        
+        adapters = discovery.result()
+        for idx, port in enumerate(ports):
+            if port in adapters:
+                comboBox.setItemText(idx, "{} (LIN-Adapter)".format(port))
+        if adapters:
+            comboBox.setCurrentIndex(ports.index(adapters[0]))
+    
+    def autoConnect(self, ports=None):
+        ''' Discover LIN adapters in background and connect to the first one.
+            Adapters plugged later are connected while not connected.
+            - ports: Ports to search, all serial ports if None
+        '''
+        self._isAutoConnect = True
+        if self._discovery is not None and not self._discovery.done():
+            return
+        if ports is None:
+            ports = self._model.portMonitor.ports(PORT_ENUMERATION_TIMEOUT)
+        self._ui.statusbar.showMessage("Searching LIN-Adapter ...")
+        self._discovery = adapterDiscovery.discoverAdaptersAsync(ports)
+        self._discoveryTimer.start(50)
+    
+    def _onPortsProgress(self):
+        ''' Report plugged and unplugged serial ports and connect to
+            plugged adapters in auto-connect mode.
+        '''
+        monitor = self._model.portMonitor
+        if not monitor.isReady or monitor.version == self._portsVersion:
+            return
+        isFirst = self._portsVersion is None
+        self._portsVersion = monitor.version
+        ports = monitor.ports()
+        if isFirst:
+            self._ports = ports
+            return
+        
+        added = [port for port in ports if port not in self._ports]
+        removed = [port for port in self._ports if port not in ports]
+        self._ports = ports
+        
+        if removed:
+            self._ui.statusbar.showMessage("Serial port removed: {}".format(", ".join(removed)), 5000)
+        if added:
+            self._ui.statusbar.showMessage("Serial port added: {}".format(", ".join(added)), 5000)
+            if self._isAutoConnect and not self._model.isConnected and not self._model.isReconnecting:
+                self.autoConnect(added)
+    
+    def _onAutoConnectProgress(self):
+        ''' Connect to the LIN adapter found by autoConnect(). '''
+        if not self._discovery.done():
+            return
+        self._discoveryTimer.stop()
+        
+        # Connected or being connected meanwhile
+        if self._model.isConnected or self._model.isReconnecting or self._isPortDialogOpen:
+            return
+        
+        adapters = self._discovery.result()
+        if not adapters:
+            self._ui.statusbar.showMessage("No LIN-Adapter found", 5000)
+            return
+        self._ui.statusbar.showMessage("LIN-Adapter found on {}".format(adapters[0]), 5000)
+        self._model.start(adapters[0])
+    
+    def _onMenuBarItemRecord(self):
+        ''' Start recording frames to a file or stop active recording. '''
+        if self._model.isRecording:
+            self._model.stopRecording()
+        else:
+            path, _ = QtWidgets.QFileDialog.getSaveFileName(
+                self, "Record Frames", "", "Frame Recording (*.rec)")
+            if path:
+                try:
+                    self._model.startRecording(path)
+                except OSError as error:
+                    self.showErrorDialog("Recording failed: {}".format(error))
+        self._recordAction.setChecked(self._model.isRecording)
+        if self._model.isRecording:
+            self._recordTimer.start(500)
+        else:
+            self._recordTimer.stop()
+    
+    def _onRecordProgress(self):
+        ''' Stop the recording once writing it failed, e.g. disk full. '''
+        error = self._model.recordingError
+        if error is None:
+            return
+        
+        self._recordTimer.stop()
+        self._model.stopRecording()
+        self._recordAction.setChecked(False)
+        self.showErrorDialog("Recording stopped, the file is incomplete: {}".format(error))
+    
+    def _onMenuBarItemSchedule(self):
+        ''' Switch between transfers by schedule table and cyclic update. '''
+        if self._model.isScheduled:
+            self._model.stopSchedule()
+        elif self._model.isConnected:
+            self._model.startSchedule()
+        else:
+            self.showErrorDialog("Schedule table requires a connected LIN-Adapter.")
+        self._scheduleAction.setChecked(self._model.isScheduled)
+    
+    def _onMenuBarItemSequence(self):
+        ''' Run a motion sequence script or abort the running one. '''
+        if self._sequenceRunner is not None and self._sequenceRunner.is_alive():
+            self._sequenceRunner.stop()
+            return
+        
+        self._sequenceAction.setChecked(False)
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Run Sequence", "", "Motion Sequence (*.seq *.txt)")
+        if not path:
+            return
+        
+        try:
+            steps = motionSequence.loadSequence(path)
+        except (OSError, motionSequence.SequenceError) as error:
+            self.showErrorDialog("Invalid motion sequence: {}".format(error))
+            return
+        
+        self._sequenceRunner = motionSequence.SequenceRunner(self._model, steps)
+        self._sequenceRunner.start()
+        self._sequenceAction.setChecked(True)
+        self._sequenceTimer.start(200)
+    
+    def _onSequenceProgress(self):
+        ''' Show progress and timing report of running motion sequence. '''
+        runner = self._sequenceRunner
+        if runner.is_alive():
+            self._ui.statusbar.showMessage("Sequence: step {} of {}".format(
+                len(runner.results), runner.stepCount))
+            return
+        
+        self._sequenceTimer.stop()
+        self._sequenceAction.setChecked(False)
+        self._ui.statusbar.clearMessage()
+        QtWidgets.QMessageBox.information(self, "Motion Sequence", runner.report())
+    
+    def _onMenuBarItemExport(self):
+        ''' Export telemetry to a Parquet or Arrow IPC file in background. '''
+        if self._exporter is not None and self._exporter.is_alive():
+            return
+        
+        if not TelemetryExporter.isAvailable():
+            self.showErrorDialog("Telemetry export requires the pyarrow package.")
+            return
+        
+        path, selectedFilter = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export Telemetry", "", "Parquet (*.parquet);;Arrow IPC (*.arrow)")
+        if not path:
+            return
+        
+        fileFormat = ExportFormat.ARROW if selectedFilter.startswith("Arrow") else ExportFormat.PARQUET
+        self._exporter = TelemetryExporter(self._model.telemetry, path, fileFormat,
+                                           conversions=self._model.exportConversions())
+        self._exporter.start()
+        self._exportTimer.start(500)
+    
+    def _onExportProgress(self):
+        ''' Show progress and result of running export in status bar. '''
+        exporter = self._exporter
+        if exporter.is_alive():
+            self._ui.statusbar.showMessage("Exporting telemetry: {} of {} rows".format(
+                exporter.exportedRows, exporter.totalRows))
+            return
+        
+        self._exportTimer.stop()
+        if exporter.error is not None:
+            self.showErrorDialog("Telemetry export failed: {}".format(exporter.error))
+        else:
+            self._ui.statusbar.showMessage("Exported {} rows".format(exporter.exportedRows), 5000)
+    
+    def _onMenuBarItemCalibration(self):
+        ''' Load calibration of the connected board. '''
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Load Calibration", "", "Board Calibration (*.json)")
+        if not path:
+            return
+        
+        try:
+            boardCalibration = calibration.loadCalibration(path)
+        except (OSError, calibration.CalibrationError) as error:
+            self.showErrorDialog("Invalid calibration: {}".format(error))
+            return
+        
+        self._model.setCalibration(boardCalibration)
+        self.reloadPlots()
+        self._ui.statusbar.showMessage("Calibration of board {} loaded".format(boardCalibration.board), 5000)
+    
+    def _onMenuBarItemStatistics(self):
+        ''' Show running channel statistics next to the main window. '''
+        if self._statisticsDialog is None:
+            channelNames = [(model.Channel.BVDD, "BVDD"), (model.Channel.TJ, "Tj"),
+                            (model.Channel.ROTOR_SPEED, "Rotor Speed")]
+            self._statisticsDialog = StatisticsDialog(self._model, channelNames, self)
+        self._statisticsDialog.show()
+        self._statisticsDialog.raise_()
+    
+    def _onMenuBarItemSpectrum(self):
+        ''' Show live rotor speed spectrum next to the main window. '''
+        if self._spectrumDialog is None:
+            self._spectrumDialog = SpectrumDialog(self._model.rotorSpeedSpectrum, "Rotor Speed Spectrum", self)
+        self._spectrumDialog.show()
+        self._spectrumDialog.raise_()
+    
+    def _onMenuBarItemParameters(self):
+        ''' Show motor driver parameters dialog. '''
+        ParameterDialog(self._model.parameterService, self).exec_()
+    
+    
     def _buttonpres(self):
         ''' action asoziated with Button 1 on the numpad
         '''
@@ -623,4 +1112,5 @@ class Controller(QtWidgets.QMainWindow):
         
     def _closeApp(self):
         ''' Close and exit application. '''
+        self._model.stopRecording()
         sys.exit()
@@ -8,29 +8,66 @@
 
 '''
 
+import argparse
 import sys
 from PyQt5 import QtWidgets
-from model import Model
+from model import Model, PollingPolicy
 from controller import Controller
 from comLib.linAdapter import LINAdapter
+import calibration
+import plotting
 
 
 WINDOW_TITLE = "NTMicroDrive Control Tool V 1.0.2"
 
    
     
+def parseArguments():
+    ''' Parse application specific command line arguments.
+        Returns the parsed arguments and the remaining arguments for QT.
+    '''
+    parser = argparse.ArgumentParser(description=WINDOW_TITLE)
+    parser.add_argument('--opengl', action='store_true',
+                        help='render the telemetry plots with OpenGL')
+    parser.add_argument('--software-opengl', action='store_true',
+                        help='render the telemetry plots with software OpenGL')
+    parser.add_argument('--auto-connect', action='store_true',
+                        help='connect to the first LIN adapter found on the serial ports')
+    parser.add_argument('--memory-budget', type=int, default=Model.MEMORY_BUDGET // (1024 * 1024),
+                        help='RAM in MiB for the latest samples, older ones are spilled to disk')
+    parser.add_argument('--poll-min', type=int, default=PollingPolicy.MIN_INTERVAL, metavar='MS',
+                        help='status poll interval in ms while the motor is active')
+    parser.add_argument('--poll-max', type=int, default=Model.UPDATE_INTERVAL, metavar='MS',
+                        help='status poll interval in ms at idle')
+    parser.add_argument('--calibration', metavar='FILE',
+                        help='board calibration of the engineering unit conversions')
+    return parser.parse_known_args()
+
+    
 if __name__ == "__main__":    
+    args, qtArgs = parseArguments()
+    
+    # OpenGL has to be set up before QT application and plots exist
+    if args.opengl or args.software_opengl:
+        if not plotting.enableOpenGL(args.software_opengl):
+            print('PyOpenGL not installed, using default plot rendering')
+    
     # Create QT application
-    app = QtWidgets.QApplication(sys.argv)
+    app = QtWidgets.QApplication(sys.argv[:1] + qtArgs)
       
     # LIN Adapter
     linAdapter = LINAdapter()
     
     # Create Modell
-    model = Model(linAdapter)
+    model = Model(linAdapter, args.memory_budget * 1024 * 1024)
+    model.pollingPolicy.setBounds(args.poll_min, args.poll_max)
     
    
       
+    # Per-board conversion to engineering units
+    if args.calibration:
+        model.setCalibration(calibration.loadCalibration(args.calibration))
+    
     # Create controller / main window
     controller = Controller(model)
           
@@ -45,6 +82,10 @@ if __name__ == "__main__":
   
     # Show main window
     controller.show()
+    
+    # Search LIN adapter in background while the window comes up
+    if args.auto_connect:
+        controller.autoConnect()
   
     # Start QT application
     sys.exit(app.exec_())
@@ -9,9 +9,23 @@
 '''
 
 import collections
-from datetime import datetime
+import concurrent.futures
+import queue
+import tempfile
+import threading
+import time
+import numpy as np
+import serial
 from PyQt5 import QtCore
 import comLib.linAdapter as rpc
+from comLib.parameterService import ParameterService
+from comLib.scheduleTable import ScheduleTable
+from comLib import adapterDiscovery
+from comLib.portMonitor import PortMonitor
+import recording
+import analysis
+import calibration
+import spectrum
 import controller
 
    
@@ -27,26 +41,891 @@ class DefaultValues(object):
     OP_MODE = rpc.OpMode.POSITION_CTRL
 
 
-class PlotData(object):
-    ''' Container for  X, Y plot data. '''
+class Channel(object):
+    ''' Telemetry channels shown in the plots. '''
+    BVDD = 'bvdd'
+    TJ = 'tj'
+    ROTOR_SPEED = 'rotor_speed'
+
+
+class Conversion(object):
+    ''' Conversion of a raw status field to engineering units by a
+        calibration.LinearCalibration or calibration.TableCalibration.
+        Applied to whole arrays at once when data is plotted or exported.
+    '''
     
-    def __init__(self, bufferSize):
+    def __init__(self, field, calibration, unit=''):
         '''
-            - bufferSize: Number of (x,y) data points we hold for
-                          plot visualization
+            - field: rpc.ElmStatus field holding the raw value
+            - calibration: Function converting raw values
+            - unit: Unit of the converted values
         '''
-        self.x = collections.deque([0.0] * bufferSize, bufferSize)
-        self.y = collections.deque([0.0] * bufferSize, bufferSize)
+        self.field = field
+        self.calibration = calibration
+        self.unit = unit
     
-    def add(self, x, y):
-        ''' Add datapoint to plot data. '''
-        self.x.append(x)
-        self.y.append(y)
+    def __call__(self, raw):
+        ''' Returns raw value or array in engineering units. '''
+        return self.calibration(raw)
+
+
+def channelConversions(boardCalibration=None):
+    ''' Returns dict of Channel to the Conversion of its raw status field.
+        - boardCalibration: calibration.BoardCalibration overriding the
+                            nominal DefinedValues conversions or None
+    '''
+    nominal = [
+        (Channel.BVDD, rpc.ElmStatus.BVDD, calibration.LinearCalibration(controller.DefinedValues.BVDD_FACTOR.value), 'V'),
+        (Channel.TJ, rpc.ElmStatus.TJ, calibration.LinearCalibration(offset=controller.DefinedValues.TJ_OFFSET.value), 'degC'),
+        (Channel.ROTOR_SPEED, rpc.ElmStatus.CURRENT_SPEED, calibration.LinearCalibration(controller.DefinedValues.RPM_FACTOR.value), 'rpm'),
+    ]
+    board = boardCalibration or calibration.BoardCalibration()
+    return {channel: Conversion(field, board.get(field, default), unit) for channel, field, default, unit in nominal}
+
+
+class GrowingArray(object):
+    ''' Append-only NumPy array with amortised O(1) append. '''
+    
+    def __init__(self, dtype=np.float64, capacity=4096):
+        '''
+            - dtype: NumPy data type of the stored values
+            - capacity: Initial number of preallocated elements
+        '''
+        self._data = np.empty(capacity, dtype)
+        self._size = 0
+    
+    def __len__(self):
+        return self._size
+    
+    @property
+    def values(self):
+        ''' View of all values appended so far. '''
+        return self._data[:self._size]
+    
+    def append(self, value):
+        ''' Append value, doubling the capacity if required. '''
+        if self._size == len(self._data):
+            grown = np.empty(max(2 * len(self._data), 1), self._data.dtype)
+            grown[:self._size] = self._data
+            self._data = grown
+        self._data[self._size] = value
+        self._size += 1
+    
+    def clear(self):
+        ''' Deletes all values but keeps the allocated memory. '''
+        self._size = 0
+
+
+class SpillWorker(threading.Thread):
+    ''' Spills TieredArrays to their files in background, so the
+        acquisition does not wait for the disk.
+    '''
+    
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._queue = queue.Queue()
+    
+    def request(self, array):
+        ''' Queue spilling of a TieredArray. '''
+        self._queue.put(array)
+    
+    def run(self):
+        while True:
+            self._queue.get().spill()
+
+
+class TieredArray(object):
+    ''' Append-only NumPy array with bounded memory use. The latest values
+        are kept in a fixed-size hot ring in RAM, older values are spilled
+        to a memory-mapped temporary file. Spilling is done by the
+        SpillWorker once half of the ring is unspilled, or by append()
+        itself if the worker falls behind. Reads are served transparently
+        from both tiers, preferring the ring.
+    '''
+    
+    # Default number of values kept in RAM
+    HOT_CAPACITY = 65536
+    
+    def __init__(self, dtype=np.float64, hotCapacity=HOT_CAPACITY, spillWorker=None):
+        '''
+            - dtype: NumPy data type of the stored values
+            - hotCapacity: Number of latest values kept in RAM
+            - spillWorker: SpillWorker spilling in background, None to
+                           spill synchronously when the ring is full
+        '''
+        self._hot = np.empty(max(int(hotCapacity), 1), dtype)
+        self._size = 0
+        self._spilled = 0
+        self._spillWorker = spillWorker
+        self._isSpillQueued = False
+        
+        # Spilled values, created on first spill and mapped for reading
+        self._file = None
+        self._cold = None
+        
+        # Serializes spilling and reading of the cold tier
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return self._size
+    
+    @property
+    def dtype(self):
+        return self._hot.dtype
+    
+    @property
+    def nbytes(self):
+        ''' RAM used by the hot ring in bytes. '''
+        return self._hot.nbytes
+    
+    def append(self, value):
+        ''' Append value, spilling first if it would overwrite an unspilled one. '''
+        capacity = len(self._hot)
+        if (self._size - self._spilled) == capacity:
+            self.spill()
+        self._hot[self._size % capacity] = value
+        self._size += 1
+        
+        if (self._spillWorker is not None and not self._isSpillQueued
+                and (self._size - self._spilled) >= capacity // 2):
+            self._isSpillQueued = True
+            self._spillWorker.request(self)
+    
+    def spill(self):
+        ''' Write all values not yet spilled to the file. '''
+        with self._lock:
+            self._isSpillQueued = False
+            stop = self._size
+            if stop <= self._spilled:
+                return
+            if self._file is None:
+                self._file = tempfile.TemporaryFile(prefix='telemetry', suffix='.spill')
+            self._file.seek(self._spilled * self._hot.itemsize)
+            for segment in self._hotSegments(self._spilled, stop):
+                self._file.write(segment.tobytes())
+            self._file.flush()
+            self._spilled = stop
+    
+    def get(self, start=0, stop=None):
+        ''' Returns copy of values [start, stop), indices as for slicing. '''
+        start, stop, _ = slice(start, stop).indices(self._size)
+        if stop <= start:
+            return np.empty(0, self._hot.dtype)
+        
+        # Values from the ring boundary on are still in RAM
+        boundary = min(max(start, self._size - len(self._hot)), stop)
+        parts = []
+        if start < boundary:
+            parts.append(np.array(self._coldValues(boundary)[start:boundary]))
+        parts.extend(self._hotSegments(boundary, stop))
+        return parts[0].copy() if 1 == len(parts) else np.concatenate(parts)
+    
+    def searchsorted(self, value, side='left'):
+        ''' Returns index to insert value into the ascending values. '''
+        boundary = max(self._size - len(self._hot), 0)
+        segments = [self._coldValues(boundary)[:boundary]] if boundary else []
+        segments.extend(self._hotSegments(boundary, self._size))
+        
+        offset = 0
+        for segment in segments:
+            idx = int(np.searchsorted(segment, value, side))
+            if idx < len(segment):
+                return offset + idx
+            offset += len(segment)
+        return self._size
+    
+    def clear(self):
+        ''' Deletes all values but keeps the ring. '''
+        with self._lock:
+            self._size = 0
+            self._spilled = 0
+            self._isSpillQueued = False
+            self._cold = None
+            if self._file is not None:
+                self._file.truncate(0)
+    
+    def _hotSegments(self, start, stop):
+        ''' Returns views of the ring holding values [start, stop). '''
+        capacity = len(self._hot)
+        begin = start % capacity
+        end = begin + (stop - start)
+        if end <= capacity:
+            return [self._hot[begin:end]]
+        return [self._hot[begin:], self._hot[:end - capacity]]
+    
+    def _coldValues(self, stop):
+        ''' Returns memory map of at least the first stop spilled values. '''
+        with self._lock:
+            if self._cold is None or len(self._cold) < stop:
+                self._cold = np.memmap(self._file, self._hot.dtype, 'r', shape=(self._spilled,))
+            return self._cold
+
+
+class TelemetryStore(object):
+    ''' Columnar store of all received status frames together with the
+        control setpoints in effect and the time of sampling.
+        Columns may be read from other threads while samples are added.
+    '''
+    
+    # Time since start of acquisition in seconds
+    TIME = 'time'
+    
+    # Monotonic time.perf_counter_ns() sampling timestamp
+    TIMESTAMP = 'timestamp_ns'
+    
+    # Raw status frame fields
+    STATUS_COLUMNS = recording.STATUS_FIELDS
+    
+    # Control frame setpoints in effect when the status was requested
+    CONTROL_COLUMNS = recording.CONTROL_FIELDS
+    
+    COLUMNS = [(TIME, np.float64), (TIMESTAMP, np.int64)] + STATUS_COLUMNS + CONTROL_COLUMNS
+    
+    def __init__(self, hotCapacity=TieredArray.HOT_CAPACITY, spillWorker=None):
+        '''
+            - hotCapacity: Number of latest rows kept in RAM
+            - spillWorker: SpillWorker spilling older rows to disk
+        '''
+        self._columns = {name: TieredArray(dtype, hotCapacity, spillWorker)
+                         for name, dtype in TelemetryStore.COLUMNS}
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return self._size
+    
+    @property
+    def names(self):
+        ''' Column names in storage order. '''
+        return [name for name, _ in TelemetryStore.COLUMNS]
+    
+    def add(self, time, timestamp, statusFrame, ctrlFrame):
+        ''' Add one sample.
+            - time: Seconds since start of acquisition
+            - timestamp: time.perf_counter_ns() sampling timestamp
+            - statusFrame: Received HVC_StatusFrame
+            - ctrlFrame: HVC_ControlFrame in effect
+        '''
+        with self._lock:
+            self._columns[TelemetryStore.TIME].append(time)
+            self._columns[TelemetryStore.TIMESTAMP].append(timestamp)
+            for name, _ in TelemetryStore.STATUS_COLUMNS:
+                self._columns[name].append(statusFrame[name])
+            for name, _ in TelemetryStore.CONTROL_COLUMNS:
+                self._columns[name].append(ctrlFrame[name])
+            self._size += 1
+    
+    def columns(self, start=0, stop=None):
+        ''' Returns dict of column name to a copy of rows [start, stop). '''
+        with self._lock:
+            return {name: column.get(start, stop) for name, column in self._columns.items()}
+    
+    def clear(self):
+        ''' Deletes all samples. '''
+        with self._lock:
+            for column in self._columns.values():
+                column.clear()
+            self._size = 0
+
+
+class PyramidLevel(object):
+    ''' One aggregation level of a PyramidStore.
+        Every entry summarizes 'factor' entries of the level below
+        by its start x value and the min, max and mean of y.
+    '''
+    
+    def __init__(self, factor):
+        '''
+            - factor: Number of lower level entries per entry
+        '''
+        self.factor = factor
+        self.x = GrowingArray()
+        self.yMin = GrowingArray()
+        self.yMax = GrowingArray()
+        self.yMean = GrowingArray()
+        self._resetPending()
+    
+    def __len__(self):
+        return len(self.x)
+    
+    def _resetPending(self):
+        ''' Start a new, still incomplete entry. '''
+        self._pendingCount = 0
+        self._pendingX = 0.0
+        self._pendingMin = np.inf
+        self._pendingMax = -np.inf
+        self._pendingSum = 0.0
+    
+    def add(self, x, yMin, yMax, yMean):
+        ''' Aggregate one lower level entry.
+            Returns the completed entry as (x, min, max, mean) tuple
+            once 'factor' entries are collected, otherwise None.
+        '''
+        if 0 == self._pendingCount:
+            self._pendingX = x
+        self._pendingCount += 1
+        self._pendingMin = min(self._pendingMin, yMin)
+        self._pendingMax = max(self._pendingMax, yMax)
+        self._pendingSum += yMean
+        
+        if self._pendingCount < self.factor:
+            return None
         
+        entry = (self._pendingX, self._pendingMin, self._pendingMax, self._pendingSum / self.factor)
+        self.x.append(entry[0])
+        self.yMin.append(entry[1])
+        self.yMax.append(entry[2])
+        self.yMean.append(entry[3])
+        self._resetPending()
+        return entry
+    
+    def pending(self):
+        ''' Returns the incomplete trailing entry or None. '''
+        if 0 == self._pendingCount:
+            return None
+        return (self._pendingX, self._pendingMin, self._pendingMax, self._pendingSum / self._pendingCount)
+    
     def clear(self):
-        ''' Deletes all plot data. '''
+        ''' Deletes all entries. '''
         self.x.clear()
-        self.y.clear()
+        self.yMin.clear()
+        self.yMax.clear()
+        self.yMean.clear()
+        self._resetPending()
+
+
+class PyramidStore(object):
+    ''' Multi-resolution history of (x, y) samples for zoomable plots.
+        Level 0 holds the raw samples, every further level aggregates
+        LEVEL_FACTOR entries of the level below to min/max/mean.
+        Levels are built incrementally as samples arrive, so a query
+        is served from the coarsest level that still resolves the
+        requested number of points, at a cost of O(points).
+        x values have to be added in ascending order. The raw samples are
+        kept in TieredArrays, the aggregated levels are small enough for RAM.
+    '''
+    
+    # Number of entries of a level aggregated by the next level
+    LEVEL_FACTOR = 16
+    
+    # Number of aggregated levels on top of the raw samples (x16, x256)
+    LEVEL_COUNT = 2
+    
+    def __init__(self, factor=LEVEL_FACTOR, levelCount=LEVEL_COUNT, dtype=np.float64,
+                 hotCapacity=TieredArray.HOT_CAPACITY, spillWorker=None):
+        '''
+            - factor: Aggregation factor between two adjacent levels
+            - levelCount: Number of aggregated levels
+            - dtype: NumPy data type of the raw y values
+            - hotCapacity: Number of latest raw samples kept in RAM
+            - spillWorker: SpillWorker spilling older raw samples to disk
+        '''
+        self._x = TieredArray(np.float64, hotCapacity, spillWorker)
+        self._y = TieredArray(dtype, hotCapacity, spillWorker)
+        self._levels = [PyramidLevel(factor) for _ in range(levelCount)]
+    
+    def __len__(self):
+        return len(self._x)
+    
+    def add(self, x, y):
+        ''' Add sample and update all aggregated levels. '''
+        self._x.append(x)
+        self._y.append(y)
+        
+        entry = (x, y, y, y)
+        for level in self._levels:
+            entry = level.add(*entry)
+            if entry is None:
+                break
+    
+    def clear(self):
+        ''' Deletes all samples of all levels. '''
+        self._x.clear()
+        self._y.clear()
+        for level in self._levels:
+            level.clear()
+    
+    def getRange(self, xMin, xMax, maxPoints):
+        ''' Returns (x, yMin, yMax, yMean) arrays covering [xMin, xMax]
+            with at most about maxPoints entries, taken from the finest
+            level that fits. For raw samples yMin, yMax and yMean are
+            the same array.
+        '''
+        start = self._x.searchsorted(xMin, 'left')
+        stop = self._x.searchsorted(xMax, 'right')
+        
+        if (stop - start) <= maxPoints or not self._levels:
+            y = self._y.get(start, stop)
+            return self._x.get(start, stop), y, y, y
+        
+        for idx, level in enumerate(self._levels):
+            levelX = level.x.values
+            # First entry may start before xMin but still covers it
+            levelStart = max(np.searchsorted(levelX, xMin, 'right') - 1, 0)
+            levelStop = np.searchsorted(levelX, xMax, 'right')
+            isLast = (idx == len(self._levels) - 1)
+            if (levelStop - levelStart) <= maxPoints or isLast:
+                break
+        
+        # Stride the coarsest level if it still holds too many entries
+        step = max(1, -(-(levelStop - levelStart) // max(maxPoints, 1)))
+        sel = slice(levelStart, levelStop, step)
+        xOut = levelX[sel]
+        yMinOut = level.yMin.values[sel]
+        yMaxOut = level.yMax.values[sel]
+        yMeanOut = level.yMean.values[sel]
+        
+        # Append the not yet completed entry at the end of the history
+        pending = level.pending()
+        if pending is not None and levelStop == len(levelX) and pending[0] <= xMax:
+            xOut = np.append(xOut, pending[0])
+            yMinOut = np.append(yMinOut, pending[1])
+            yMaxOut = np.append(yMaxOut, pending[2])
+            yMeanOut = np.append(yMeanOut, pending[3])
+        
+        return xOut, yMinOut, yMaxOut, yMeanOut
+    
+    def getLast(self, count):
+        ''' Returns (x, y) arrays of the last count raw samples. '''
+        return self._x.get(-count), self._y.get(-count)
+    
+    def getEnvelope(self, xMin, xMax, maxPoints):
+        ''' Returns (x, y) arrays for plotting [xMin, xMax] with at most
+            about maxPoints points. Aggregated entries are drawn as
+            min/max pairs so peaks stay visible at every zoom level.
+        '''
+        x, yMin, yMax, _ = self.getRange(xMin, xMax, maxPoints // 2)
+        if yMin is yMax:
+            return x, yMin
+        return np.repeat(x, 2), np.column_stack((yMin, yMax)).ravel()
+
+
+class RunningStatistics(object):
+    ''' Statistics of a raw channel, updated incrementally with every
+        sample for the whole session and a sliding window of the latest
+        samples:
+          - mean and standard deviation by Welford's algorithm, the
+            window removes its oldest sample by the inverse update
+          - window min/max by monotonic deques, O(1) amortised per sample
+          - percentiles by a histogram of the raw values, an exact
+            quantile sketch for 8-bit raw fields
+    '''
+    
+    # Percentiles reported by statistics()
+    PERCENTILES = (5, 50, 95)
+    
+    def __init__(self, windowSize, histogramSize=256):
+        '''
+            - windowSize: Number of latest samples of the sliding window
+            - histogramSize: Number of raw values of the histogram, None
+                             for no percentiles
+        '''
+        self._windowSize = windowSize
+        self._histogramSize = histogramSize
+        self.clear()
+    
+    def clear(self):
+        ''' Deletes all samples. '''
+        self._session = _Welford()
+        self._sessionMin = np.inf
+        self._sessionMax = -np.inf
+        self._windowStats = _Welford()
+        self._window = collections.deque()
+        
+        # (sample index, value) candidates of the window minimum/maximum
+        self._minDeque = collections.deque()
+        self._maxDeque = collections.deque()
+        
+        size = self._histogramSize
+        self._sessionHistogram = None if size is None else np.zeros(size, np.int64)
+        self._windowHistogram = None if size is None else np.zeros(size, np.int64)
+    
+    def add(self, value):
+        ''' Add one raw sample. '''
+        index = self._session.count
+        self._session.add(value)
+        self._sessionMin = min(self._sessionMin, value)
+        self._sessionMax = max(self._sessionMax, value)
+        
+        self._window.append(value)
+        self._windowStats.add(value)
+        isHistogram = self._sessionHistogram is not None and 0 <= value < len(self._sessionHistogram)
+        if isHistogram:
+            self._sessionHistogram[value] += 1
+            self._windowHistogram[value] += 1
+        if len(self._window) > self._windowSize:
+            oldest = self._window.popleft()
+            self._windowStats.remove(oldest)
+            if self._windowHistogram is not None and 0 <= oldest < len(self._windowHistogram):
+                self._windowHistogram[oldest] -= 1
+        
+        while self._minDeque and self._minDeque[-1][1] >= value:
+            self._minDeque.pop()
+        self._minDeque.append((index, value))
+        while self._maxDeque and self._maxDeque[-1][1] <= value:
+            self._maxDeque.pop()
+        self._maxDeque.append((index, value))
+        for candidates in (self._minDeque, self._maxDeque):
+            if candidates[0][0] <= index - self._windowSize:
+                candidates.popleft()
+    
+    def statistics(self, conversion=None):
+        ''' Returns dict with 'session' and 'window' statistics, each a
+            dict of count, min, max, mean, std and the PERCENTILES as
+            'p5', 'p50' ... in engineering units, None while empty.
+            - conversion: Function converting raw values, identity if None.
+                          Mean and std of non-linear conversions are
+                          converted with the local slope at the mean.
+        '''
+        session = (self._session, self._sessionMin, self._sessionMax, self._sessionHistogram)
+        window = (self._windowStats,
+                  self._minDeque[0][1] if self._minDeque else None,
+                  self._maxDeque[0][1] if self._maxDeque else None,
+                  self._windowHistogram)
+        return {'session': self._convert(*session, conversion),
+                'window': self._convert(*window, conversion)}
+    
+    def _convert(self, welford, rawMin, rawMax, histogram, conversion):
+        ''' Returns statistics dict of one scope in engineering units. '''
+        if 0 == welford.count:
+            return None
+        if conversion is None:
+            conversion = lambda raw: np.asarray(raw, np.float64)
+        
+        limits = conversion([rawMin, rawMax])
+        slope = float(np.diff(conversion([welford.mean - 0.5, welford.mean + 0.5]))[0])
+        stats = {
+            'count': welford.count,
+            'min': float(limits.min()),
+            'max': float(limits.max()),
+            'mean': float(conversion(welford.mean)),
+            'std': abs(slope) * welford.std,
+        }
+        for percentile in RunningStatistics.PERCENTILES:
+            stats['p{}'.format(percentile)] = None
+        if histogram is not None and histogram.sum():
+            cumulative = np.cumsum(histogram)
+            # Nearest rank of the percentiles among the sorted samples
+            ranks = np.rint(np.array(RunningStatistics.PERCENTILES) * 0.01 * (cumulative[-1] - 1))
+            values = conversion(np.searchsorted(cumulative, ranks, 'right'))
+            for percentile, value in zip(RunningStatistics.PERCENTILES, values):
+                stats['p{}'.format(percentile)] = float(value)
+        return stats
+
+
+class _Welford(object):
+    ''' Running mean and variance by Welford's algorithm. '''
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+    
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+    
+    def remove(self, value):
+        ''' Inverse of add() for a value added before. '''
+        if self.count <= 1:
+            self.__init__()
+            return
+        mean = (self.count * self.mean - value) / (self.count - 1)
+        self._m2 = max(self._m2 - (value - self.mean) * (value - mean), 0.0)
+        self.mean = mean
+        self.count -= 1
+    
+    @property
+    def std(self):
+        ''' Sample standard deviation, 0 for less than two values. '''
+        return float(np.sqrt(self._m2 / (self.count - 1))) if self.count > 1 else 0.0
+
+
+class FaultEventLog(object):
+    ''' Log of fault events detected from the edges of the status bits.
+        Events of one type never overlap, so start and end times of each
+        type are sorted and the events within any time range are found
+        by bisection.
+    '''
+    
+    def __init__(self):
+        self._starts = {faultType: GrowingArray() for faultType, _ in analysis.FAULT_FIELDS}
+        self._ends = {faultType: GrowingArray() for faultType, _ in analysis.FAULT_FIELDS}
+        self._active = {faultType: False for faultType, _ in analysis.FAULT_FIELDS}
+        
+        # Incremented with every change of the log
+        self.version = 0
+    
+    def __len__(self):
+        return sum(len(starts) for starts in self._starts.values())
+    
+    def update(self, time, statusFrame):
+        ''' Detect begin and end of events.
+            - time: Seconds since start of acquisition
+            - statusFrame: Received HVC_StatusFrame
+            Returns True if the log changed.
+        '''
+        version = self.version
+        for faultType, field in analysis.FAULT_FIELDS:
+            isActive = bool(statusFrame[field])
+            if isActive and not self._active[faultType]:
+                self._starts[faultType].append(time)
+                self._ends[faultType].append(np.nan)
+                self.version += 1
+            elif not isActive and self._active[faultType]:
+                self._ends[faultType].values[-1] = time
+                self.version += 1
+            self._active[faultType] = isActive
+        return version != self.version
+    
+    def events(self, xMin, xMax):
+        ''' Returns dict of FaultType to (starts, ends) arrays of the
+            events overlapping [xMin, xMax]. Active events end with NaN.
+        '''
+        result = {}
+        for faultType, starts in self._starts.items():
+            starts = starts.values
+            ends = self._ends[faultType].values
+            # NaN of an active event sorts behind all times
+            first = np.searchsorted(ends, xMin, 'left')
+            last = np.searchsorted(starts, xMax, 'right')
+            result[faultType] = (starts[first:last].copy(), ends[first:last].copy())
+        return result
+    
+    def clear(self):
+        ''' Deletes all events. '''
+        for faultType, _ in analysis.FAULT_FIELDS:
+            self._starts[faultType].clear()
+            self._ends[faultType].clear()
+            self._active[faultType] = False
+        self.version += 1
+
+
+class PollingPolicy(object):
+    ''' Adaptive status poll interval. While the motor turns or right after
+        a setpoint change the minimum interval is used, at idle the
+        interval grows by DECAY per cycle up to the maximum. Every change
+        of the effective interval is recorded.
+    '''
+    
+    # Poll interval bounds in milliseconds
+    MIN_INTERVAL = 20
+    MAX_INTERVAL = 200
+    
+    # Time in seconds the minimum interval is kept after activity
+    HOLD_TIME = 1.0
+    
+    # Growth factor of the interval per idle cycle
+    DECAY = 1.5
+    
+    def __init__(self, minInterval=MIN_INTERVAL, maxInterval=MAX_INTERVAL, holdTime=HOLD_TIME, decay=DECAY):
+        '''
+            - minInterval: Poll interval while active in milliseconds
+            - maxInterval: Poll interval at idle in milliseconds
+            - holdTime: Seconds the minimum interval is kept after activity
+            - decay: Growth factor of the interval per idle cycle
+        '''
+        self.setBounds(minInterval, maxInterval)
+        self._holdTime = holdTime
+        self._decay = decay
+        self._lastActivity = None
+        
+        # Time and effective interval of every interval change
+        self._times = GrowingArray()
+        self._intervals = GrowingArray(np.uint16)
+    
+    def setBounds(self, minInterval, maxInterval):
+        ''' Change the poll interval bounds in milliseconds. '''
+        self.minInterval = max(1, int(minInterval))
+        self.maxInterval = max(self.minInterval, int(maxInterval))
+        self.interval = self.maxInterval
+    
+    def update(self, time, currentSpeed, isSetpointChanged):
+        ''' Returns the poll interval in milliseconds for the next cycle.
+            - time: Seconds since start of acquisition
+            - currentSpeed: Current speed of the received status
+            - isSetpointChanged: True if a setpoint changed since last cycle
+        '''
+        if currentSpeed or isSetpointChanged:
+            self._lastActivity = time
+        
+        if self._lastActivity is not None and (time - self._lastActivity) < self._holdTime:
+            interval = self.minInterval
+        else:
+            interval = min(int(self.interval * self._decay) + 1, self.maxInterval)
+        
+        if interval != self.interval or not len(self._times):
+            self._times.append(time)
+            self._intervals.append(interval)
+        self.interval = interval
+        return interval
+    
+    def rates(self):
+        ''' Returns times in seconds and effective poll rates in Hz from
+            these times on.
+        '''
+        return self._times.values.copy(), 1000.0 / self._intervals.values
+    
+    def clear(self):
+        ''' Deletes the recorded rates and restarts at idle. '''
+        self._times.clear()
+        self._intervals.clear()
+        self._lastActivity = None
+        self.interval = self.maxInterval
+
+
+class MoveTimeoutError(Exception):
+    ''' Target position was not reached and settled in time. '''
+    pass
+
+
+class _Move(object):
+    ''' Move to a target position watched by MoveTracker. '''
+    
+    def __init__(self, target, tolerance, settleTime, timeout):
+        self.target = target
+        self.tolerance = tolerance
+        self.settleTime = settleTime
+        self.timeout = timeout
+        self.future = concurrent.futures.Future()
+        
+        # perf_counter_ns of the move start and of entering the tolerance
+        self.startTimestamp = time.perf_counter_ns()
+        self.settledTimestamp = None
+
+
+class MoveTracker(object):
+    ''' Detects completion of position control moves from the received
+        status frames. A move is complete when the current position stays
+        within the tolerance of the target at zero speed for the settle time.
+        Each move resolves a concurrent.futures.Future with the move
+        duration in seconds or MoveTimeoutError.
+    '''
+    
+    # Allowed deviation of current from target position
+    TOLERANCE = 2
+    
+    # Time in nanoseconds the position has to stay within tolerance
+    SETTLE_TIME = 200000000
+    
+    # Time in nanoseconds until a move fails
+    TIMEOUT = 30000000000
+    
+    def __init__(self):
+        self._moves = []
+        self._lock = threading.Lock()
+    
+    def track(self, target, tolerance=TOLERANCE, settleTime=SETTLE_TIME, timeout=TIMEOUT):
+        ''' Watch a move to target, returns its Future.
+            - target: Target position
+            - tolerance: Allowed deviation of the position
+            - settleTime: Nanoseconds the position has to stay in tolerance
+            - timeout: Nanoseconds until the move fails
+        '''
+        move = _Move(target, tolerance, settleTime, timeout)
+        with self._lock:
+            self._moves.append(move)
+        return move.future
+    
+    def update(self, timestamp, currentPos, currentSpeed):
+        ''' Check watched moves against a received status.
+            - timestamp: time.perf_counter_ns() sampling timestamp
+            - currentPos: Current position of the status frame
+            - currentSpeed: Current speed of the status frame
+        '''
+        done = []
+        with self._lock:
+            for move in self._moves:
+                if abs(currentPos - move.target) <= move.tolerance and 0 == currentSpeed:
+                    if move.settledTimestamp is None:
+                        move.settledTimestamp = timestamp
+                    if (timestamp - move.settledTimestamp) >= move.settleTime:
+                        done.append((move, (timestamp - move.startTimestamp) * 1e-9))
+                        continue
+                else:
+                    move.settledTimestamp = None
+                
+                if (timestamp - move.startTimestamp) >= move.timeout:
+                    error = MoveTimeoutError("Position {} not reached, current {}".format(move.target, currentPos))
+                    done.append((move, error))
+            
+            for move, _ in done:
+                self._moves.remove(move)
+        
+        # Resolve outside the lock, callbacks may start the next move
+        for move, result in done:
+            if isinstance(result, Exception):
+                move.future.set_exception(result)
+            else:
+                move.future.set_result(result)
+    
+    def cancel(self, future=None):
+        ''' Cancel watched move of future or all moves if None. '''
+        with self._lock:
+            moves = [move for move in self._moves if future in (None, move.future)]
+            self._moves = [move for move in self._moves if move not in moves]
+        for move in moves:
+            move.future.cancel()
+
+
+class ReconnectSupervisor(threading.Thread):
+    ''' Searches a lost LIN adapter in background with exponential backoff.
+        The last port is probed as long as its device node exists,
+        otherwise all ports are searched, as the adapter may come back
+        under another name after replugging. The future is resolved with
+        the port of the adapter and cancelled by stop().
+    '''
+    
+    # Delay in seconds before the first attempt
+    INITIAL_DELAY = 0.2
+    
+    # Upper bound of the delay between attempts in seconds
+    MAX_DELAY = 5.0
+    
+    # Factor the delay grows by after each failed attempt
+    BACKOFF = 2.0
+    
+    def __init__(self, comPort, listPorts=adapterDiscovery.candidatePorts,
+                 initialDelay=INITIAL_DELAY, maxDelay=MAX_DELAY):
+        '''
+            - comPort: Port of the lost adapter
+            - listPorts: Function returning the current serial ports
+            - initialDelay: Delay before the first attempt in seconds
+            - maxDelay: Upper bound of the delay in seconds
+        '''
+        super().__init__(daemon=True)
+        self.comPort = comPort
+        self._listPorts = listPorts
+        self.future = concurrent.futures.Future()
+        self.attempts = 0
+        self._initialDelay = initialDelay
+        self._maxDelay = maxDelay
+        self._stopEvent = threading.Event()
+    
+    def stop(self):
+        ''' Give up searching, cancels the future. '''
+        self._stopEvent.set()
+    
+    def run(self):
+        delay = self._initialDelay
+        while not self._stopEvent.wait(delay):
+            self.attempts += 1
+            port = self._search()
+            if port is not None and not self._stopEvent.is_set():
+                self.future.set_result(port)
+                return
+            delay = min(delay * ReconnectSupervisor.BACKOFF, self._maxDelay)
+        self.future.cancel()
+    
+    def _search(self):
+        ''' Returns port of the adapter or None. '''
+        ports = self._listPorts()
+        if self.comPort in ports:
+            return self.comPort if adapterDiscovery.probePort(self.comPort) else None
+        adapters = adapterDiscovery.discoverAdapters(ports)
+        return adapters[0] if adapters else None
 
 
 class Model(object):
@@ -63,9 +942,20 @@ class Model(object):
     # Timewindows in ...
     TIME_WINDOW_WIDTH = 1000
     
-    def __init__(self, linAdapter):
+    # Interval of link statistics updates in nanoseconds
+    LINK_STATISTICS_INTERVAL = 1000000000
+    
+    # Interval in nanoseconds an unchanged control frame is repeated
+    KEEPALIVE_INTERVAL = 1000000000
+    
+    # RAM in bytes for the latest telemetry and history samples, older
+    # samples are spilled to disk
+    MEMORY_BUDGET = 64 * 1024 * 1024
+    
+    def __init__(self, linAdapter, memoryBudget=MEMORY_BUDGET):
         ''' 
             - linAdapter: LIN Adapter object
+            - memoryBudget: RAM in bytes for the latest samples
         '''
         # Controller Object: Ifc for UI control
         self._ctrl = None
@@ -73,6 +963,9 @@ class Model(object):
         # LIN Adapter Access
         self._linAdapter = linAdapter
         
+        # Motor driver parameters via diagnostic frames
+        self.parameterService = ParameterService(linAdapter)
+        
         # Cyclic update _timer
         self._timer = QtCore.QTimer()
         
@@ -90,26 +983,96 @@ class Model(object):
         self.ctrlFrame.direction = DefaultValues.DIRECTION        
         
         
+        # Send control frame at once on changes, otherwise as keepalive
+        self.ctrlFrame.onChange = self._onControlChanged
+        
+        # Serializes changes of several control fields by other threads
+        # with encoding the control frame, so no half applied change is sent
+        self._controlLock = threading.RLock()
+        self._sentVersion = None
+        self._sentTimestamp = 0
+        self._isSendPending = False
+        
+        # Control frame version of the frame handed to the schedule table
+        self._scheduledVersion = None
+        
+        # Schedule table doing the transfers instead of cyclicUpdate and
+        # the status frames it received, not yet processed
+        self._schedule = None
+        self._scheduledStatuses = collections.deque()
+        
         # Initialize Status Frame
         self.statusFrame = rpc.HVC_StatusFrame()
         
         # Update intervall for plots / serial commonication in milliseconds
         self._interval = Model.UPDATE_INTERVAL
         
-        # Number of data points we display at once in a plot
-        self._bufsize = Model.TIME_WINDOW_WIDTH
+        # Adapts the update interval to the motor activity
+        self.pollingPolicy = PollingPolicy(maxInterval=Model.UPDATE_INTERVAL)
+        
+        # Control frame version of the last cycle to detect changes
+        self._lastSetpoints = None
         
-        # BVDD Plot Data
-        self._plotDataBvdd = PlotData(self._bufsize)
+        # Conversion of the raw channel values to engineering units,
+        # nominal until a board calibration is set
+        self.calibration = None
+        self.conversions = channelConversions()
+        rawTypes = {channel: dict(TelemetryStore.STATUS_COLUMNS)[conversion.field]
+                    for channel, conversion in self.conversions.items()}
         
-        # Temperature Plot Data
-        self._plotDataTemperature = PlotData(self._bufsize)
+        # Split the memory budget into the number of samples kept in RAM
+        # by the telemetry columns and the raw x/y history of each channel
+        sampleSize = (sum(np.dtype(dtype).itemsize for _, dtype in TelemetryStore.COLUMNS)
+                      + sum(np.dtype(np.float64).itemsize + np.dtype(dtype).itemsize
+                            for dtype in rawTypes.values()))
+        hotCapacity = max(memoryBudget // sampleSize, 1024)
+        self._spillWorker = SpillWorker()
+        self._spillWorker.start()
         
-        # Rotor Speed Plot Data
-        self._plotDataRotorSpeed = PlotData(self._bufsize)
+        # All received status data with control setpoints
+        self.telemetry = TelemetryStore(hotCapacity, self._spillWorker)
+        
+        # Complete zoomable history of all plotted channels
+        self._history = {channel: PyramidStore(dtype=dtype, hotCapacity=hotCapacity, spillWorker=self._spillWorker)
+                         for channel, dtype in rawTypes.items()}
+        
+        # Incremental statistics of the raw channel values over the
+        # session and the live time window
+        self._statistics = {channel: RunningStatistics(Model.TIME_WINDOW_WIDTH,
+                                                       256 if 1 == np.dtype(dtype).itemsize else None)
+                            for channel, dtype in rawTypes.items()}
+        
+        # Live spectrum of the rotor speed, computed in a worker thread
+        self.rotorSpeedSpectrum = spectrum.StreamingSpectrum()
+        self.rotorSpeedSpectrum.start()
         
         # Start time of data plots
         self._startTime = None
+        
+        # Time of last link statistics update
+        self._linkStatisticsTime = 0
+        
+        # Active recording.RecordingWriter or None
+        self._recorder = None
+        
+        # Completion detection of position moves
+        self.moveTracker = MoveTracker()
+        
+        # Stall, over current, over temperature and error events
+        self.faultEvents = FaultEventLog()
+        
+        # Cache of the serial ports, updated on hot-plug
+        self.portMonitor = PortMonitor()
+        self.portMonitor.start()
+        
+        # Port of the running acquisition and the search for it after a
+        # link loss, polled by the reconnect timer
+        self._comPort = None
+        self.isAutoReconnect = True
+        self._reconnect = None
+        self._isScheduleLost = False
+        self._reconnectTimer = QtCore.QTimer()
+        self._reconnectTimer.timeout.connect(self._onReconnectProgress)
       
         
     def registerController(self, controllerObj):
@@ -124,9 +1087,140 @@ class Model(object):
     
     def clearData(self):
         ''' Clear plot data buffers. '''
-        self._plotDataBvdd.clear()
-        self._plotDataTemperature.clear()
-        self._plotDataRotorSpeed.clear()
+        self.telemetry.clear()
+        for history in self._history.values():
+            history.clear()
+        self.rotorSpeedSpectrum.clear()
+        self.faultEvents.clear()
+        for statistics in self._statistics.values():
+            statistics.clear()
+        self.pollingPolicy.clear()
+        self._interval = self.pollingPolicy.interval
+        self._lastSetpoints = None
+        self._ctrl.clearPlots()
+    
+    
+    def getHistory(self, channel, xMin, xMax, maxPoints):
+        ''' Returns (x, y) plot data of channel within [xMin, xMax] with
+            at most about maxPoints points, independent of the length
+            of the recorded history.
+        '''
+        x, y = self._history[channel].getEnvelope(xMin, xMax, maxPoints)
+        return x, self.conversions[channel](y)
+    
+    
+    def getRecent(self, channel, count):
+        ''' Returns (x, y) data of the last count samples of channel. '''
+        x, y = self._history[channel].getLast(count)
+        return x, self.conversions[channel](y)
+    
+    
+    def setCalibration(self, boardCalibration):
+        ''' Use calibration.BoardCalibration or the nominal conversions if
+            None. As raw values are stored, the whole history and exports
+            are converted with the new calibration.
+        '''
+        self.calibration = boardCalibration
+        self.conversions = channelConversions(boardCalibration)
+    
+    
+    def channelStatistics(self):
+        ''' Returns dict of Channel to RunningStatistics.statistics() of
+            the session and the live time window in engineering units.
+        '''
+        return {channel: statistics.statistics(self.conversions[channel])
+                for channel, statistics in self._statistics.items()}
+    
+    
+    def exportConversions(self):
+        ''' Returns dict of export column name to the Conversion adding
+            the channel in engineering units to exported telemetry.
+        '''
+        return {"{}_{}".format(channel, conversion.unit): conversion
+                for channel, conversion in self.conversions.items()}
+    
+    
+    def applySetpoints(self, setpoints):
+        ''' Change control frame setpoints and send them at once.
+            May be called from other threads, e.g. motion sequences.
+            - setpoints: Dict of ElmControl field name to value
+            Returns time.perf_counter_ns() transmit timestamp or None if
+            sending failed.
+            Raises ValueError if a setpoint does not fit the control frame,
+            the control frame is not changed then.
+        '''
+        # Own frame, so the timestamps are not overwritten by cyclicUpdate
+        frame = rpc.HVC_ControlFrame()
+        with self._controlLock:
+            for name, _ in recording.CONTROL_FIELDS:
+                frame[name] = setpoints.get(name, self.ctrlFrame[name])
+            frame.toBytearray()
+            
+            for name, value in setpoints.items():
+                self.ctrlFrame[name] = value
+            version = self.ctrlFrame.version
+        
+        if self._linAdapter.callLinSendMsg(frame):
+            self._sentVersion = version
+            self._sentTimestamp = frame.txTimestamp
+            return frame.txTimestamp
+        return None
+    
+    
+    def moveTo(self, position, callback=None, **kwargs):
+        ''' Start position control move and watch its completion.
+            - position: Target position
+            - callback: Optional function called with the Future when
+                        the move completed or failed
+            - kwargs: Tolerance, settleTime and timeout of MoveTracker.track()
+            Returns concurrent.futures.Future resolved with the move
+            duration in seconds or MoveTimeoutError.
+        '''
+        future = self.moveTracker.track(position, **kwargs)
+        if callback is not None:
+            future.add_done_callback(callback)
+        
+        setpoints = {rpc.ElmControl.OP_MODE: rpc.OpMode.POSITION_CTRL, rpc.ElmControl.NEW_POS: position}
+        if self.applySetpoints(setpoints) is None:
+            self.moveTracker.cancel(future)
+        return future
+    
+    
+    def stepResponse(self, signal=analysis.StepSignal.POSITION, start=0, **kwargs):
+        ''' Returns step response metrics of the telemetry from row start,
+            e.g. of the last move. See analysis.stepResponse().
+        '''
+        # One row before start gives the initial value of the first step
+        return analysis.analyseColumns(self.telemetry.columns(max(start - 1, 0)), signal, **kwargs)
+    
+    
+    @property
+    def isRecording(self):
+        ''' True while received frames are recorded to a file. '''
+        return self._recorder is not None
+    
+    
+    @property
+    def recordingError(self):
+        ''' Exception that stopped writing the active recording or None. '''
+        recorder = self._recorder
+        return None if recorder is None else recorder.error
+    
+    
+    def startRecording(self, path):
+        ''' Record all following status frames and control changes to path. '''
+        self.stopRecording()
+        metadata = None if self.calibration is None else {'calibration': self.calibration.toDict()}
+        self._recorder = recording.RecordingWriter(path, metadata=metadata)
+        self._recorder.setLinkStatistics(self._linAdapter.linkMonitor.statistics())
+    
+    
+    def stopRecording(self):
+        ''' Finish active recording. '''
+        if self._recorder is not None:
+            self._recorder.setLinkStatistics(self._linAdapter.linkMonitor.statistics())
+            self._recorder.close()
+            self._recorder = None
     
     
     def start(self, comPort):
@@ -137,13 +1231,17 @@ class Model(object):
         self.clearData()
         
         # Set start time
-        self._startTime = datetime.now()
+        self._startTime = time.perf_counter_ns()
         
         try:
             # Open communication channel with LIN Adapter
+            self._comPort = comPort
             self._linAdapter.connect(comPort)
 
             if self._linAdapter.isConnected:
+                # Send complete control frame with the first cycle
+                self._sentVersion = None
+                
                 # Start cyclic timer           
                 self._timer.start(self._interval)
                 
@@ -161,66 +1259,543 @@ class Model(object):
     def stop(self):
         ''' Stop cyclic update of LIN Adapter. '''       
         self._timer.stop()        
+        self.stopSchedule()
+        self._stopReconnect()
         if self._linAdapter.isConnected:
             self._linAdapter.disconnect()
     
     
+    @property
+    def isConnected(self):
+        ''' True while acquisition from the LIN Adapter is running. '''
+        return self._timer.isActive() and self._linAdapter.isConnected
+    
+    
+    @property
+    def isReconnecting(self):
+        ''' True while a lost adapter is searched. '''
+        return self._reconnect is not None
+    
+    
+    @property
+    def isScheduled(self):
+        ''' True while the transfers are done by a schedule table. '''
+        return self._schedule is not None
+    
+    
+    def startSchedule(self, slots=None):
+        ''' Do control, status and diagnostic transfers by a schedule table
+            instead of the cyclic update. The cyclic update only shows the
+            received status frames.
+            - slots: List of scheduleTable.ScheduleSlot, default table if None
+        '''
+        self.stopSchedule()
+        self._sentVersion = None
+        self._scheduledStatuses.clear()
+        self._schedule = ScheduleTable(self._linAdapter, slots, self._scheduledControlFrame,
+                                       self._scheduledStatuses.append, self._scheduledControlSent)
+        self._schedule.start()
+        
+        # Statuses arrive at the rate of the table, the UI needs no more
+        self._interval = Model.UPDATE_INTERVAL
+        if self._timer.isActive():
+            self._timer.setInterval(self._interval)
+    
+    
+    def stopSchedule(self):
+        ''' Return to transfers by the cyclic update. '''
+        if self._schedule is not None:
+            self._schedule.stop()
+            self._schedule.join()
+            self._schedule = None
+            self._sentVersion = None
+    
+    
+    def scheduleStatistics(self):
+        ''' Returns slot statistics of the schedule table or None. '''
+        schedule = self._schedule
+        return None if schedule is None else schedule.statistics()
+    
+    
+    def submitDiagRequest(self, nad, payload):
+        ''' Queue diagnostic request for the diagnostic slots of the
+            schedule table. Returns concurrent.futures.Future of the
+            response bytes.
+        '''
+        if self._schedule is None:
+            raise rpc.LINDiagError("No schedule table running")
+        return self._schedule.submitDiagRequest(nad, payload)
+    
+    
+    def _scheduledControlFrame(self):
+        ''' Control source of the schedule table, called by its worker.
+            Returns copy of the control frame if it changed or is due as
+            keepalive, otherwise None.
+        '''
+        version = self.ctrlFrame.version
+        now = time.perf_counter_ns()
+        if version == self._sentVersion and (now - self._sentTimestamp) < Model.KEEPALIVE_INTERVAL:
+            return None
+        
+        frame = rpc.HVC_ControlFrame()
+        with self._controlLock:
+            version = self.ctrlFrame.version
+            for name, _ in recording.CONTROL_FIELDS:
+                frame[name] = self.ctrlFrame[name]
+        self._scheduledVersion = version
+        return frame
+    
+    
+    def _scheduledControlSent(self, frame):
+        ''' Called by the schedule table's worker when the adapter echoed
+            the frame of _scheduledControlFrame().
+        '''
+        self._sentVersion = self._scheduledVersion
+        self._sentTimestamp = frame.txTimestamp
+    
+    
     def cyclicUpdate(self):       
         ''' Update LIN adapter with current control data.
             Requests current status of LIN Adapter.
             Update of UI with received status data.
         '''
-        # Update LIN Adapter with current settings
-        if (True == self._linAdapter.callLinSendMsg(self.ctrlFrame)):
+        # Transfers are done by the schedule table, only show its results
+        if self._schedule is not None:
+            self._processScheduledStatus()
+            return
         
+        try:
+            # Update LIN Adapter with changed settings or keepalive
+            if not self._sendControl():
+                self._onLinkLost()
+                return
+            
             # Request current status data from LIN adapter
             status = self._linAdapter.callGetStatus(self.statusFrame)
+        except (serial.SerialException, OSError):
+            # Adapter unplugged, an exception must not leave the timer slot
+            self._onLinkLost()
+            return
+        
+        # Show link quality before dropping an incomplete response
+        self._updateLinkStatistics()
+        if status is None:
+            return
+        
+        self._processStatus(status)
         
-            # Get elapsed time from start
-            dt = (self._getElapsedTime() / controller.DefinedValues.TIMEBASE_FACTOR.value)
-            #20190822 BBr fix for kms as time scale to seconds + fast update rate
-            
-            # Update BVDD Plot with new data       
-            self._plotDataBvdd.add(dt, (status.bvdd * controller.DefinedValues.BVDD_FACTOR.value))
-            self._ctrl.updateBvddPlot(self._plotDataBvdd)
-            
-            # Update Temperature Plot with new data
-            self._plotDataTemperature.add(dt, (status.tj + controller.DefinedValues.TJ_OFFSET.value))
-            #20180822 BBr added Temp offset - 60 °C
-            self._ctrl.updateTemeperatuePlot(self._plotDataTemperature)
-            
-            # Update RotortSpeed Plot with new data
-            self._plotDataRotorSpeed.add(dt, (status.currentSpeed * controller.DefinedValues.RPM_FACTOR.value))
-            self._ctrl.updateRotorSpeedPlot(self._plotDataRotorSpeed)
-            
-            # Update current speed
-            self._ctrl.updateCurrentSpeed(status.currentSpeed)
-                    
-            # Update current position
-            self._ctrl.updateCurrentPosition(status.currentPos)
-            
-            # Update status indicator Error ##Lin Error
-            statusIndication = controller.Status.ERROR if status.hvcStatus else controller.Status.NO_ERROR        
-            #statusIndication = controller.Status.ERROR if status.isLinError else controller.Status.NO_ERROR
-            self._ctrl.setStatusIndicator(statusIndication)
+        # Poll faster while the motor is active
+        self._adaptInterval(self._getElapsedTime(status.sampleTimestamp), status.currentSpeed)
+    
+    
+    def _processScheduledStatus(self):
+        ''' Process all status frames received by the schedule table. '''
+        if self._schedule.error is not None:
+            self._onLinkLost()
+            return
+        
+        while self._scheduledStatuses:
+            self._processStatus(self._scheduledStatuses.popleft())
+        self._updateLinkStatistics()
+    
+    
+    def _processStatus(self, status):
+        ''' Store received status and update UI with it. '''
+        # Get elapsed time from start to sampling of status
+        dt = self._getElapsedTime(status.sampleTimestamp)
+        
+        # Keep complete status and setpoints for export
+        self.telemetry.add(dt, status.sampleTimestamp, status, self.ctrlFrame)
+        # A failed recording is stopped by the controller
+        if self._recorder is not None and self._recorder.error is None:
+            self._recorder.add(status.sampleTimestamp, status, self.ctrlFrame)
+        
+        # The history keeps raw values, they are converted when plotted
+        conversions = self.conversions
+        
+        # Update BVDD Plot with new data       
+        self._history[Channel.BVDD].add(dt, status.bvdd)
+        self._ctrl.updateBvddPlot(dt, conversions[Channel.BVDD](status.bvdd))
+        
+        # Update Temperature Plot with new data
+        #20180822 BBr added Temp offset - 60 °C
+        self._history[Channel.TJ].add(dt, status.tj)
+        self._ctrl.updateTemeperatuePlot(dt, conversions[Channel.TJ](status.tj))
+        
+        # Update RotortSpeed Plot with new data
+        rotorSpeed = conversions[Channel.ROTOR_SPEED](status.currentSpeed)
+        self._history[Channel.ROTOR_SPEED].add(dt, status.currentSpeed)
+        self.rotorSpeedSpectrum.add(dt, rotorSpeed)
+        self._ctrl.updateRotorSpeedPlot(dt, rotorSpeed)
+        
+        # Running statistics of the raw channel values
+        for channel, conversion in conversions.items():
+            self._statistics[channel].add(status[conversion.field])
+        
+        # Log fault events and mark them in the plots
+        if self.faultEvents.update(dt, status):
+            self._ctrl.updateFaultMarkers()
+        
+        # Detect completed position moves
+        self.moveTracker.update(status.sampleTimestamp, status.currentPos, status.currentSpeed)
+        
+        # Update current speed
+        self._ctrl.updateCurrentSpeed(status.currentSpeed)
+                
+        # Update current position
+        self._ctrl.updateCurrentPosition(status.currentPos)
+        
+        # Update status indicator Error ##Lin Error
+        statusIndication = controller.Status.ERROR if status.hvcStatus else controller.Status.NO_ERROR        
+        #statusIndication = controller.Status.ERROR if status.isLinError else controller.Status.NO_ERROR
+        self._ctrl.setStatusIndicator(statusIndication)
            
-            # Update status indicator Over Current
-            statusIndication = controller.Status.OVER_CURRENT if status.isOverCurrent else controller.Status.NO_OVER_CURRENT
-            self._ctrl.setStatusIndicator(statusIndication)
-            
-            # Update status indicator Over Temperature
-            statusIndication = controller.Status.OVER_TEMPERATURE if status.isOverTemperature else controller.Status.NO_OVER_TEMPERATURE
-            self._ctrl.setStatusIndicator(statusIndication)
-        else:
-            self.stop()
+        # Update status indicator Over Current
+        statusIndication = controller.Status.OVER_CURRENT if status.isOverCurrent else controller.Status.NO_OVER_CURRENT
+        self._ctrl.setStatusIndicator(statusIndication)
+        
+        # Update status indicator Over Temperature
+        statusIndication = controller.Status.OVER_TEMPERATURE if status.isOverTemperature else controller.Status.NO_OVER_TEMPERATURE
+        self._ctrl.setStatusIndicator(statusIndication)
+    
+    
+    def _onLinkLost(self, isScheduleLost=None):
+        ''' Stop acquisition after a failed transfer and search the
+            adapter in background if isAutoReconnect is set.
+            - isScheduleLost: Restart the schedule table after reconnecting,
+                              by default if it is running now
+        '''
+        isScheduled = self.isScheduled if isScheduleLost is None else isScheduleLost
+        self.stop()
+        self.moveTracker.cancel()
+        
+        if not self.isAutoReconnect or self._comPort is None:
             self._ctrl.setStatusIndicator(controller.Status.TARGET_OFFLINE)
+            return
+        
+        self._isScheduleLost = isScheduled
+        self._reconnect = ReconnectSupervisor(self._comPort, self.portMonitor.ports)
+        self._reconnect.start()
+        self._reconnectTimer.start(Model.UPDATE_INTERVAL)
+        self._ctrl.setStatusIndicator(controller.Status.RECONNECTING)
+    
+    
+    def _onReconnectProgress(self):
+        ''' Resume acquisition once the lost adapter was found again.
+            Telemetry, plots and an active recording are continued, the
+            time axis shows the gap of the link loss.
+        '''
+        future = self._reconnect.future
+        if not future.done():
+            return
+        self._reconnectTimer.stop()
+        self._reconnect = None
+        if future.cancelled():
+            return
+        
+        try:
+            self._comPort = future.result()
+            self._linAdapter.connect(self._comPort)
+            isConnected = self._linAdapter.isConnected
+        except Exception:
+            isConnected = False
+        if not isConnected:
+            # Lost again while reopening, keep searching and restart
+            # the schedule table that ran before the first loss
+            self._onLinkLost(self._isScheduleLost)
+            return
+        
+        self._sentVersion = None
+        self._timer.start(self._interval)
+        if self._isScheduleLost:
+            self.startSchedule()
+        self._ctrl.setStatusIndicator(controller.Status.TARGET_ONLINE)
+    
+    
+    def _stopReconnect(self):
+        ''' Abort search for a lost adapter. '''
+        if self._reconnect is not None:
+            self._reconnect.stop()
+            self._reconnect = None
+        self._reconnectTimer.stop()
+    
+    
+    def _sendControl(self):
+        ''' Sends control frame if it changed since the last transmission
+            or KEEPALIVE_INTERVAL elapsed.
+            Returns False if sending failed.
+        '''
+        version = self.ctrlFrame.version
+        isDue = (time.perf_counter_ns() - self._sentTimestamp) >= Model.KEEPALIVE_INTERVAL
+        if version == self._sentVersion and not isDue:
+            return True
+        
+        with self._controlLock:
+            version = self.ctrlFrame.version
+            if not self._linAdapter.callLinSendMsg(self.ctrlFrame):
+                return False
+        self._sentVersion = version
+        self._sentTimestamp = self.ctrlFrame.txTimestamp
+        return True
+    
+    
+    def _onControlChanged(self):
+        ''' Schedule transmission of the changed control frame. Changes of
+            several fields within one event loop cycle are sent together.
+            Changes from other threads are sent by the changing thread or
+            the next cycle.
+        '''
+        if (self._timer.isActive() and not self._isSendPending and self._schedule is None
+                and threading.current_thread() is threading.main_thread()):
+            self._isSendPending = True
+            QtCore.QTimer.singleShot(0, self._sendPendingControl)
+    
+    
+    def _sendPendingControl(self):
+        ''' Send control frame changed since the last cycle. '''
+        self._isSendPending = False
+        if not self._timer.isActive() or self._schedule is not None:
+            return
+        try:
+            isSent = self._sendControl()
+        except (serial.SerialException, OSError):
+            isSent = False
+        if not isSent:
+            self._onLinkLost()
             
         
-    def _getElapsedTime(self):
-        ''' Returns time difference from startTime and now in milliseconds. '''
-        #Time difference from start        
-        dt = datetime.now() - self._startTime 
+    def _adaptInterval(self, time, currentSpeed):
+        ''' Apply interval of the polling policy to the cyclic timer. '''
+        version = self.ctrlFrame.version
+        isSetpointChanged = self._lastSetpoints is not None and version != self._lastSetpoints
+        self._lastSetpoints = version
         
-        #Time difference in milliseconds
-        dt_ms = int(dt.total_seconds() * controller.DefinedValues.TIMEBASE_FACTOR.value)        
-        return dt_ms
+        self._interval = self.pollingPolicy.update(time, currentSpeed, isSetpointChanged)
+        if self._timer.isActive() and self._interval != self._timer.interval():
+            self._timer.setInterval(self._interval)
+    
+    
+    def _updateLinkStatistics(self):
+        ''' Update UI with link statistics every LINK_STATISTICS_INTERVAL. '''
+        now = time.perf_counter_ns()
+        if (now - self._linkStatisticsTime) >= Model.LINK_STATISTICS_INTERVAL:
+            self._linkStatisticsTime = now
+            statistics = self._linAdapter.linkMonitor.statistics()
+            statistics['pollRate'] = 1000.0 / self._interval
+            statistics['schedule'] = self.scheduleStatistics()
+            self._ctrl.updateLinkStatistics(statistics)
+            if self._recorder is not None:
+                self._recorder.setLinkStatistics(statistics)
+    
+    
+    def _getElapsedTime(self, timestamp):
+        ''' Returns time difference from startTime to timestamp in seconds.
+            - timestamp: time.perf_counter_ns() timestamp
+        '''
+        return (timestamp - self._startTime) * 1e-9
+
+
+if __name__ == '__main__':
+    import unittest
+    from unittest import mock
+    
+    class TestTieredArray(unittest.TestCase):
+        ''' Unit test of TieredArray class.
+        '''
+        
+        def test_acrossTiers(self):
+            array = TieredArray(np.float64, 100)
+            for value in range(960):
+                array.append(float(value))
+            array.spill()
+            for value in range(960, 1000):
+                array.append(float(value))
+            reference = np.arange(1000.0)
+            
+            np.testing.assert_array_equal(array.get(), reference)
+            np.testing.assert_array_equal(array.get(850, 990), reference[850:990])
+            for value in [-1.0, 0.0, 5.5, 899.0, 930.0, 970.0, 999.0, 1000.0]:
+                for side in ('left', 'right'):
+                    self.assertEqual(array.searchsorted(value, side), np.searchsorted(reference, value, side))
+        
+        def test_spillWorker(self):
+            worker = SpillWorker()
+            worker.start()
+            array = TieredArray(np.int16, 64, worker)
+            for value in range(1000):
+                array.append(value)
+            np.testing.assert_array_equal(array.get(-500), np.arange(500, 1000))
+            array.clear()
+            self.assertEqual(len(array), 0)
+            self.assertEqual(array.searchsorted(3), 0)
+    
+    class TestPyramidStore(unittest.TestCase):
+        ''' Unit test of PyramidStore class.
+        '''
+        
+        def test_range(self):
+            store = PyramidStore(hotCapacity=100)
+            for x in range(1000):
+                store.add(float(x), x % 7)
+            x, yMin, yMax, _ = store.getRange(970, 980, 1000)
+            np.testing.assert_array_equal(x, np.arange(970.0, 981.0))
+            
+            # Coarse query is served from an aggregated level
+            x, yMin, yMax, _ = store.getRange(0, 999, 100)
+            self.assertLessEqual(len(x), 101)
+            self.assertEqual(yMin.min(), 0)
+            self.assertEqual(yMax.max(), 6)
+    
+    class TestTelemetryStore(unittest.TestCase):
+        ''' Unit test of TelemetryStore class.
+        '''
+        
+        def test_columns(self):
+            status = {name: 1 for name, _ in TelemetryStore.STATUS_COLUMNS}
+            control = {name: 2 for name, _ in TelemetryStore.CONTROL_COLUMNS}
+            store = TelemetryStore(hotCapacity=16)
+            for idx in range(40):
+                store.add(idx * 0.1, idx, status, control)
+            columns = store.columns(30)
+            self.assertEqual(len(store), 40)
+            np.testing.assert_array_equal(columns[TelemetryStore.TIMESTAMP], np.arange(30, 40))
+            self.assertEqual(columns[rpc.ElmStatus.BVDD].dtype, np.uint8)
+    
+    class TestRunningStatistics(unittest.TestCase):
+        ''' Unit test of RunningStatistics class.
+        '''
+        
+        def test_statistics(self):
+            values = np.random.RandomState(1).randint(0, 256, 1000)
+            statistics = RunningStatistics(100)
+            for value in values:
+                statistics.add(int(value))
+            stats = statistics.statistics()
+            
+            window = values[-100:]
+            self.assertEqual(stats['window']['min'], window.min())
+            self.assertEqual(stats['window']['max'], window.max())
+            self.assertAlmostEqual(stats['window']['mean'], window.mean())
+            self.assertAlmostEqual(stats['window']['std'], window.std(ddof=1))
+            self.assertEqual(stats['window']['p50'], np.percentile(window, 50, method='nearest'))
+            self.assertAlmostEqual(stats['session']['std'], values.std(ddof=1))
+            self.assertEqual(stats['session']['count'], 1000)
+            
+            converted = statistics.statistics(lambda raw: np.asarray(raw, np.float64) * 0.2)
+            self.assertAlmostEqual(converted['window']['mean'], window.mean() * 0.2)
+            
+            statistics.clear()
+            self.assertIsNone(statistics.statistics()['session'])
+    
+    class TestPollingPolicy(unittest.TestCase):
+        ''' Unit test of PollingPolicy class.
+        '''
+        
+        def test_adapt(self):
+            policy = PollingPolicy(20, 200, holdTime=1.0, decay=2.0)
+            self.assertEqual(policy.update(0.0, 0, False), 200)
+            self.assertEqual(policy.update(0.1, 5, False), 20)
+            self.assertEqual(policy.update(0.9, 0, False), 20)
+            self.assertEqual(policy.update(1.2, 0, False), 41)
+            self.assertEqual(policy.update(1.3, 0, False), 83)
+            self.assertEqual(policy.update(1.4, 0, True), 20)
+            times, rates = policy.rates()
+            np.testing.assert_allclose(times, [0.0, 0.1, 1.2, 1.3, 1.4])
+            self.assertEqual(rates[1], 50.0)
+    
+    class TestMoveTracker(unittest.TestCase):
+        ''' Unit test of MoveTracker class.
+        '''
+        
+        def test_settled(self):
+            tracker = MoveTracker()
+            future = tracker.track(100, tolerance=2, settleTime=100, timeout=10000)
+            start = time.perf_counter_ns()
+            tracker.update(start + 10, 50, 3)
+            tracker.update(start + 20, 99, 0)
+            self.assertFalse(future.done())
+            tracker.update(start + 200, 101, 0)
+            self.assertTrue(future.done())
+            self.assertGreater(future.result(), 0)
+        
+        def test_timeout(self):
+            tracker = MoveTracker()
+            future = tracker.track(100, timeout=1000)
+            tracker.update(time.perf_counter_ns() + 2000, 0, 0)
+            self.assertIsInstance(future.exception(), MoveTimeoutError)
+        
+        def test_cancel(self):
+            tracker = MoveTracker()
+            future = tracker.track(100)
+            tracker.cancel()
+            self.assertTrue(future.cancelled())
+    
+    class TestModel(unittest.TestCase):
+        ''' Unit test of Model class with a simulated LIN adapter board.
+        '''
+        
+        class Board(object):
+            ''' Echoes control frames and answers status requests. '''
+            
+            def __init__(self):
+                self.pending = b''
+                self.is_open = True
+            
+            def write(self, data):
+                if rpc.FrameID.CONTROL == data[1]:
+                    self.pending += bytes(data)
+                else:
+                    self.pending += bytes([0x55, rpc.FrameID.STATUS, 6, 0, 0, 0, 60, 100, 0])
+                return len(data)
+            
+            def read(self, count):
+                data, self.pending = self.pending[:count], self.pending[count:]
+                return data
+            
+            def reset_input_buffer(self):
+                self.pending = b''
+            
+            def close(self):
+                self.is_open = False
+        
+        @classmethod
+        def setUpClass(cls):
+            cls.app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+        
+        def setUp(self):
+            adapter = rpc.LINAdapter()
+            adapter.linAdapterBoard = self.Board()
+            adapter._isConnected = True
+            self.model = Model(adapter)
+            self.model.registerController(mock.Mock())
+        
+        def test_applySetpoints(self):
+            model = self.model
+            self.assertIsNotNone(model.applySetpoints({rpc.ElmControl.SPEED: 5, rpc.ElmControl.NEW_POS: 100}))
+            self.assertEqual((model.ctrlFrame.speed, model.ctrlFrame.newPosition), (5, 100))
+            
+            # Invalid values never get into the control frame, it stays sendable
+            version = model.ctrlFrame.version
+            with self.assertRaises(ValueError):
+                model.applySetpoints({rpc.ElmControl.NEW_POS: 200, rpc.ElmControl.SPEED: 300})
+            self.assertEqual((model.ctrlFrame.speed, model.ctrlFrame.newPosition), (5, 100))
+            self.assertEqual(model.ctrlFrame.version, version)
+            model.ctrlFrame.toBytearray()
+        
+        def test_unplugged(self):
+            model = self.model
+            model._startTime = time.perf_counter_ns()
+            model._timer.start(model._interval)
+            model.cyclicUpdate()
+            self.assertEqual(len(model.telemetry), 1)
+            
+            def unplugged(data):
+                raise serial.SerialException("write failed: [Errno 5] Input/output error")
+            
+            # Link loss is reported instead of raising out of the timer slot
+            model._linAdapter.linAdapterBoard.write = unplugged
+            model.cyclicUpdate()
+            self.assertFalse(model.isConnected)
+            model._ctrl.setStatusIndicator.assert_called_with(controller.Status.TARGET_OFFLINE)
+    
+    unittest.main()
@@ -0,0 +1,404 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Scripted motion sequences of control frame setpoints.
+
+ Script syntax, one command per line, '#' starts a comment:
+   set <field>=<value> ...             Change setpoints at once
+   dwell <seconds>                     Keep setpoints for the given time
+   ramp <field> <from> <to> <seconds>  Step field linearly from..to, at
+                                       most every RAMP_STEP_INTERVAL
+   move <position> [<timeout>]         Position control move, following
+                                       commands start when it completed
+
+ Fields are the ElmControl names or their aliases in FIELD_ALIASES.
+ Values are integers or one of the names in VALUE_ALIASES.
+
+ Example:
+   set op_mode=speed direction=cw enable=1
+   ramp speed 0 7 2.0
+   dwell 5
+   set direction=stop
+
+'''
+
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+
+import comLib.linAdapter as rpc
+
+
+FIELD_ALIASES = {
+    'position': rpc.ElmControl.NEW_POS,
+    'mode': rpc.ElmControl.OP_MODE,
+}
+
+VALUE_ALIASES = {
+    rpc.ElmControl.DIRECTION: {
+        'stop': rpc.Direction.STOP,
+        'cw': rpc.Direction.CLOCKWISE,
+        'ccw': rpc.Direction.ANTI_CLOCKWISE,
+    },
+    rpc.ElmControl.OP_MODE: {
+        'position': rpc.OpMode.POSITION_CTRL,
+        'speed': rpc.OpMode.SPEED_CTRL,
+    },
+}
+
+# Shortest interval of ramp steps in seconds, the link does not carry
+# more control frames than the minimum polling interval of the model
+RAMP_STEP_INTERVAL = 0.02
+
+_CONTROL_FIELDS = [
+    rpc.ElmControl.INIT_CURRENT_POS,
+    rpc.ElmControl.NEW_POS,
+    rpc.ElmControl.SPEED,
+    rpc.ElmControl.OP_MODE,
+    rpc.ElmControl.ENABLE,
+    rpc.ElmControl.ENABLE_STALL_DETECTION,
+    rpc.ElmControl.DIRECTION,
+]
+
+
+# Valid values of the control fields, limited by their bit width in
+# the control frame
+_FIELD_RANGES = {
+    rpc.ElmControl.INIT_CURRENT_POS: (-0x8000, 0x7FFF),
+    rpc.ElmControl.NEW_POS: (-0x8000, 0x7FFF),
+    rpc.ElmControl.SPEED: (0, 0xFF),
+    rpc.ElmControl.OP_MODE: (0, 1),
+    rpc.ElmControl.ENABLE: (0, 1),
+    rpc.ElmControl.ENABLE_STALL_DETECTION: (0, 1),
+    rpc.ElmControl.DIRECTION: (0, 3),
+}
+
+
+class SequenceError(Exception):
+    ''' Invalid motion sequence script. '''
+    pass
+
+
+class SequenceStep(object):
+    ''' Setpoints to apply at a requested time. '''
+
+    def __init__(self, time, setpoints, line, isMove=False, timeout=None):
+        '''
+            - time: Requested time since sequence start in seconds
+            - setpoints: Dict of ElmControl field name to value
+            - line: Script line number of the command
+            - isMove: Wait for the move to setpoints' NEW_POS to complete
+            - timeout: Optional move timeout in seconds
+        '''
+        self.time = time
+        self.setpoints = setpoints
+        self.line = line
+        self.isMove = isMove
+        self.timeout = timeout
+
+
+def _parseField(name, lineNo):
+    field = FIELD_ALIASES.get(name, name)
+    if field not in _CONTROL_FIELDS:
+        raise SequenceError("Line {}: unknown field '{}'".format(lineNo, name))
+    return field
+
+
+def _parseValue(field, value, lineNo):
+    aliases = VALUE_ALIASES.get(field, {})
+    if value in aliases:
+        return aliases[value]
+    try:
+        number = int(value, 0)
+    except ValueError:
+        raise SequenceError("Line {}: invalid value '{}' of {}".format(lineNo, value, field))
+
+    minimum, maximum = _FIELD_RANGES[field]
+    if not minimum <= number <= maximum:
+        raise SequenceError("Line {}: value {} of {} out of range {}..{}".format(
+            lineNo, number, field, minimum, maximum))
+    return number
+
+
+def _parseSeconds(value, lineNo):
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = -1.0
+    if seconds < 0.0:
+        raise SequenceError("Line {}: invalid time '{}'".format(lineNo, value))
+    return seconds
+
+
+def parseSequence(text):
+    ''' Returns list of SequenceStep of a script, see module description.
+        Raises SequenceError on syntax errors.
+    '''
+    steps = []
+    cursor = 0.0
+    for lineNo, line in enumerate(text.splitlines(), 1):
+        words = line.split('#', 1)[0].split()
+        if not words:
+            continue
+        command, args = words[0].lower(), words[1:]
+
+        if 'set' == command and args:
+            setpoints = {}
+            for arg in args:
+                name, _, value = arg.partition('=')
+                field = _parseField(name, lineNo)
+                setpoints[field] = _parseValue(field, value, lineNo)
+            steps.append(SequenceStep(cursor, setpoints, lineNo))
+
+        elif 'move' == command and len(args) in (1, 2):
+            position = _parseValue(rpc.ElmControl.NEW_POS, args[0], lineNo)
+            timeout = _parseSeconds(args[1], lineNo) if 2 == len(args) else None
+            steps.append(SequenceStep(cursor, {rpc.ElmControl.NEW_POS: position}, lineNo, True, timeout))
+
+        elif 'dwell' == command and 1 == len(args):
+            cursor += _parseSeconds(args[0], lineNo)
+
+        elif 'ramp' == command and 4 == len(args):
+            field = _parseField(args[0], lineNo)
+            start = _parseValue(field, args[1], lineNo)
+            stop = _parseValue(field, args[2], lineNo)
+            duration = _parseSeconds(args[3], lineNo)
+
+            # Evenly spread steps over the duration, at most one per
+            # integer value and one per RAMP_STEP_INTERVAL
+            count = min(abs(stop - start), int(duration / RAMP_STEP_INTERVAL + 1e-9))
+            if 0 == count:
+                values, times = [stop], [cursor]
+            else:
+                values = np.linspace(start, stop, count + 1).round().astype(int)
+                times = np.linspace(cursor, cursor + duration, count + 1)
+            for value, stepTime in zip(values, times):
+                steps.append(SequenceStep(float(stepTime), {field: int(value)}, lineNo))
+            cursor += duration
+
+        else:
+            raise SequenceError("Line {}: invalid command '{}'".format(lineNo, line.strip()))
+
+    return steps
+
+
+def loadSequence(path):
+    ''' Returns list of SequenceStep of a script file. '''
+    with open(path) as file:
+        return parseSequence(file.read())
+
+
+class StepResult(object):
+    ''' Requested and achieved timing of an executed step. '''
+
+    def __init__(self, step, requested, achieved, moveDuration=None):
+        '''
+            - step: Executed SequenceStep
+            - requested: Requested time since sequence start in seconds
+            - achieved: Time since sequence start the control frame was
+                        sent in seconds, None if sending failed
+            - moveDuration: Seconds until a move step completed
+        '''
+        self.step = step
+        self.requested = requested
+        self.achieved = achieved
+        self.moveDuration = moveDuration
+
+    @property
+    def lateness(self):
+        ''' Achieved minus requested time in seconds or None. '''
+        return None if self.achieved is None else self.achieved - self.requested
+
+
+class SequenceRunner(threading.Thread):
+    ''' Executes a motion sequence in its own thread, independent of the
+        cyclic update timer. Every step is applied at its requested time
+        by sleeping until shortly before and spinning for the rest, and
+        sent to the motor driver at once. The time waited for moves to
+        complete shifts all following steps.
+    '''
+
+    # Interval in seconds to check for abort while waiting for a move
+    MOVE_POLL_INTERVAL = 0.05
+
+    # Remaining time in nanoseconds spent spinning instead of sleeping
+    SPIN_THRESHOLD = 2000000
+
+    def __init__(self, model, steps):
+        '''
+            - model: Model whose control frame is changed
+            - steps: List of SequenceStep
+        '''
+        super().__init__(daemon=True)
+        self._model = model
+        self._steps = sorted(steps, key=lambda step: step.time)
+        self._stopEvent = threading.Event()
+
+        # StepResult of every executed step
+        self.results = []
+
+        # Exception that aborted the sequence or None
+        self.error = None
+
+    @property
+    def stepCount(self):
+        return len(self._steps)
+
+    def stop(self):
+        ''' Abort the sequence after the current step. '''
+        self._stopEvent.set()
+
+    def _sleepUntil(self, deadline):
+        ''' Wait until perf_counter_ns deadline. Returns False if stopped. '''
+        while True:
+            remaining = deadline - time.perf_counter_ns()
+            if remaining <= 0:
+                return True
+            if remaining > SequenceRunner.SPIN_THRESHOLD:
+                if self._stopEvent.wait((remaining - SequenceRunner.SPIN_THRESHOLD) * 1e-9):
+                    return False
+            elif self._stopEvent.is_set():
+                return False
+
+    def run(self):
+        try:
+            start = time.perf_counter_ns()
+            for step in self._steps:
+                deadline = start + int(step.time * 1e9)
+                if not self._sleepUntil(deadline):
+                    break
+                if step.isMove:
+                    result = self._move(step, start)
+                    if result is None:
+                        break
+                    start += time.perf_counter_ns() - deadline
+                else:
+                    txTimestamp = self._model.applySetpoints(step.setpoints)
+                    achieved = None if txTimestamp is None else (txTimestamp - start) * 1e-9
+                    result = StepResult(step, step.time, achieved)
+                self.results.append(result)
+        except Exception as error:
+            self.error = error
+
+    def _move(self, step, start):
+        ''' Execute move step and wait for its completion.
+            Returns StepResult or None if stopped.
+            Raises MoveTimeoutError of the model if the move failed.
+        '''
+        kwargs = {} if step.timeout is None else {'timeout': int(step.timeout * 1e9)}
+        txTimestamp = time.perf_counter_ns()
+        future = self._model.moveTo(step.setpoints[rpc.ElmControl.NEW_POS], **kwargs)
+        while True:
+            try:
+                moveDuration = future.result(SequenceRunner.MOVE_POLL_INTERVAL)
+                break
+            except concurrent.futures.TimeoutError:
+                if self._stopEvent.is_set():
+                    self._model.moveTracker.cancel(future)
+                    return None
+        return StepResult(step, step.time, (txTimestamp - start) * 1e-9, moveDuration)
+
+    def report(self):
+        ''' Returns text summary of requested vs achieved step timing. '''
+        lateness = np.array([result.lateness for result in self.results if result.lateness is not None]) * 1000.0
+        failed = sum(1 for result in self.results if result.achieved is None)
+        lines = ["{} of {} steps executed, {} failed".format(len(self.results), self.stepCount, failed)]
+        moves = [result.moveDuration for result in self.results if result.moveDuration is not None]
+        if moves:
+            lines.append("{} moves, mean duration {:.3f} s, {:.1f} moves per minute".format(
+                len(moves), np.mean(moves), 60.0 / np.mean(moves)))
+        if len(lateness):
+            lines.append("Lateness [ms]: mean {:.3f}, p95 {:.3f}, max {:.3f}".format(
+                lateness.mean(), np.percentile(lateness, 95), lateness.max()))
+        if self.error is not None:
+            lines.append("Aborted: {}".format(self.error))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import unittest
+
+    class TestParseSequence(unittest.TestCase):
+        ''' Unit test of parseSequence function.
+        '''
+
+        def test_commands(self):
+            steps = parseSequence('''
+                set mode=speed direction=cw enable=1  # start
+                ramp speed 0 4 2.0
+                dwell 1
+                set direction=stop
+            ''')
+            self.assertEqual(steps[0].setpoints, {rpc.ElmControl.OP_MODE: rpc.OpMode.SPEED_CTRL,
+                                                  rpc.ElmControl.DIRECTION: rpc.Direction.CLOCKWISE,
+                                                  rpc.ElmControl.ENABLE: 1})
+            self.assertEqual([step.time for step in steps[1:6]], [0.0, 0.5, 1.0, 1.5, 2.0])
+            self.assertEqual([step.setpoints[rpc.ElmControl.SPEED] for step in steps[1:6]], [0, 1, 2, 3, 4])
+            self.assertEqual(steps[-1].time, 3.0)
+
+        def test_rampStepRate(self):
+            steps = parseSequence('ramp position 0 16000 2')
+            self.assertEqual(len(steps), 101)
+            self.assertAlmostEqual(steps[1].time - steps[0].time, RAMP_STEP_INTERVAL)
+            self.assertEqual(steps[50].setpoints, {rpc.ElmControl.NEW_POS: 8000})
+            self.assertEqual(steps[-1].setpoints, {rpc.ElmControl.NEW_POS: 16000})
+
+            step, = parseSequence('ramp speed 0 7 0')
+            self.assertEqual((step.time, step.setpoints), (0.0, {rpc.ElmControl.SPEED: 7}))
+
+        def test_move(self):
+            step, = parseSequence('move 1000 2.5')
+            self.assertTrue(step.isMove)
+            self.assertEqual(step.setpoints, {rpc.ElmControl.NEW_POS: 1000})
+            self.assertEqual(step.timeout, 2.5)
+
+        def test_errors(self):
+            self.assertRaises(SequenceError, parseSequence, 'set foo=1')
+            self.assertRaises(SequenceError, parseSequence, 'dwell -1')
+            self.assertRaises(SequenceError, parseSequence, 'jump 3')
+
+        def test_ranges(self):
+            for script in ['set speed=300', 'set direction=5', 'set position=40000', 'ramp speed 0 400 1']:
+                self.assertRaises(SequenceError, parseSequence, script)
+            step, = parseSequence('set speed=255 position=-32768')
+            self.assertEqual(step.setpoints, {rpc.ElmControl.SPEED: 255, rpc.ElmControl.NEW_POS: -32768})
+
+    class TestSequenceRunner(unittest.TestCase):
+        ''' Unit test of SequenceRunner class with a simulated model.
+        '''
+
+        class Model(object):
+            def __init__(self):
+                self.setpoints = []
+
+            def applySetpoints(self, setpoints):
+                self.setpoints.append(setpoints)
+                return time.perf_counter_ns()
+
+            def moveTo(self, position, **kwargs):
+                self.setpoints.append({rpc.ElmControl.NEW_POS: position})
+                future = concurrent.futures.Future()
+                threading.Timer(0.05, future.set_result, [0.05]).start()
+                return future
+
+        def test_timing(self):
+            model = self.Model()
+            runner = SequenceRunner(model, parseSequence('set speed=1\ndwell 0.05\nset speed=2'))
+            runner.start()
+            runner.join()
+            self.assertEqual(model.setpoints, [{rpc.ElmControl.SPEED: 1}, {rpc.ElmControl.SPEED: 2}])
+            self.assertLess(abs(runner.results[1].lateness), 0.005)
+
+        def test_moveShiftsSteps(self):
+            model = self.Model()
+            runner = SequenceRunner(model, parseSequence('move 100\nset speed=2'))
+            runner.start()
+            runner.join()
+            self.assertEqual(runner.results[0].moveDuration, 0.05)
+            self.assertLess(abs(runner.results[1].lateness), 0.005)
+
+    unittest.main()
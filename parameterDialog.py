@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Dialog to view and edit the motor driver parameters.
+
+'''
+
+import threading
+
+from PyQt5 import QtCore, QtWidgets
+
+from comLib.parameterService import ParameterError
+
+
+class ParameterDialog(QtWidgets.QDialog):
+    ''' Shows the local parameter cache instantly and reads/writes the
+        motor driver parameters in a background thread.
+    '''
+
+    # Refresh interval of the table in milliseconds
+    REFRESH_INTERVAL = 200
+
+    # Table columns
+    COLUMN_ID = 0
+    COLUMN_VALUE = 1
+    COLUMN_STATE = 2
+
+    def __init__(self, parameterService, parent=None):
+        '''
+            - parameterService: comLib.parameterService.ParameterService
+        '''
+        super().__init__(parent)
+
+        self._service = parameterService
+
+        # Cache version shown in the table
+        self._shownVersion = -1
+
+        # Table row of each parameter id
+        self._rows = {}
+
+        # Background read/write and its result message
+        self._worker = None
+        self._message = None
+
+        self._setupUi()
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self._refresh)
+        self._timer.start(ParameterDialog.REFRESH_INTERVAL)
+        self._refresh()
+
+    def _setupUi(self):
+        ''' Create dialog elements. '''
+        self.setWindowTitle("Motor Driver Parameters")
+        self.resize(420, 500)
+
+        self._firstId = QtWidgets.QSpinBox()
+        self._firstId.setRange(0, 0xFFFF)
+        self._firstId.setDisplayIntegerBase(16)
+        self._firstId.setPrefix("0x")
+
+        self._count = QtWidgets.QSpinBox()
+        self._count.setRange(1, 256)
+        self._count.setValue(16)
+
+        readButton = QtWidgets.QPushButton("Read")
+        readButton.clicked.connect(self._onRead)
+        writeButton = QtWidgets.QPushButton("Write Changed")
+        writeButton.clicked.connect(self._onWrite)
+
+        rangeLayout = QtWidgets.QHBoxLayout()
+        rangeLayout.addWidget(QtWidgets.QLabel("First ID"))
+        rangeLayout.addWidget(self._firstId)
+        rangeLayout.addWidget(QtWidgets.QLabel("Count"))
+        rangeLayout.addWidget(self._count)
+        rangeLayout.addWidget(readButton)
+
+        self._table = QtWidgets.QTableWidget(0, 3)
+        self._table.setHorizontalHeaderLabels(["ID", "Value", "State"])
+        self._table.horizontalHeader().setStretchLastSection(True)
+        self._table.verticalHeader().setVisible(False)
+        self._table.itemChanged.connect(self._onItemChanged)
+
+        self._statusLabel = QtWidgets.QLabel()
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(rangeLayout)
+        layout.addWidget(self._table)
+        layout.addWidget(writeButton)
+        layout.addWidget(self._statusLabel)
+
+    def _startWorker(self, description, func):
+        ''' Run func in background, only one access at a time. '''
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        def run():
+            try:
+                func()
+                self._message = "{} done".format(description)
+            except Exception as error:
+                self._message = "{} failed: {}".format(description, error)
+
+        self._statusLabel.setText("{} ...".format(description))
+        self._worker = threading.Thread(target=run, daemon=True)
+        self._worker.start()
+
+    def _onRead(self):
+        ''' Read selected parameter id range. '''
+        first = self._firstId.value()
+        ids = range(first, min(first + self._count.value(), 0x10000))
+        self._startWorker("Read", lambda: self._service.read(ids))
+
+    def _onWrite(self):
+        ''' Write all changed parameters. '''
+        self._startWorker("Write", self._service.flush)
+
+    def _onItemChanged(self, item):
+        ''' Take over edited value into the cache. '''
+        if ParameterDialog.COLUMN_VALUE != item.column():
+            return
+
+        parameterId = item.data(QtCore.Qt.UserRole)
+        try:
+            self._service.set(parameterId, int(item.text(), 0))
+        except ValueError:
+            self._shownVersion = -1
+        except ParameterError as error:
+            self._statusLabel.setText(str(error))
+            self._shownVersion = -1
+
+    def _refresh(self):
+        ''' Update the table rows of parameters changed in the cache. '''
+        if self._message is not None:
+            self._statusLabel.setText(self._message)
+            self._message = None
+
+        cache = self._service.cache
+        version = cache.version
+        changed = cache.changedSince(self._shownVersion)
+        if not changed:
+            return
+
+        self._table.blockSignals(True)
+        for parameterId, entry in sorted(changed.items()):
+            if parameterId not in self._rows:
+                self._rows[parameterId] = self._table.rowCount()
+                self._table.insertRow(self._table.rowCount())
+            row = self._rows[parameterId]
+
+            idItem = QtWidgets.QTableWidgetItem("0x{:04X}".format(parameterId))
+            idItem.setFlags(idItem.flags() & ~QtCore.Qt.ItemIsEditable)
+
+            valueItem = QtWidgets.QTableWidgetItem("" if entry.value is None else str(entry.value))
+            valueItem.setData(QtCore.Qt.UserRole, parameterId)
+
+            if entry.error:
+                state = entry.error
+            elif entry.isDirty:
+                state = "changed"
+            else:
+                state = "synced"
+            stateItem = QtWidgets.QTableWidgetItem(state)
+            stateItem.setFlags(stateItem.flags() & ~QtCore.Qt.ItemIsEditable)
+
+            self._table.setItem(row, ParameterDialog.COLUMN_ID, idItem)
+            self._table.setItem(row, ParameterDialog.COLUMN_VALUE, valueItem)
+            self._table.setItem(row, ParameterDialog.COLUMN_STATE, stateItem)
+        self._table.blockSignals(False)
+
+        self._shownVersion = version
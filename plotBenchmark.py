@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Benchmark of telemetry plot frame times with raster and OpenGL rendering.
+
+ Usage: python plotBenchmark.py [--frames N] [--modes raster opengl ...]
+
+ Every rendering mode is measured in its own process, because OpenGL has
+ to be set up before the QApplication is created.
+
+'''
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+# Number of data points in the displayed time window
+WINDOW_SIZES = [1000, 100000, 1000000]
+
+# Rendering modes, see plotting.enableOpenGL()
+MODES = ['raster', 'opengl', 'software-opengl']
+
+
+def measureFrameTimes(mode, windowSize, frames):
+    ''' Returns the frame times in seconds of a scrolling curve with
+        windowSize data points. A frame consists of the data update and
+        a synchronous repaint of the plot.
+        Returns None if the mode is not available.
+    '''
+    from PyQt5 import QtWidgets
+    import pyqtgraph as pg
+    import plotting
+
+    if 'raster' != mode and not plotting.enableOpenGL('software-opengl' == mode):
+        return None
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+
+    plotWidget = pg.PlotWidget()
+    plotWidget.resize(640, 480)
+    plotWidget.show()
+    curve = plotWidget.plot([], [], pen=(0, 0, 255))
+
+    x = np.arange(windowSize) * 0.01
+    y = np.sin(x) + np.random.normal(0.0, 0.1, windowSize)
+
+    frameTimes = []
+    for frame in range(frames):
+        start = time.perf_counter()
+        curve.setData(x + frame * 0.01, np.roll(y, frame))
+        plotWidget.repaint()
+        app.processEvents()
+        frameTimes.append(time.perf_counter() - start)
+
+    plotWidget.close()
+    return frameTimes
+
+
+def runMode(mode, frames):
+    ''' Measure all window sizes of one mode in a child process.
+        Returns dict of window size to frame times or None.
+    '''
+    cmd = [sys.executable, __file__, '--child', mode, '--frames', str(frames)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, universal_newlines=True)
+    if 0 != proc.returncode:
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def printResults(results):
+    ''' Print median and 95th percentile frame time per mode and window. '''
+    print('{:<16}{:>10}{:>14}{:>14}'.format('mode', 'points', 'median [ms]', 'p95 [ms]'))
+    for mode, frameTimes in results.items():
+        if frameTimes is None:
+            print('{:<16}{:>10}'.format(mode, 'n/a'))
+            continue
+        for windowSize, times in frameTimes.items():
+            times = np.array(times) * 1000.0
+            print('{:<16}{:>10}{:>14.2f}{:>14.2f}'.format(
+                mode, windowSize, np.median(times), np.percentile(times, 95)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plot rendering benchmark')
+    parser.add_argument('--frames', type=int, default=50, help='frames per measurement')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        frameTimes = {}
+        for windowSize in WINDOW_SIZES:
+            times = measureFrameTimes(args.child, windowSize, args.frames)
+            if times is None:
+                sys.exit(1)
+            frameTimes[windowSize] = times
+        print(json.dumps(frameTimes))
+    else:
+        printResults({mode: runMode(mode, args.frames) for mode in args.modes})
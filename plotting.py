@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Plot helpers for the telemetry plots of the main window.
+
+'''
+
+import collections
+import numpy as np
+import pyqtgraph as pg
+from PyQt5 import QtCore
+
+
+def enableOpenGL(isSoftwareRendering=False):
+    ''' Opt-in OpenGL rendering of all plots.
+        Has to be called before the QApplication and the plots are created.
+        - isSoftwareRendering: Use Qt's software OpenGL implementation,
+                               e.g. on panel PCs without GPU driver.
+        Returns False if PyOpenGL is not available, plots then keep the
+        default raster paint path.
+    '''
+    try:
+        import OpenGL.GL  # noqa: F401, required by pyqtgraph's OpenGL curves
+    except ImportError:
+        return False
+
+    if isSoftwareRendering:
+        QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_UseSoftwareOpenGL)
+
+    # Render views into an OpenGL viewport and draw curves with OpenGL
+    pg.setConfigOptions(useOpenGL=True, enableExperimental=True)
+    return True
+
+
+class ScrollingCurve(object):
+    ''' Scrolling plot curve that is built from chunks of CHUNK_SIZE points.
+        Only the newest chunk is rebuilt when samples are appended, older
+        chunks are frozen and dropped as a whole once they leave the time
+        window. So the cost per update is proportional to the new samples
+        and not to the window size.
+    '''
+
+    # Number of data points of one curve chunk
+    CHUNK_SIZE = 100
+
+    def __init__(self, plotWidget, pen, windowSize, chunkSize=CHUNK_SIZE):
+        '''
+            - plotWidget: pyqtgraph PlotWidget the curve is drawn in
+            - pen: Pen of the curve
+            - windowSize: Number of data points displayed at least
+            - chunkSize: Number of data points per curve chunk
+        '''
+        self._plotWidget = plotWidget
+        self._pen = pen
+        self._windowSize = windowSize
+        self._chunkSize = chunkSize
+        self._isVisible = True
+
+        # Frozen chunks, oldest first
+        self._chunks = collections.deque()
+
+        # Chunk currently appended to
+        self._current = None
+        self._x = np.empty(chunkSize + 1)
+        self._y = np.empty(chunkSize + 1)
+        self._count = 0
+
+        self._newChunk()
+
+    def _newChunk(self):
+        ''' Freeze current chunk and start a new one.
+            The new chunk starts with the last point of the frozen one
+            so the curve is drawn without gaps.
+        '''
+        if self._current is not None:
+            self._chunks.append(self._current)
+            self._x[0] = self._x[self._count - 1]
+            self._y[0] = self._y[self._count - 1]
+            self._count = 1
+
+        self._current = self._plotWidget.plot([], [], pen=self._pen)
+        self._current.setVisible(self._isVisible)
+
+    def _dropOldChunks(self):
+        ''' Remove chunks that are no more part of the time window. '''
+        while (len(self._chunks) - 1) * self._chunkSize >= self._windowSize:
+            self._plotWidget.removeItem(self._chunks.popleft())
+
+    def append(self, x, y):
+        ''' Append data point(s) x, y (scalars or sequences) to the curve. '''
+        x = np.atleast_1d(x)
+        y = np.atleast_1d(y)
+
+        pos = 0
+        while pos < len(x):
+            if self._count == len(self._x):
+                self._current.setData(self._x.copy(), self._y.copy())
+                self._newChunk()
+
+            num = min(len(self._x) - self._count, len(x) - pos)
+            self._x[self._count:self._count + num] = x[pos:pos + num]
+            self._y[self._count:self._count + num] = y[pos:pos + num]
+            self._count += num
+            pos += num
+
+        # Curve items keep a reference to their data, so hand over a copy
+        self._current.setData(self._x[:self._count].copy(), self._y[:self._count].copy())
+        self._dropOldChunks()
+
+    def clear(self):
+        ''' Remove all data points from the curve. '''
+        while self._chunks:
+            self._plotWidget.removeItem(self._chunks.popleft())
+        self._count = 0
+        self._current.setData([], [])
+
+    def setVisible(self, isVisible):
+        ''' Show or hide all chunks of the curve. '''
+        self._isVisible = isVisible
+        for chunk in self._chunks:
+            chunk.setVisible(isVisible)
+        self._current.setVisible(isVisible)
@@ -0,0 +1,600 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Compact recording of decoded LIN frames.
+
+ File layout:
+   - MAGIC, uint32 length and JSON file header
+   - Blocks of up to BLOCK_SIZE status samples, each with an uncompressed
+     BLOCK_HEADER (sample count, first and last timestamp, payload length)
+     followed by the zlib compressed payload.
+
+ A sparse index with the time range and file offset of every block is
+ written to the file INDEX_SUFFIX alongside, so readers seek to any time
+ by bisection and decode only the blocks needed. The index is rebuilt
+ from the block headers if it is missing or incomplete.
+
+ Every status field is stored as run lengths of its deltas, so constant
+ flags and slowly changing values shrink to a few runs per block. Control
+ frames are stored only when they changed, plus once at every block start
+ so each block can be decoded on its own.
+
+'''
+
+import datetime
+import json
+import os
+import queue
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+
+import comLib.linAdapter as rpc
+
+
+MAGIC = b'NTMDREC\x01'
+
+# Block type, sample count, first and last timestamp, payload length
+BLOCK_HEADER = struct.Struct('<BIqqI')
+
+BLOCK_TYPE_DATA = 1
+
+INDEX_MAGIC = b'NTMDIDX\x01'
+
+INDEX_SUFFIX = '.idx'
+
+# Index entry per block: time range, file offset of the block header,
+# payload length and sample count
+INDEX_DTYPE = np.dtype([
+    ('first', '<i8'),
+    ('last', '<i8'),
+    ('offset', '<i8'),
+    ('length', '<u4'),
+    ('samples', '<u4'),
+])
+
+# Timestamp column of samples and control snapshots
+TIMESTAMP = 'timestamp_ns'
+
+# Raw status frame fields and their storage type
+STATUS_FIELDS = [
+    (rpc.ElmStatus.CURRENT_POS, np.int16),
+    (rpc.ElmStatus.LIN_ERROR, np.uint8),
+    (rpc.ElmStatus.STALL_DETECTED, np.uint8),
+    (rpc.ElmStatus.OVER_TEMPERATURE, np.uint8),
+    (rpc.ElmStatus.OVER_CURRENT, np.uint8),
+    (rpc.ElmStatus.HVC_STATUS, np.uint8),
+    (rpc.ElmStatus.BVDD, np.uint8),
+    (rpc.ElmStatus.TJ, np.uint8),
+    (rpc.ElmStatus.CURRENT_SPEED, np.uint8),
+]
+
+# Control frame fields and their storage type
+CONTROL_FIELDS = [
+    (rpc.ElmControl.INIT_CURRENT_POS, np.int16),
+    (rpc.ElmControl.NEW_POS, np.int16),
+    (rpc.ElmControl.SPEED, np.uint8),
+    (rpc.ElmControl.OP_MODE, np.uint8),
+    (rpc.ElmControl.ENABLE, np.uint8),
+    (rpc.ElmControl.ENABLE_STALL_DETECTION, np.uint8),
+    (rpc.ElmControl.DIRECTION, np.uint8),
+]
+
+
+# Absolute paths of the recordings open for writing in this process,
+# their index files are owned by the writer
+_writingPaths = set()
+_writingLock = threading.Lock()
+
+
+class RecordingError(Exception):
+    ''' Invalid or corrupt recording file. '''
+    pass
+
+
+def deltaRleEncode(values):
+    ''' Returns run values and run lengths of the deltas of values.
+        The first delta is the first value itself.
+    '''
+    deltas = np.diff(np.asarray(values, np.int64), prepend=0)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(deltas)) + 1)) if len(deltas) else np.empty(0, np.int64)
+    runLengths = np.diff(np.append(starts, len(deltas)))
+    return deltas[starts], runLengths.astype(np.uint32)
+
+
+def deltaRleDecode(runValues, runLengths, dtype=np.int64):
+    ''' Inverse of deltaRleEncode(). '''
+    return np.cumsum(np.repeat(runValues, runLengths)).astype(dtype)
+
+
+def _smallestType(values):
+    ''' Smallest signed integer type holding all values. '''
+    if not len(values):
+        return np.int8
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= values.min() and values.max() <= info.max:
+            return dtype
+    return np.int64
+
+
+def encodeBlock(timestamps, status, control, linkStatistics=None):
+    ''' Encode one block of samples.
+        - timestamps: int64 array of sample timestamps
+        - status: Dict of status field name to array
+        - control: Dict of control field name to array of the snapshots,
+                   including their TIMESTAMP
+        - linkStatistics: Optional dict of link statistics
+        Returns the compressed payload.
+    '''
+    arrays = []
+    for name, values in [(TIMESTAMP, timestamps)] + [(name, status[name]) for name, _ in STATUS_FIELDS]:
+        runValues, runLengths = deltaRleEncode(values)
+        arrays.append((name + '.values', runValues.astype(_smallestType(runValues))))
+        arrays.append((name + '.runs', runLengths))
+    for name in [TIMESTAMP] + [name for name, _ in CONTROL_FIELDS]:
+        arrays.append(('control.' + name, np.asarray(control[name])))
+
+    header = {
+        'samples': len(timestamps),
+        'link': linkStatistics,
+        'arrays': [[name, values.dtype.str, len(values)] for name, values in arrays],
+    }
+    headerBytes = json.dumps(header).encode('utf-8')
+    payload = struct.pack('<I', len(headerBytes)) + headerBytes + b''.join(values.tobytes() for _, values in arrays)
+    return zlib.compress(payload)
+
+
+def indexPath(path):
+    ''' Returns path of the index file of recording path. '''
+    return path + INDEX_SUFFIX
+
+
+def decodeBlock(payload):
+    ''' Decode compressed block payload.
+        Returns dict with TIMESTAMP and status field arrays, 'control' dict
+        of the control snapshot arrays and 'link' statistics.
+    '''
+    payload = zlib.decompress(payload)
+    headerLength, = struct.unpack_from('<I', payload)
+    header = json.loads(payload[4:4 + headerLength].decode('utf-8'))
+
+    arrays = {}
+    offset = 4 + headerLength
+    for name, dtype, count in header['arrays']:
+        dtype = np.dtype(dtype)
+        arrays[name] = np.frombuffer(payload, dtype, count, offset)
+        offset += dtype.itemsize * count
+
+    block = {'link': header['link'], 'control': {}}
+    block[TIMESTAMP] = deltaRleDecode(arrays[TIMESTAMP + '.values'], arrays[TIMESTAMP + '.runs'])
+    for name, dtype in STATUS_FIELDS:
+        block[name] = deltaRleDecode(arrays[name + '.values'], arrays[name + '.runs'], dtype)
+    for name in [TIMESTAMP] + [name for name, _ in CONTROL_FIELDS]:
+        block['control'][name] = arrays['control.' + name]
+    return block
+
+
+class RecordingWriter(object):
+    ''' Writes decoded status frames and changed control frames to a
+        recording file. Blocks are compressed and written by a background
+        thread, so adding samples never waits for the disk.
+    '''
+
+    # Number of status samples per block
+    BLOCK_SIZE = 4096
+
+    def __init__(self, path, blockSize=BLOCK_SIZE, metadata=None):
+        '''
+            - path: Recording file path
+            - blockSize: Number of status samples per block
+            - metadata: Optional dict stored in the file header, e.g.
+                        the board calibration
+        '''
+        self._blockSize = blockSize
+        self._path = os.path.abspath(path)
+        self._file = open(path, 'wb')
+        with _writingLock:
+            _writingPaths.add(self._path)
+
+        # Timestamps of the recording refer to this perf_counter_ns value
+        self.startTimestamp = time.perf_counter_ns()
+        header = {
+            'version': 1,
+            'start_time': datetime.datetime.now().isoformat(),
+            'start_timestamp_ns': self.startTimestamp,
+        }
+        header.update(metadata or {})
+        headerBytes = json.dumps(header).encode('utf-8')
+        self._file.write(MAGIC + struct.pack('<I', len(headerBytes)) + headerBytes)
+        self._file.flush()
+
+        self._indexFile = open(indexPath(path), 'wb')
+        self._indexFile.write(INDEX_MAGIC)
+
+        self._linkStatistics = None
+        self._lastControl = None
+        self._resetBlock()
+
+        # Exception that stopped the writer thread, e.g. disk full, or None
+        self.error = None
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._writeBlocks, daemon=True)
+        self._thread.start()
+
+    def _resetBlock(self):
+        self._timestamps = []
+        self._status = {name: [] for name, _ in STATUS_FIELDS}
+        self._control = {name: [] for name in [TIMESTAMP] + [name for name, _ in CONTROL_FIELDS]}
+
+    def setLinkStatistics(self, linkStatistics):
+        ''' Link statistics stored with the next block. '''
+        self._linkStatistics = linkStatistics
+
+    def add(self, timestamp, statusFrame, ctrlFrame):
+        ''' Add one sample.
+            - timestamp: time.perf_counter_ns() sampling timestamp
+            - statusFrame: Received HVC_StatusFrame
+            - ctrlFrame: HVC_ControlFrame in effect
+            Raises the error of the writer thread once writing failed.
+        '''
+        if self.error is not None:
+            raise self.error
+
+        self._timestamps.append(timestamp)
+        for name, _ in STATUS_FIELDS:
+            self._status[name].append(statusFrame[name])
+
+        control = tuple(int(ctrlFrame[name]) for name, _ in CONTROL_FIELDS)
+        if control != self._lastControl or 1 == len(self._timestamps):
+            self._lastControl = control
+            self._control[TIMESTAMP].append(timestamp)
+            for (name, _), value in zip(CONTROL_FIELDS, control):
+                self._control[name].append(value)
+
+        if len(self._timestamps) >= self._blockSize:
+            self._flushBlock()
+
+    def _flushBlock(self):
+        ''' Hand over collected samples to the writer thread. '''
+        if not self._timestamps:
+            return
+
+        timestamps = np.array(self._timestamps, np.int64)
+        status = {name: np.array(self._status[name], dtype) for name, dtype in STATUS_FIELDS}
+        control = {TIMESTAMP: np.array(self._control[TIMESTAMP], np.int64)}
+        for name, dtype in CONTROL_FIELDS:
+            control[name] = np.array(self._control[name], dtype)
+
+        self._queue.put((timestamps, status, control, self._linkStatistics))
+        self._resetBlock()
+
+    def _writeBlocks(self):
+        ''' Writer thread: compress and write queued blocks until close()
+            or an error, which is kept in error.
+        '''
+        try:
+            self._writeQueuedBlocks()
+        except Exception as error:
+            self.error = error
+
+    def _writeQueuedBlocks(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            timestamps = item[0]
+            payload = encodeBlock(*item)
+            offset = self._file.tell()
+            self._file.write(BLOCK_HEADER.pack(BLOCK_TYPE_DATA, len(timestamps),
+                                               timestamps[0], timestamps[-1], len(payload)))
+            self._file.write(payload)
+            self._file.flush()
+
+            # Index entry only after its block, so it never points past the data
+            entry = np.array([(timestamps[0], timestamps[-1], offset, len(payload), len(timestamps))], INDEX_DTYPE)
+            self._indexFile.write(entry.tobytes())
+            self._indexFile.flush()
+
+    def close(self):
+        ''' Write remaining samples and close the file. Errors are kept
+            in error, the recording is complete if it is None.
+        '''
+        if self.error is None:
+            self._flushBlock()
+        self._queue.put(None)
+        self._thread.join()
+        for file in (self._file, self._indexFile):
+            try:
+                file.close()
+            except OSError as error:
+                self.error = self.error or error
+        with _writingLock:
+            _writingPaths.discard(self._path)
+
+
+class RecordingReader(object):
+    ''' Reads a recording file block by block or by time range. '''
+
+    def __init__(self, path):
+        '''
+            - path: Recording file path
+        '''
+        self._path = path
+        self._index = None
+        with open(path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise RecordingError("{} is no recording file".format(path))
+            headerLength, = struct.unpack('<I', file.read(4))
+            self.header = json.loads(file.read(headerLength).decode('utf-8'))
+            self.dataOffset = file.tell()
+
+    @property
+    def startTimestamp(self):
+        ''' perf_counter_ns value the timestamps refer to. '''
+        return self.header['start_timestamp_ns']
+
+    def timestampAt(self, seconds):
+        ''' Returns timestamp of the given seconds since recording start. '''
+        return self.startTimestamp + int(seconds * 1e9)
+
+    @property
+    def index(self):
+        ''' Array of INDEX_DTYPE entries of all complete blocks. '''
+        if self._index is None:
+            self._index = self._loadIndex()
+            if self._index is None:
+                self._index = self.buildIndex()
+        return self._index
+
+    def _loadIndex(self):
+        ''' Returns index read from the index file or None if it is
+            missing or does not cover the recording.
+        '''
+        try:
+            with open(indexPath(self._path), 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        count = (len(data) - len(INDEX_MAGIC)) // INDEX_DTYPE.itemsize
+        if not data.startswith(INDEX_MAGIC):
+            return None
+        index = np.frombuffer(data, INDEX_DTYPE, count, len(INDEX_MAGIC))
+
+        end = (int(index['offset'][-1]) + BLOCK_HEADER.size + int(index['length'][-1])) if count else self.dataOffset
+        if end != os.path.getsize(self._path):
+            return None
+        return index
+
+    @property
+    def isWriting(self):
+        ''' True while a RecordingWriter of this process appends to the file. '''
+        with _writingLock:
+            return os.path.abspath(self._path) in _writingPaths
+
+    def buildIndex(self):
+        ''' Scans the block headers and returns the index. The index file
+            is replaced if it is missing or stale, unless the recording is
+            still written, then its writer owns it and the rebuilt index is
+            kept in memory only.
+        '''
+        entries = []
+        size = os.path.getsize(self._path)
+        with open(self._path, 'rb') as file:
+            offset = self.dataOffset
+            while offset + BLOCK_HEADER.size <= size:
+                file.seek(offset)
+                _, samples, first, last, length = BLOCK_HEADER.unpack(file.read(BLOCK_HEADER.size))
+                if offset + BLOCK_HEADER.size + length > size:
+                    # Block of a recording that was not closed properly
+                    break
+                entries.append((first, last, offset, length, samples))
+                offset += BLOCK_HEADER.size + length
+
+        index = np.array(entries, INDEX_DTYPE)
+        if not self.isWriting and self._loadIndex() is None:
+            self._writeIndex(index)
+        return index
+
+    def _writeIndex(self, index):
+        ''' Replaces the index file atomically, so concurrent readers see
+            either the old or the complete new index.
+        '''
+        path = indexPath(self._path)
+        try:
+            handle, tempPath = tempfile.mkstemp(prefix=os.path.basename(path) + '.',
+                                                dir=os.path.dirname(os.path.abspath(path)))
+        except OSError:
+            # Read-only location, index is kept in memory only
+            return
+
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                file.write(INDEX_MAGIC + index.tobytes())
+            os.replace(tempPath, path)
+        except OSError:
+            os.remove(tempPath)
+
+    def blockRange(self, start=None, stop=None):
+        ''' Returns (first, last + 1) index of the blocks holding samples
+            within the timestamps [start, stop].
+        '''
+        index = self.index
+        first = 0 if start is None else int(np.searchsorted(index['last'], start, 'left'))
+        last = len(index) if stop is None else int(np.searchsorted(index['first'], stop, 'right'))
+        return first, max(first, last)
+
+    def iterBlocks(self, start=None, stop=None):
+        ''' Yields blocks holding samples within the timestamps
+            [start, stop] decoded to NumPy arrays, see decodeBlock().
+        '''
+        first, last = self.blockRange(start, stop)
+        with open(self._path, 'rb') as file:
+            for entry in self.index[first:last]:
+                file.seek(int(entry['offset']) + BLOCK_HEADER.size)
+                yield decodeBlock(file.read(int(entry['length'])))
+
+    def read(self, start=None, stop=None):
+        ''' Returns dict of TIMESTAMP and status field arrays of samples
+            within the timestamps [start, stop] and 'control' dict of the
+            control snapshots in effect during that time.
+        '''
+        blocks = list(self.iterBlocks(start, stop))
+        data = {'control': {}}
+        for name, dtype in [(TIMESTAMP, np.int64)] + STATUS_FIELDS:
+            data[name] = np.concatenate([block[name] for block in blocks]) if blocks else np.empty(0, dtype)
+        for name, dtype in [(TIMESTAMP, np.int64)] + CONTROL_FIELDS:
+            data['control'][name] = (np.concatenate([block['control'][name] for block in blocks])
+                                     if blocks else np.empty(0, dtype))
+
+        # Trim to the requested range, keeping the snapshot in effect at start
+        timestamps = data[TIMESTAMP]
+        first = 0 if start is None else np.searchsorted(timestamps, start, 'left')
+        last = len(timestamps) if stop is None else np.searchsorted(timestamps, stop, 'right')
+        for name, _ in [(TIMESTAMP, np.int64)] + STATUS_FIELDS:
+            data[name] = data[name][first:last]
+
+        ctrlTimestamps = data['control'][TIMESTAMP]
+        first = 0 if start is None else max(np.searchsorted(ctrlTimestamps, start, 'right') - 1, 0)
+        last = len(ctrlTimestamps) if stop is None else np.searchsorted(ctrlTimestamps, stop, 'right')
+        for name in data['control']:
+            data['control'][name] = data['control'][name][first:last]
+        return data
+
+
+if __name__ == '__main__':
+    import unittest
+
+    class TestDeltaRle(unittest.TestCase):
+        ''' Unit test of delta run length coding.
+        '''
+
+        def test_roundTrip(self):
+            values = np.array([5, 5, 5, 6, 7, 8, 8, -3, 0], np.int16)
+            runValues, runLengths = deltaRleEncode(values)
+            np.testing.assert_array_equal(deltaRleDecode(runValues, runLengths, np.int16), values)
+
+        def test_constant(self):
+            runValues, runLengths = deltaRleEncode(np.full(1000, 12))
+            self.assertEqual(list(runValues), [12, 0])
+            self.assertEqual(list(runLengths), [1, 999])
+
+    class TestRecording(unittest.TestCase):
+        ''' Unit test of RecordingWriter and RecordingReader.
+        '''
+
+        def test_writeRead(self):
+            path = os.path.join(tempfile.mkdtemp(), 'test.rec')
+            writer = RecordingWriter(path, blockSize=100)
+            ctrlFrame = rpc.HVC_ControlFrame()
+            for name, _ in CONTROL_FIELDS:
+                ctrlFrame[name] = 0
+
+            statusFrame = rpc.HVC_StatusFrame()
+            for idx in range(250):
+                for name, _ in STATUS_FIELDS:
+                    statusFrame[name] = idx // 10
+                ctrlFrame.newPosition = idx // 50
+                writer.add(1000 + idx * 10, statusFrame, ctrlFrame)
+            writer.setLinkStatistics({'resyncs': 1})
+            writer.close()
+
+            reader = RecordingReader(path)
+            blocks = list(reader.iterBlocks())
+            self.assertEqual([len(block[TIMESTAMP]) for block in blocks], [100, 100, 50])
+            self.assertEqual(blocks[-1]['link'], {'resyncs': 1})
+
+            data = reader.read()
+            np.testing.assert_array_equal(data[TIMESTAMP], 1000 + np.arange(250) * 10)
+            np.testing.assert_array_equal(data[rpc.ElmStatus.BVDD], np.arange(250) // 10)
+            # One snapshot per change and block start
+            self.assertEqual(list(data['control'][rpc.ElmControl.NEW_POS]), [0, 1, 2, 3, 4])
+            self.assertEqual(list(data['control'][TIMESTAMP]), [1000, 1500, 2000, 2500, 3000])
+
+        def test_seek(self):
+            path = os.path.join(tempfile.mkdtemp(), 'test.rec')
+            writer = RecordingWriter(path, blockSize=100)
+            ctrlFrame = rpc.HVC_ControlFrame()
+            for name, _ in CONTROL_FIELDS:
+                ctrlFrame[name] = 0
+            statusFrame = rpc.HVC_StatusFrame()
+            for idx in range(1000):
+                for name, _ in STATUS_FIELDS:
+                    statusFrame[name] = 0
+                ctrlFrame.newPosition = idx // 150
+                writer.add(idx * 10, statusFrame, ctrlFrame)
+            writer.close()
+
+            reader = RecordingReader(path)
+            self.assertEqual(len(reader.index), 10)
+            self.assertEqual(reader.blockRange(2345, 2800), (2, 3))
+
+            data = reader.read(2345, 3105)
+            self.assertEqual(data[TIMESTAMP][0], 2350)
+            self.assertEqual(data[TIMESTAMP][-1], 3100)
+            self.assertEqual(list(data['control'][rpc.ElmControl.NEW_POS]), [1, 2])
+
+            # Missing index is rebuilt from the block headers
+            os.remove(indexPath(path))
+            index = RecordingReader(path).index
+            np.testing.assert_array_equal(index, reader.index)
+            self.assertTrue(os.path.exists(indexPath(path)))
+
+        def test_indexOfOpenRecording(self):
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, 'test.rec')
+            writer = RecordingWriter(path, blockSize=10)
+            ctrlFrame = rpc.HVC_ControlFrame()
+            for name, _ in CONTROL_FIELDS:
+                ctrlFrame[name] = 0
+            statusFrame = rpc.HVC_StatusFrame()
+            for name, _ in STATUS_FIELDS:
+                statusFrame[name] = 0
+            for idx in range(10):
+                writer.add(idx, statusFrame, ctrlFrame)
+
+            # The writer's index file is not replaced while it appends
+            inode = os.stat(indexPath(path)).st_ino
+            self.assertTrue(RecordingReader(path).isWriting)
+            RecordingReader(path).buildIndex()
+            self.assertEqual(os.stat(indexPath(path)).st_ino, inode)
+            writer.close()
+
+            # A stale index is replaced atomically after closing
+            with open(indexPath(path), 'r+b') as file:
+                file.truncate(len(INDEX_MAGIC))
+            self.assertEqual(len(RecordingReader(path).index), 1)
+            self.assertEqual(len(RecordingReader(path)._loadIndex()), 1)
+            self.assertEqual(sorted(os.listdir(directory)), ['test.rec', 'test.rec' + INDEX_SUFFIX])
+
+        def test_writeError(self):
+            path = os.path.join(tempfile.mkdtemp(), 'test.rec')
+            writer = RecordingWriter(path, blockSize=10)
+            ctrlFrame = rpc.HVC_ControlFrame()
+            for name, _ in CONTROL_FIELDS:
+                ctrlFrame[name] = 0
+            statusFrame = rpc.HVC_StatusFrame()
+            for name, _ in STATUS_FIELDS:
+                statusFrame[name] = 0
+
+            # Disk full: the error stops the recording instead of queueing blocks
+            def write(data):
+                raise OSError(28, "No space left on device")
+            writer._file.write = write
+            for idx in range(10):
+                writer.add(idx, statusFrame, ctrlFrame)
+            writer._thread.join(1.0)
+            self.assertIsInstance(writer.error, OSError)
+            self.assertRaises(OSError, writer.add, 10, statusFrame, ctrlFrame)
+            writer.close()
+            self.assertIsInstance(writer.error, OSError)
+
+    unittest.main()
@@ -0,0 +1,222 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Spectral analysis of a channel with windowed, overlapping FFT blocks.
+
+ Status frames are polled by the host, so samples are not equidistant.
+ Every block is resampled to a uniform grid over its time span before
+ the FFT.
+
+ Usage: python spectrum.py recording.rec   (offline spectrum of rotor speed)
+
+'''
+
+import threading
+
+import numpy as np
+
+
+# Number of samples per FFT block
+BLOCK_SIZE = 256
+
+# Overlap of consecutive blocks as fraction of BLOCK_SIZE
+OVERLAP = 0.5
+
+
+def _resample(t, y, count):
+    ''' Returns sample interval and y linearly resampled to count
+        equidistant points over t[0]..t[-1].
+    '''
+    grid = np.linspace(t[0], t[-1], count)
+    return (t[-1] - t[0]) / (count - 1), np.interp(grid, t, y)
+
+
+def blockSpectra(blocks, interval):
+    ''' Returns frequencies and amplitude spectra of the rows of blocks.
+        - blocks: 2D array, one block of equidistant samples per row
+        - interval: Sample interval in seconds
+    '''
+    blockSize = blocks.shape[-1]
+    window = np.hanning(blockSize)
+    blocks = blocks - blocks.mean(axis=-1, keepdims=True)
+    spectra = np.abs(np.fft.rfft(blocks * window, axis=-1)) * (2.0 / window.sum())
+    return np.fft.rfftfreq(blockSize, interval), spectra
+
+
+def averageSpectrum(t, y, blockSize=BLOCK_SIZE, overlap=OVERLAP):
+    ''' Offline spectrum of a whole signal, averaged over all
+        overlapping blocks (Welch's method).
+        - t: Sample times in seconds
+        - y: Sample values
+        Returns frequencies and mean amplitude spectrum, None if the
+        signal is shorter than one block.
+    '''
+    if len(t) < blockSize or t[-1] <= t[0]:
+        return None
+
+    # Uniform grid with the mean sample interval of the signal
+    count = len(t)
+    interval, uniform = _resample(np.asarray(t, np.float64), np.asarray(y, np.float64), count)
+    hop = max(1, int(blockSize * (1.0 - overlap)))
+    blocks = np.lib.stride_tricks.sliding_window_view(uniform, blockSize)[::hop]
+    freqs, spectra = blockSpectra(blocks, interval)
+    return freqs, spectra.mean(axis=0)
+
+
+class StreamingSpectrum(threading.Thread):
+    ''' Computes the spectrum of a live channel in a worker thread.
+        Samples are handed over by add(); whenever a block is complete,
+        its spectrum is calculated and averaged exponentially with the
+        previous ones.
+    '''
+
+    # Weight of a new block spectrum in the running average
+    AVERAGING = 0.3
+
+    def __init__(self, blockSize=BLOCK_SIZE, overlap=OVERLAP, averaging=AVERAGING):
+        '''
+            - blockSize: Number of samples per FFT block
+            - overlap: Overlap of consecutive blocks as fraction of blockSize
+            - averaging: Weight of a new block spectrum
+        '''
+        super().__init__(daemon=True)
+        self._blockSize = blockSize
+        self._hop = max(1, int(blockSize * (1.0 - overlap)))
+        self._averaging = averaging
+
+        # Samples handed over, not yet taken by the worker
+        self._pending = []
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+
+        # Samples of the worker not yet completely processed
+        self._t = np.empty(0)
+        self._y = np.empty(0)
+
+        self._freqs = None
+        self._spectrum = None
+
+        # Incremented with every new spectrum
+        self.version = 0
+
+        # Incremented by clear() to drop samples the worker is processing
+        self._generation = 0
+
+    def add(self, t, y):
+        ''' Hand over one sample, called by the acquisition.
+            - t: Sample time in seconds
+            - y: Sample value
+        '''
+        with self._lock:
+            self._pending.append((t, y))
+        self._event.set()
+
+    def clear(self):
+        ''' Discard all samples and the spectrum. '''
+        with self._lock:
+            self._pending = []
+            self._t = np.empty(0)
+            self._y = np.empty(0)
+            self._freqs = None
+            self._spectrum = None
+            self._generation += 1
+            self.version += 1
+
+    def spectrum(self):
+        ''' Returns frequencies and averaged amplitude spectrum or None. '''
+        with self._lock:
+            if self._spectrum is None:
+                return None
+            return self._freqs, self._spectrum.copy()
+
+    def run(self):
+        while True:
+            self._event.wait()
+            self._event.clear()
+
+            with self._lock:
+                pending, self._pending = self._pending, []
+                generation = self._generation
+            if not pending:
+                continue
+
+            samples = np.array(pending, np.float64)
+            t = np.concatenate((self._t, samples[:, 0]))
+            y = np.concatenate((self._y, samples[:, 1]))
+
+            start = 0
+            while start + self._blockSize <= len(t):
+                block = slice(start, start + self._blockSize)
+                if t[block][-1] > t[block][0]:
+                    interval, uniform = _resample(t[block], y[block], self._blockSize)
+                    freqs, spectra = blockSpectra(uniform[np.newaxis], interval)
+                    self._update(generation, freqs, spectra[0])
+                start += self._hop
+
+            with self._lock:
+                if generation == self._generation:
+                    self._t = t[start:]
+                    self._y = y[start:]
+
+    def _update(self, generation, freqs, spectrum):
+        ''' Average new block spectrum into the running spectrum. '''
+        with self._lock:
+            if generation != self._generation:
+                return
+            # Restart averaging if the sample rate changed noticeably
+            if self._spectrum is None or not np.allclose(freqs, self._freqs, rtol=0.05):
+                self._freqs = freqs
+                self._spectrum = spectrum
+            else:
+                self._spectrum += self._averaging * (spectrum - self._spectrum)
+            self.version += 1
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import unittest
+
+    class TestSpectrum(unittest.TestCase):
+        ''' Unit test of offline and streaming spectrum.
+        '''
+
+        def signal(self, count=2048):
+            # 1.25 Hz ripple at about 10 Hz sampling with jitter
+            t = np.cumsum(np.random.uniform(0.09, 0.11, count))
+            return t, 100.0 + 5.0 * np.sin(2 * np.pi * 1.25 * t)
+
+        def test_average(self):
+            freqs, spectrum = averageSpectrum(*self.signal())
+            self.assertAlmostEqual(freqs[np.argmax(spectrum)], 1.25, delta=0.05)
+            self.assertAlmostEqual(spectrum.max(), 5.0, delta=1.0)
+
+        def test_streaming(self):
+            streaming = StreamingSpectrum()
+            streaming.start()
+            for t, y in zip(*self.signal(1024)):
+                streaming.add(t, y)
+            for _ in range(100):
+                if streaming.version >= 7:
+                    break
+                time.sleep(0.01)
+            freqs, spectrum = streaming.spectrum()
+            self.assertAlmostEqual(freqs[np.argmax(spectrum)], 1.25, delta=0.05)
+
+    if len(sys.argv) < 2:
+        unittest.main()
+
+    import comLib.linAdapter as rpc
+    import recording
+
+    reader = recording.RecordingReader(sys.argv[1])
+    data = reader.read()
+    result = averageSpectrum((data[recording.TIMESTAMP] - reader.startTimestamp) * 1e-9,
+                             data[rpc.ElmStatus.CURRENT_SPEED])
+    if result is None:
+        print("Recording too short")
+    else:
+        for freq, amplitude in zip(*result):
+            print("{:10.4f} Hz {:10.4f}".format(freq, amplitude))
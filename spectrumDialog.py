@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Live spectrum view of the rotor speed.
+
+'''
+
+from PyQt5 import QtCore, QtWidgets
+import pyqtgraph as pg
+
+
+class SpectrumDialog(QtWidgets.QDialog):
+    ''' Shows the spectrum of a spectrum.StreamingSpectrum. The spectrum is
+        computed by its worker thread, the dialog only redraws it when a
+        new one is available.
+    '''
+
+    # Refresh interval of the plot in milliseconds
+    REFRESH_INTERVAL = 500
+
+    def __init__(self, streamingSpectrum, title, parent=None):
+        '''
+            - streamingSpectrum: spectrum.StreamingSpectrum to show
+            - title: Window title
+        '''
+        super().__init__(parent)
+
+        self._spectrum = streamingSpectrum
+        self._shownVersion = -1
+
+        self.setWindowTitle(title)
+        self.resize(600, 400)
+
+        self._plotWidget = pg.PlotWidget()
+        self._plotWidget.showGrid(x=True, y=True)
+        self._plotWidget.setLabel('bottom', "Frequency", units='Hz')
+        self._plotWidget.setLabel('left', "Amplitude")
+        self._curve = self._plotWidget.plot([], [], pen=(0, 0, 255))
+
+        self._statusLabel = QtWidgets.QLabel("Waiting for data ...")
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self._plotWidget)
+        layout.addWidget(self._statusLabel)
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self._refresh)
+        self._timer.start(SpectrumDialog.REFRESH_INTERVAL)
+
+    def _refresh(self):
+        ''' Redraw spectrum if it changed. '''
+        version = self._spectrum.version
+        if version == self._shownVersion:
+            return
+        self._shownVersion = version
+
+        result = self._spectrum.spectrum()
+        if result is None:
+            self._curve.setData([], [])
+            self._statusLabel.setText("Waiting for data ...")
+            return
+
+        freqs, amplitudes = result
+        self._curve.setData(freqs, amplitudes)
+        self._statusLabel.setText("Resolution {:.3f} Hz, up to {:.2f} Hz".format(freqs[1], freqs[-1]))
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Live statistics of the plotted channels.
+
+'''
+
+from PyQt5 import QtCore, QtWidgets
+
+
+class StatisticsDialog(QtWidgets.QDialog):
+    ''' Shows the running statistics of the model's channels over the
+        live time window and the whole session. The statistics are
+        maintained incrementally by the model, the dialog only reads them.
+    '''
+
+    # Refresh interval of the table in milliseconds
+    REFRESH_INTERVAL = 500
+
+    # Statistics shown as table columns with their header
+    COLUMNS = [('min', "Min"), ('max', "Max"), ('mean', "Mean"), ('std', "Std Dev"),
+               ('p5', "P5"), ('p50', "Median"), ('p95', "P95"), ('count', "Samples")]
+
+    # Scopes shown as rows per channel with their label
+    SCOPES = [('window', "window"), ('session', "session")]
+
+    def __init__(self, model, channelNames, parent=None):
+        '''
+            - model: model.Model providing channelStatistics()
+            - channelNames: List of (model.Channel, display name) tuples
+        '''
+        super().__init__(parent)
+
+        self._model = model
+        self._channelNames = channelNames
+
+        self.setWindowTitle("Channel Statistics")
+        self.resize(700, 260)
+
+        self._table = QtWidgets.QTableWidget(len(channelNames) * len(StatisticsDialog.SCOPES),
+                                             len(StatisticsDialog.COLUMNS))
+        self._table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self._table.setHorizontalHeaderLabels([header for _, header in StatisticsDialog.COLUMNS])
+        self._table.setVerticalHeaderLabels(["{} ({})".format(name, scope)
+                                             for _, name in channelNames
+                                             for _, scope in StatisticsDialog.SCOPES])
+        for row in range(self._table.rowCount()):
+            for col in range(self._table.columnCount()):
+                item = QtWidgets.QTableWidgetItem()
+                item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                self._table.setItem(row, col, item)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self._table)
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self._refresh)
+        self._timer.start(StatisticsDialog.REFRESH_INTERVAL)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._refresh()
+
+    def _refresh(self):
+        ''' Show current statistics while the dialog is visible. '''
+        if not self.isVisible():
+            return
+
+        statistics = self._model.channelStatistics()
+        row = 0
+        for channel, _ in self._channelNames:
+            for scope, _ in StatisticsDialog.SCOPES:
+                stats = statistics[channel][scope]
+                for col, (name, _) in enumerate(StatisticsDialog.COLUMNS):
+                    value = None if stats is None else stats[name]
+                    if value is None:
+                        text = "-"
+                    elif 'count' == name:
+                        text = str(value)
+                    else:
+                        text = "{:.2f}".format(value)
+                    self._table.item(row, col).setText(text)
+                row += 1
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+  (c) NewTec GmbH System-Entwicklung und Beratung 2018   -   www.newtec.de
+
+ Columnar export of telemetry to Parquet or Arrow IPC files.
+ Requires pyarrow.
+
+'''
+
+import threading
+
+
+class ExportFormat(object):
+    ''' Supported export file formats. '''
+    PARQUET = 'parquet'
+    ARROW = 'arrow'
+
+
+class TelemetryExporter(threading.Thread):
+    ''' Exports the rows of a TelemetryStore in a background thread.
+        Raw columns are exported as stored, optionally together with
+        columns converted to engineering units.
+        Rows are converted and written ROW_GROUP_SIZE at a time, so memory
+        stays bounded independent of the recording length and the store
+        is locked only while a row group is copied.
+    '''
+
+    # Number of rows per Parquet row group / Arrow record batch
+    ROW_GROUP_SIZE = 65536
+
+    def __init__(self, telemetry, path, fileFormat=ExportFormat.PARQUET, rowGroupSize=ROW_GROUP_SIZE,
+                 conversions=None):
+        '''
+            - telemetry: model.TelemetryStore to export
+            - path: Output file path
+            - fileFormat: ExportFormat
+            - rowGroupSize: Number of rows written at once
+            - conversions: Dict of additional column name to a function
+                           with a field attribute, converting that raw
+                           column per row group, e.g. model.Conversion
+        '''
+        super().__init__(daemon=True)
+
+        self._telemetry = telemetry
+        self._conversions = conversions or {}
+        self._path = path
+        self._format = fileFormat
+        self._rowGroupSize = rowGroupSize
+
+        # Number of rows to export, fixed when the export starts
+        self.totalRows = 0
+
+        # Number of rows written so far
+        self.exportedRows = 0
+
+        # Exception that aborted the export or None
+        self.error = None
+
+    @staticmethod
+    def isAvailable():
+        ''' True if pyarrow is installed. '''
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _rowGroups(self):
+        ''' Yields dict of column name to array per row group.
+            An empty store yields one empty row group to write the schema.
+        '''
+        for start in range(0, max(self.totalRows, 1), self._rowGroupSize):
+            columns = self._telemetry.columns(start, min(start + self._rowGroupSize, self.totalRows))
+            for name, conversion in self._conversions.items():
+                columns[name] = conversion(columns[conversion.field])
+            yield columns
+
+    def run(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            self.totalRows = len(self._telemetry)
+            names = self._telemetry.names + list(self._conversions)
+            writer = None
+            try:
+                for columns in self._rowGroups():
+                    batch = pa.RecordBatch.from_arrays([pa.array(columns[name]) for name in names], names)
+                    if writer is None:
+                        if ExportFormat.PARQUET == self._format:
+                            writer = pq.ParquetWriter(self._path, batch.schema)
+                        else:
+                            writer = pa.ipc.new_file(self._path, batch.schema)
+
+                    if ExportFormat.PARQUET == self._format:
+                        writer.write_table(pa.Table.from_batches([batch]))
+                    else:
+                        writer.write_batch(batch)
+                    self.exportedRows += batch.num_rows
+            finally:
+                if writer is not None:
+                    writer.close()
+
+        except Exception as error:
+            self.error = error